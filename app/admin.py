@@ -0,0 +1,26 @@
+"""Shared-secret access to admin-only endpoints.
+
+Admin endpoints exist only when ``ADMIN_TOKEN`` is set, and callers must send
+it in the ``X-Admin-Token`` header.
+"""
+
+import hmac
+import os
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ADMIN_HEADER = "X-Admin-Token"
+
+
+def token_ok(token: str | None) -> bool:
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token_ok(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
@@ -0,0 +1,106 @@
+"""Fingerprinted, precompressed static assets.
+
+At startup every file in ``static/`` is read once, given a content-hashed URL
+(``/assets/app.3f9c1b2e7a.js``) and, if it's text, compressed with gzip and
+brotli at their highest levels. Hashed URLs never change meaning, so they're
+served with a year-long ``immutable`` cache lifetime. ``index.html`` is
+rewritten to point at them and is the only file browsers must revalidate;
+it carries an ETag, so that's a 304 on a warm load.
+
+Edits under ``static/`` take effect on restart.
+"""
+
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from . import compression
+
+STATIC_DIR = Path(__file__).parent.parent / "static"
+ASSET_PREFIX = "/assets/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_INDEX = "index.html"
+_COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Local references in index.html: src="/app.js", href="/style.css", ...
+_LOCAL_REF = re.compile(r'(src|href)="/([\w.-]+)"')
+
+
+@dataclass(frozen=True)
+class Asset:
+    media_type: str
+    etag: str
+    bodies: dict[str, bytes]  # content-coding → body; always has "identity"
+
+
+def _build(body: bytes, media_type: str) -> Asset:
+    bodies = {"identity": body}
+    if media_type.startswith(_COMPRESSIBLE_TYPES):
+        for encoding in compression.ENCODINGS:
+            compressed = compression.compress(body, encoding, level=11 if encoding == "br" else 9)
+            if len(compressed) < len(body):
+                bodies[encoding] = compressed
+    return Asset(media_type, f'"{hashlib.sha256(body).hexdigest()[:16]}"', bodies)
+
+
+def _media_type(path: Path) -> str:
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    return media_type
+
+
+class AssetStore:
+    def __init__(self, directory: Path):
+        self.urls: dict[str, str] = {}  # file name → fingerprinted URL
+        self._assets: dict[str, Asset] = {}  # fingerprinted URL → asset
+        self.index: Asset | None = None
+        if not directory.is_dir():
+            return
+        for path in sorted(directory.iterdir()):
+            if not path.is_file() or path.name == _INDEX or path.name.startswith("."):
+                continue
+            body = path.read_bytes()
+            digest = hashlib.sha256(body).hexdigest()[:10]
+            url = f"{ASSET_PREFIX}{path.stem}.{digest}{path.suffix}"
+            self.urls[path.name] = url
+            self._assets[url] = _build(body, _media_type(path))
+        index = directory / _INDEX
+        if index.is_file():
+            html = _LOCAL_REF.sub(self._rewrite, index.read_text(encoding="utf-8"))
+            self.index = _build(html.encode(), "text/html; charset=utf-8")
+
+    def _rewrite(self, match: re.Match) -> str:
+        url = self.urls.get(match.group(2))
+        return f'{match.group(1)}="{url}"' if url else match.group(0)
+
+    def url(self, name: str) -> str:
+        """Fingerprinted URL of ``static/<name>``, or its plain path if unknown."""
+        return self.urls.get(name, f"/{name}")
+
+    def get(self, path: str) -> Asset | None:
+        return self._assets.get(path)
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def respond(asset: Asset, request: Request, cache_control: str) -> Response:
+    headers = {"ETag": asset.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if not_modified(request, asset.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = compression.preferred_encoding(request.headers.get("accept-encoding", ""), asset.bodies)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(asset.bodies[encoding], media_type=asset.media_type, headers=headers)
+
+
+store = AssetStore(STATIC_DIR)
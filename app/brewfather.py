@@ -1,15 +1,31 @@
+import asyncio
 import os
-from datetime import datetime
+import random
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
 
 import httpx
 from dotenv import load_dotenv
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .models import Batch
+from .models import Batch, SyncState
 
 load_dotenv()
 
-BREWFATHER_BASE_URL = "https://api.brewfather.app/v2"
+BREWFATHER_BASE_URL = os.getenv("BREWFATHER_BASE_URL", "https://api.brewfather.app/v2")
+
+# Brewfather batch statuses mirrored locally
+SYNC_STATUSES = [
+    s.strip() for s in os.getenv("BREWFATHER_SYNC_STATUSES", "Conditioning").split(",") if s.strip()
+]
+# Delta syncs can't see deletions, so periodically start over from scratch
+FULL_SYNC_INTERVAL = timedelta(hours=float(os.getenv("BREWFATHER_FULL_SYNC_HOURS", "24")))
+SYNC_SOURCE = "brewfather.batches"
 
 
 def _get_auth() -> tuple[str, str]:
@@ -18,39 +34,175 @@ def _get_auth() -> tuple[str, str]:
     return (user_id, api_key)
 
 
-async def fetch_batches() -> list[dict]:
-    """Fetch all batches from Brewfather API."""
-    auth = _get_auth()
-    print(f"[SYNC] Starting Brewfather sync (user_id={auth[0][:4]}…)" if auth[0] else "[SYNC] WARNING: BREWFATHER_USER_ID is empty!")
-    if not auth[1]:
-        print("[SYNC] WARNING: BREWFATHER_API_KEY is empty!")
+_PAGE_SIZE = 50
+_MAX_PAGES = 20  # safety cap per query: max 1000 batches
+_INCLUDE_FIELDS = "recipe.name,recipe.style.name,measuredAbv,batchNo,bottlingDate,note,_timestamp_ms"
+
+# Pages fetched in parallel once the first page shows there are more
+FETCH_CONCURRENCY = max(int(os.getenv("BREWFATHER_CONCURRENCY", "4")), 1)
+MAX_RETRIES = int(os.getenv("BREWFATHER_MAX_RETRIES", "5"))
+_BACKOFF_BASE = 1.0  # seconds; doubles on each retry
+_BACKOFF_CAP = 60.0
+_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+# Called as progress(stage=..., **counts) while a sync runs
+ProgressFn = Callable[..., None]
+
+
+def _no_progress(**_) -> None:
+    pass
+
+
+class CursorRejected(Exception):
+    """The delta query can't be trusted; the caller should fall back to a full sync."""
+
+
+# ── HTTP client ──────────────────────────────────────────────
+
+_client: httpx.AsyncClient | None = None
+# Monotonic time before which no request may start; set when rate limited
+_not_before = 0.0
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def open_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    """Create the shared pooled client; called from the app lifespan."""
+    global _client
+    await close_client()
+    _client = httpx.AsyncClient(
+        timeout=30.0,
+        http2=transport is None and _http2_available(),
+        limits=httpx.Limits(
+            max_connections=FETCH_CONCURRENCY,
+            max_keepalive_connections=FETCH_CONCURRENCY,
+        ),
+        transport=transport,
+    )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _get_client() -> httpx.AsyncClient:
+    # Outside the app (e.g. scripts) there's no lifespan to open it for us
+    return _client if _client is not None else await open_client()
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(when.tzinfo)).total_seconds(), 0.0)
+
+
+async def _get(client: httpx.AsyncClient, auth: tuple[str, str], params: dict) -> httpx.Response:
+    """GET /batches, retrying transport errors, 429s and 5xx with backoff.
+
+    A Retry-After from the server wins over the computed backoff and holds
+    back every concurrent request, not just the one that was throttled.
+    """
+    global _not_before
+    for attempt in range(MAX_RETRIES + 1):
+        wait = _not_before - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            resp = await client.get(f"{BREWFATHER_BASE_URL}/batches", auth=auth, params=params)
+        except httpx.TransportError as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = random.uniform(0, min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** attempt))
+            print(f"[SYNC] {e!r}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if resp.status_code not in _RETRYABLE_STATUSES or attempt == MAX_RETRIES:
+            return resp
+        delay = _retry_after(resp)
+        if delay is None:
+            delay = random.uniform(0, min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** attempt))
+        _not_before = max(_not_before, time.monotonic() + delay)
+        print(f"[SYNC] Brewfather responded {resp.status_code}; retrying in {delay:.1f}s")
+    return resp
+
+
+# ── Fetching ─────────────────────────────────────────────────
+
+
+async def _fetch_page(client: httpx.AsyncClient, auth: tuple[str, str], params: dict,
+                      offset: int, delta: bool) -> list[dict]:
+    print(f"[SYNC] Requesting batches offset={offset} limit={_PAGE_SIZE} {params}")
+    resp = await _get(
+        client, auth,
+        {**params, "limit": _PAGE_SIZE, "offset": offset, "include": _INCLUDE_FIELDS},
+    )
+    print(f"[SYNC] Brewfather responded: {resp.status_code}")
+    if delta and resp.status_code == 400:
+        raise CursorRejected(resp.text)
+    resp.raise_for_status()
+    return resp.json() or []
+
+
+async def _fetch_pages(client: httpx.AsyncClient, auth: tuple[str, str], params: dict,
+                       stop_at_ms: int | None = None,
+                       progress: ProgressFn = _no_progress) -> list[dict]:
+    """Page through /batches, de-duplicating by _id.
+
+    The first page is fetched alone; if it is full, following pages are
+    fetched FETCH_CONCURRENCY at a time and consumed in order.
+
+    With ``stop_at_ms`` the query must be ordered newest-modified first, and
+    paging stops at the first batch not modified after that high-water mark.
+    Running into the page cap before reaching it raises ``CursorRejected``:
+    the batches past the cap would otherwise be skipped for good.
+    """
     batches = []
     seen_ids = set()
-    offset = 0
-    limit = 50
-
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for _ in range(20):  # safety cap: max 1000 batches
-            print(f"[SYNC] Requesting batches offset={offset} limit={limit}")
-            resp = await client.get(
-                f"{BREWFATHER_BASE_URL}/batches",
-                auth=auth,
-                params={
-                    "limit": limit,
-                    "offset": offset,
-                    "status": "Conditioning",
-                    "include": "recipe.name,recipe.style.name,measuredAbv,batchNo,bottlingDate,note",
-                },
-            )
-            print(f"[SYNC] Brewfather responded: {resp.status_code}")
-            resp.raise_for_status()
-            page = resp.json()
-            if not page:
-                break
+    delta = stop_at_ms is not None
+    next_page = 0
+    wave = 1
 
+    while next_page < _MAX_PAGES:
+        numbers = range(next_page, min(next_page + wave, _MAX_PAGES))
+        pages = await asyncio.gather(*(
+            _fetch_page(client, auth, params, n * _PAGE_SIZE, delta) for n in numbers
+        ))
+        next_page = numbers[-1] + 1
+        wave = FETCH_CONCURRENCY
+
+        done = False
+        for number, page in zip(numbers, pages):
             # Stop if we start getting duplicates
             new_count = 0
             for b in page:
+                if delta:
+                    modified = b.get("_timestamp_ms")
+                    if not isinstance(modified, (int, float)):
+                        raise CursorRejected("batches carry no _timestamp_ms")
+                    if modified <= stop_at_ms:
+                        done = True
+                        break
                 bid = b.get("_id", "")
                 if bid not in seen_ids:
                     seen_ids.add(bid)
@@ -58,11 +210,50 @@ async def fetch_batches() -> list[dict]:
                     new_count += 1
 
             print(f"[SYNC] Got {len(page)} items, {new_count} new")
-            if new_count == 0 or len(page) < limit:
+            progress(stage="fetching", pages=number + 1, batches=len(batches))
+            if done or new_count == 0 or len(page) < _PAGE_SIZE:
+                done = True
                 break
-            offset += limit
+        if done:
+            break
+    else:
+        if delta:
+            raise CursorRejected(f"more than {_MAX_PAGES * _PAGE_SIZE} batches changed since the cursor")
+
+    return batches
 
+
+async def fetch_batches(statuses: list[str] | None = None,
+                        progress: ProgressFn = _no_progress) -> list[dict]:
+    """Fetch every batch in the given statuses from Brewfather API."""
+    auth = _get_auth()
+    print(f"[SYNC] Starting full Brewfather sync (user_id={auth[0][:4]}…)" if auth[0] else "[SYNC] WARNING: BREWFATHER_USER_ID is empty!")
+    if not auth[1]:
+        print("[SYNC] WARNING: BREWFATHER_API_KEY is empty!")
+    client = await _get_client()
+    batches: dict[str, dict] = {}
+    for status in statuses or SYNC_STATUSES:
+        for b in await _fetch_pages(client, auth, {"status": status}, progress=progress):
+            batches[b.get("_id", "")] = b
     print(f"[SYNC] Fetched {len(batches)} unique batches total")
+    return list(batches.values())
+
+
+async def fetch_changed_batches(since_ms: int, progress: ProgressFn = _no_progress) -> list[dict]:
+    """Fetch batches of any status modified after ``since_ms``, newest first.
+
+    One unfiltered query covers every tracked status, so tracking more
+    statuses doesn't multiply the request volume.
+    """
+    auth = _get_auth()
+    print(f"[SYNC] Starting delta Brewfather sync since {since_ms}")
+    batches = await _fetch_pages(
+        await _get_client(), auth,
+        {"order_by": "_timestamp_ms", "order_by_direction": "desc"},
+        stop_at_ms=since_ms,
+        progress=progress,
+    )
+    print(f"[SYNC] Fetched {len(batches)} changed batches")
     return batches
 
 
@@ -75,48 +266,176 @@ def _parse_date(ms) -> str:
         return str(ms)
 
 
+_SYNCED_COLUMNS = (
+    "batch_no", "name", "style", "abv", "brew_date", "bottling_date",
+    "status", "recipe_name", "batch_notes",
+)
+_UPSERT_CHUNK_SIZE = 80  # rows per statement; keeps bound params under SQLite's limit
+
+
+def _optional_number(value, cast):
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"expected a number, got {value!r}")
+    return cast(value)
+
+
+def _normalize_batch(b: dict) -> dict:
+    """Map a raw Brewfather batch onto Batch columns. Raises on malformed data."""
+    recipe = b.get("recipe") if isinstance(b.get("recipe"), dict) else {}
+    style = recipe.get("style") if isinstance(recipe.get("style"), dict) else {}
+    try:
+        batch_no = _optional_number(b.get("batchNo"), int)
+        abv = _optional_number(b.get("measuredAbv"), float)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid number: {e}") from e
+    return {
+        "id": b["_id"],
+        "batch_no": batch_no,
+        "name": str(b.get("name") or ""),
+        "style": str(style.get("name") or ""),
+        "abv": abv,
+        "brew_date": _parse_date(b.get("brewDate")),
+        "bottling_date": _parse_date(b.get("bottlingDate")),
+        "status": str(b.get("status") or ""),
+        "recipe_name": str(recipe.get("name") or ""),
+        "batch_notes": str(b.get("note") or ""),
+    }
+
+
+def _upsert_statement(rows: list[dict]):
+    stmt = sqlite_insert(Batch).values(rows)
+    changed = or_(*(
+        getattr(Batch, col).is_distinct_from(stmt.excluded[col]) for col in _SYNCED_COLUMNS
+    ))
+    return stmt.on_conflict_do_update(
+        index_elements=[Batch.id],
+        set_={**{col: stmt.excluded[col] for col in _SYNCED_COLUMNS},
+              "last_synced": stmt.excluded.last_synced},
+        where=changed,  # unchanged rows are left alone, last_synced included
+    )
+
+
 def sync_batches_to_db(db: Session, raw_batches: list[dict]) -> dict:
     """Upsert Brewfather batches into the local database.
 
-    Returns dict with 'synced' count and 'failed' list of error descriptions.
+    Rows are validated up front and written with one INSERT ... ON CONFLICT DO
+    UPDATE per chunk; rows whose synced fields are unchanged are not touched.
+
+    Returns dict with 'synced' count, 'changed' count (rows inserted or
+    updated) and 'failed' list of error descriptions.
     """
-    count = 0
     failed: list[str] = []
+    rows: dict[str, dict] = {}
+    now = datetime.utcnow()
     for b in raw_batches:
         batch_id = b.get("_id", "")
         if not batch_id:
             continue
         try:
-            with db.begin_nested():  # savepoint: isolates each batch
-                existing = db.get(Batch, batch_id)
-
-                values = {
-                    "batch_no": b.get("batchNo"),
-                    "name": b.get("name", ""),
-                    "style": b.get("recipe", {}).get("style", {}).get("name", "")
-                    if isinstance(b.get("recipe"), dict)
-                    else "",
-                    "abv": b.get("measuredAbv"),
-                    "brew_date": _parse_date(b.get("brewDate")),
-                    "bottling_date": _parse_date(b.get("bottlingDate")),
-                    "status": b.get("status", ""),
-                    "recipe_name": b.get("recipe", {}).get("name", "")
-                    if isinstance(b.get("recipe"), dict)
-                    else "",
-                    "batch_notes": b.get("note", "") or "",
-                    "last_synced": datetime.utcnow(),
-                }
-
-                if existing:
-                    for k, v in values.items():
-                        setattr(existing, k, v)
-                else:
-                    db.add(Batch(id=batch_id, **values))
-            count += 1
+            rows[batch_id] = {**_normalize_batch(b), "last_synced": now}
         except Exception as e:
             msg = f"Batch {batch_id!r}: {e}"
             print(f"[SYNC] Warning: skipped {msg}")
             failed.append(msg)
 
+    synced = 0
+    changed = 0
+    pending = list(rows.values())
+    for start in range(0, len(pending), _UPSERT_CHUNK_SIZE):
+        chunk = pending[start:start + _UPSERT_CHUNK_SIZE]
+        try:
+            with db.begin_nested():
+                changed += db.execute(_upsert_statement(chunk)).rowcount
+            synced += len(chunk)
+            continue
+        except Exception:
+            pass
+        # Something in this chunk was rejected: retry row by row to isolate it
+        for row in chunk:
+            try:
+                with db.begin_nested():
+                    changed += db.execute(_upsert_statement([row])).rowcount
+                synced += 1
+            except Exception as e:
+                msg = f"Batch {row['id']!r}: {e}"
+                print(f"[SYNC] Warning: skipped {msg}")
+                failed.append(msg)
+
+    db.commit()
+    return {"synced": synced, "changed": changed, "failed": failed}
+
+
+# ── Sync cursor ──────────────────────────────────────────────
+
+
+def _load_sync_state(db: Session) -> SyncState:
+    state = db.get(SyncState, SYNC_SOURCE)
+    if state is None:
+        state = SyncState(source=SYNC_SOURCE)
+        db.add(state)
+    return state
+
+
+def _delta_cursor(state: SyncState) -> int | None:
+    """The stored high-water mark, or None when a full sync is required."""
+    if state.scope != ",".join(SYNC_STATUSES):
+        return None
+    if not state.last_full_sync or datetime.utcnow() - state.last_full_sync > FULL_SYNC_INTERVAL:
+        return None
+    try:
+        return int(state.cursor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _high_water_mark(raw_batches: list[dict], previous: int | None) -> int | None:
+    marks = [b.get("_timestamp_ms") for b in raw_batches]
+    if any(not isinstance(m, (int, float)) for m in marks):
+        return None  # can't trust a cursor we can't compute
+    if not marks:
+        return previous
+    return int(max(marks))
+
+
+def _apply_sync(db: Session, raw_batches: list[dict], full: bool, previous: int | None) -> dict:
+    mark = _high_water_mark(raw_batches, previous)
+    if not full:
+        # Changes to untracked statuses only matter for batches we already have
+        ids = [b.get("_id") for b in raw_batches if b.get("_id")]
+        known = set(db.scalars(select(Batch.id).where(Batch.id.in_(ids)))) if ids else set()
+        raw_batches = [
+            b for b in raw_batches if b.get("status") in SYNC_STATUSES or b.get("_id") in known
+        ]
+
+    result = sync_batches_to_db(db, raw_batches)
+
+    state = _load_sync_state(db)
+    state.cursor = str(mark) if mark is not None and not result["failed"] else ""
+    state.scope = ",".join(SYNC_STATUSES)
+    state.last_sync = datetime.utcnow()
+    if full:
+        state.last_full_sync = state.last_sync
     db.commit()
-    return {"synced": count, "failed": failed}
+    return {**result, "mode": "full" if full else "delta"}
+
+
+async def sync_from_brewfather(db: AsyncSession, full: bool = False,
+                               progress: ProgressFn = _no_progress) -> dict:
+    """Sync batches, fetching only what changed since the last run when possible."""
+    state = await db.run_sync(_load_sync_state)
+    since_ms = None if full else _delta_cursor(state)
+    await db.rollback()  # don't hold a read transaction open across the HTTP calls
+
+    if since_ms is not None:
+        try:
+            raw = await fetch_changed_batches(since_ms, progress)
+            progress(stage="saving", batches=len(raw))
+            return await db.run_sync(_apply_sync, raw, False, since_ms)
+        except CursorRejected as e:
+            print(f"[SYNC] Delta sync rejected ({e}); falling back to a full sync")
+
+    raw = await fetch_batches(SYNC_STATUSES, progress)
+    progress(stage="saving", batches=len(raw))
+    return await db.run_sync(_apply_sync, raw, True, None)
@@ -0,0 +1,83 @@
+"""In-process fan-out of keg changes to server-sent event streams.
+
+Each message is encoded once and the same bytes are queued for every
+subscriber, so an idle connection costs one small asyncio queue. Publishing
+is thread-safe: sync endpoints run in the threadpool and hand messages to the
+event loop. With several worker processes, ``relay`` passes each published
+message on to the others (see ``cluster``), which ``deliver`` it to their own
+subscribers.
+"""
+
+import asyncio
+import contextlib
+import json
+from collections.abc import Callable
+
+# A subscriber this far behind is dropped; its EventSource reconnects and resyncs
+_QUEUE_SIZE = 256
+
+
+class Broadcaster:
+    def __init__(self):
+        self._subscribers: set[asyncio.Queue] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.relay: Callable[[str], None] | None = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    @contextlib.contextmanager
+    def subscribe(self):
+        """Yield a queue of encoded SSE messages; ``None`` means the stream should end."""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    def publish(self, event: str, data: dict) -> None:
+        """Queue an event for every subscriber. Safe to call from any thread."""
+        relay = self.relay
+        if relay is None and not self._subscribers:
+            return
+        message = f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+        if relay is not None:
+            relay(message)
+        self.deliver(message)
+
+    def deliver(self, message: str) -> None:
+        """Queue an encoded message for every subscriber. Safe to call from any thread."""
+        if not self._subscribers or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(message)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, message)
+
+    def _deliver(self, message: str | None) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._subscribers.discard(queue)
+                queue.get_nowait()  # make room for the close marker
+                queue.put_nowait(None)
+
+    def close(self) -> None:
+        """End every open stream (used at shutdown)."""
+        self._deliver(None)
+        self._subscribers.clear()
+
+
+broadcaster = Broadcaster()
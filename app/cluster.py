@@ -0,0 +1,130 @@
+"""Coordination between worker processes that share one database.
+
+Set ``WEB_CONCURRENCY`` to run several workers (uvicorn reads it too). They
+coordinate through SQLite alone, no extra service:
+
+- Each process writes its changes to ``change_log`` and follows everyone
+  else's, so data versions, and the ETags and caches built on them, catch up
+  with writes made elsewhere within a couple of ``CHANGE_POLL_MS``. That
+  includes CLI tools such as ``app.importer``. Changes a worker had yet to
+  write when it died are covered by its replacement's ``start()``.
+- With more than one worker, server-sent events are relayed through the log
+  to clients connected to the other workers.
+- Leases let one process at a time run periodic jobs like scheduled syncs
+  and maintenance.
+"""
+
+import asyncio
+import contextlib
+import os
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from . import versions
+from .broadcast import broadcaster
+from .database import async_engine
+from .models import ChangeLogEntry, Lease
+
+WORKERS = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+CHANGE_POLL_MS = float(os.getenv("CHANGE_POLL_MS", "250"))
+
+_changes = ChangeLogEntry.__table__
+_leases = Lease.__table__
+# Messages published here, waiting for the next poll to write them out
+_outbox: deque[str] = deque()
+
+
+def _relay(message: str) -> None:
+    _outbox.append(message)  # thread-safe; publish() runs in any thread
+
+
+async def start() -> int:
+    """Adopt the database's versions before serving; returns the change id to follow from.
+
+    Also logs a change to every table. Uvicorn replaces a worker that dies,
+    and whatever the dead one changed since its last poll never reached the
+    log; this makes every process drop anything cached from before.
+    """
+    async with async_engine.begin() as conn:
+        await conn.run_sync(versions.record, [versions.ALL])
+        return await conn.run_sync(versions.load)
+
+
+async def follow(last: int, interval: float = CHANGE_POLL_MS / 1000) -> None:
+    """Apply other processes' changes after ``last`` and relay events until cancelled."""
+    versions.defer_logging(True)
+    if WORKERS > 1:
+        broadcaster.relay = _relay
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await _write_changes()
+                last = await _catch_up(last)
+            except Exception as e:  # e.g. the database is locked; retry next time
+                print(f"[CLUSTER] Following the change log failed: {e!r}")
+    finally:
+        broadcaster.relay = None
+        versions.defer_logging(False)
+        with contextlib.suppress(Exception):
+            await _write_changes()
+
+
+async def _write_changes() -> None:
+    """Log this process's changes since the last poll as one row, plus any relayed events."""
+    tables, sequence = versions.unlogged()
+    messages = []
+    while _outbox:
+        messages.append(_outbox.popleft())
+    if not tables and not messages:
+        return
+    try:
+        async with async_engine.begin() as conn:
+            if tables:
+                result = await conn.execute(insert(_changes).values(
+                    origin=versions.ORIGIN, tables=",".join(sorted(tables))))
+            if messages:
+                await conn.execute(insert(_changes), [
+                    {"origin": versions.ORIGIN, "tables": "", "message": m} for m in messages
+                ])
+    except Exception:
+        _outbox.extendleft(reversed(messages))
+        raise
+    if tables:
+        versions.logged(result.inserted_primary_key[0], tables, sequence)
+
+
+async def _catch_up(last: int) -> int:
+    async with async_engine.connect() as conn:
+        rows = (await conn.execute(
+            select(_changes.c.id, _changes.c.origin, _changes.c.tables, _changes.c.message)
+            .where(_changes.c.id > last)
+            .order_by(_changes.c.id)
+        )).all()
+    for change_id, origin, tables, message in rows:
+        last = change_id
+        if origin == versions.ORIGIN:
+            continue  # applied and delivered when it happened
+        if tables:
+            versions.apply(change_id, tables.split(","))
+        if message:
+            broadcaster.deliver(message)
+    return last
+
+
+async def claim(name: str, seconds: float) -> bool:
+    """Take or renew lease ``name`` for ``seconds``; False while another process holds it."""
+    now = datetime.utcnow()
+    stmt = sqlite_insert(_leases).values(name=name, owner=versions.ORIGIN,
+                                         expires_at=now + timedelta(seconds=seconds))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_leases.c.name],
+        set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+        where=(_leases.c.expires_at <= now) | (_leases.c.owner == versions.ORIGIN),
+    )
+    async with async_engine.begin() as conn:
+        result = await conn.execute(stmt)
+    return result.rowcount > 0
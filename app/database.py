@@ -1,13 +1,84 @@
 import os
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///kegs.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# "production" tunes SQLite for concurrent readers and writers (WAL, relaxed
+# fsync, bigger page cache); "default" leaves SQLite's stock settings alone.
+DATABASE_PROFILE = os.getenv("DATABASE_PROFILE", "default").lower()
+
+# Starlette runs sync endpoints on a 40-thread pool; give each a connection
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "40"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+
+def _production_pragmas() -> dict[str, str | int]:
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")),  # negative = KiB
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "temp_store": "MEMORY",
+    }
+
+
+def _apply_pragmas(engine: Engine, pragmas: dict[str, str | int]) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL, profile: str = DATABASE_PROFILE) -> Engine:
+    """Build the app's engine for ``url`` using the named tuning profile."""
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+    if profile != "production":
+        return create_engine(url, connect_args={"check_same_thread": False})
+
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+    )
+    _apply_pragmas(engine, _production_pragmas())
+    return engine
+
+
+def _async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+
+def create_async_db_engine(url: str = DATABASE_URL, profile: str = DATABASE_PROFILE) -> AsyncEngine:
+    """Async counterpart of create_db_engine, backed by aiosqlite for SQLite URLs."""
+    url = _async_url(url)
+    if not url.startswith("sqlite") or profile != "production":
+        return create_async_engine(url)
+
+    engine = create_async_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+    _apply_pragmas(engine.sync_engine, _production_pragmas())
+    return engine
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(bind=engine)
 
+async_engine = create_async_db_engine()
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession)
+
 
 class Base(DeclarativeBase):
     pass
@@ -19,3 +90,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Session for async endpoints; they hold no worker thread while waiting on the database.
+
+    Shared sync helpers can be reused via ``await db.run_sync(fn, ...)``,
+    which runs them against the same connection without blocking the loop.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
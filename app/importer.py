@@ -0,0 +1,340 @@
+"""Bulk import of keg definitions and keg event history from CSV or NDJSON.
+
+Uses the same columns as ``/api/export``, so an export can be re-imported
+elsewhere. Rows are validated one at a time as they're read (unknown
+statuses, event types, people or locations, missing kegs, bad timestamps)
+and invalid rows are reported by line number and skipped. Valid rows are
+inserted with executemany in chunks, committing every ``_COMMIT_ROWS``
+rows, so a million events take a handful of transactions; a chunk the
+database rejects (say, a keg created meanwhile with the same id) is retried
+row by row so only the offending rows are reported. Imported events are
+then folded into the stats rollups with a single rebuild, committed
+together with the last chunk.
+
+    python -m app.importer kegs kegs.csv
+    python -m app.importer events history.ndjson --dry-run
+"""
+
+import argparse
+import csv
+import json
+import sys
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import IO
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import maintenance, rollups
+from .models import EVENT_TYPES, Batch, Keg, KegEvent, KegStatus, Location, Person
+from .timestamps import naive_utc
+
+FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 100
+_CHUNK_ROWS = 10_000
+_COMMIT_ROWS = 200_000
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    imported: int = 0
+    error_count: int = 0
+    errors: list[dict] = field(default_factory=list)
+    dry_run: bool = False
+
+    def add_error(self, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "dry_run": self.dry_run,
+        }
+
+
+# ── Parsing ──────────────────────────────────────────────────
+
+
+def _records(stream: IO[str], fmt: str) -> Iterator[tuple[int, dict | None]]:
+    """Yield (line number, row); row is None when the line isn't a JSON object."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_no, row if isinstance(row, dict) else None
+
+
+def _text(row: dict, key: str) -> str:
+    value = row.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def _int(row: dict, key: str) -> int:
+    value = _text(row, key)
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{key} must be an integer, got {value!r}") from None
+
+
+def _timestamp(row: dict) -> datetime:
+    value = _text(row, "timestamp")
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"timestamp must be ISO 8601, got {value!r}") from None
+    return naive_utc(ts)
+
+
+# ── Validation ───────────────────────────────────────────────
+
+
+@dataclass
+class _Context:
+    people: set[str]
+    locations: set[str]
+    kegs: set[int]
+    batches: set[str]
+
+    @classmethod
+    def load(cls, db: Session) -> "_Context":
+        return cls(
+            people=set(db.scalars(select(Person.name))),
+            locations=set(db.scalars(select(Location.name))),
+            kegs=set(db.scalars(select(Keg.id))),
+            batches=set(db.scalars(select(Batch.id))),
+        )
+
+    def check_location(self, name: str) -> None:
+        if name and name not in self.people and name not in self.locations:
+            raise ValueError(f"Unknown person or location {name!r}")
+
+
+def _event_row(row: dict, ctx: _Context) -> dict:
+    event_type = _text(row, "event_type")
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown event_type {event_type!r}")
+    keg_id = _int(row, "keg_id")
+    if keg_id not in ctx.kegs:
+        raise ValueError(f"Keg {keg_id} not found")
+    person = _text(row, "person")
+    ctx.check_location(person)
+    if event_type == "assigned" and person not in ctx.people:
+        raise ValueError("assigned events need a known person")
+    return {
+        "keg_id": keg_id,
+        "event_type": event_type,
+        "person": person,
+        "batch_id": _text(row, "batch_id") or None,
+        "batch_name": _text(row, "batch_name"),
+        "style": _text(row, "style"),
+        "timestamp": _timestamp(row),
+    }
+
+
+def _keg_row(row: dict, ctx: _Context) -> dict:
+    keg: dict = {"id": None}  # executemany needs the same keys in every row
+    if _text(row, "id"):
+        keg_id = _int(row, "id")
+        if keg_id in ctx.kegs:
+            raise ValueError(f"Keg {keg_id} already exists")
+        keg["id"] = keg_id
+    label = _text(row, "label") or (f"Keg #{keg['id']}" if keg["id"] is not None else "")
+    if not label:
+        raise ValueError("label is required when id is not given")
+    if len(label) > 100:
+        raise ValueError("label is too long (max 100 characters)")
+    status = _text(row, "status") or KegStatus.empty.value
+    try:
+        keg["status"] = KegStatus(status)
+    except ValueError:
+        raise ValueError(f"Unknown status {status!r}") from None
+    location = _text(row, "location")
+    ctx.check_location(location)
+    batch_id = _text(row, "batch_id") or None
+    if batch_id and batch_id not in ctx.batches:
+        raise ValueError(f"Batch {batch_id!r} not found")
+    notes = _text(row, "notes")
+    if len(notes) > 2000:
+        raise ValueError("notes are too long (max 2000 characters)")
+    keg.update(label=label, location=location, batch_id=batch_id,
+               date_purchased=_text(row, "date_purchased"), notes=notes)
+    if keg["id"] is not None:
+        ctx.kegs.add(keg["id"])  # catches duplicates later in the same file
+    return keg
+
+
+# ── Import ───────────────────────────────────────────────────
+
+
+def _begin(db: Session) -> None:
+    # pysqlite only emits BEGIN before DML, so a SAVEPOINT would otherwise
+    # open a transaction of its own, and releasing it would commit every chunk
+    conn = db.connection()
+    if conn.dialect.name == "sqlite" and not conn.connection.dbapi_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+
+
+def _insert(db: Session, model, rows: list[dict], line_nos: list[int], result: ImportResult) -> int:
+    """Insert validated rows; rejected ones are reported by their ``line_nos``. Returns how many went in."""
+    # Core insert of the table: a plain executemany, no ORM bookkeeping
+    stmt = insert(model.__table__)
+    _begin(db)
+    try:
+        with db.begin_nested():
+            db.execute(stmt, rows)
+        return len(rows)
+    except IntegrityError:
+        pass
+    # Something in this chunk was rejected: retry row by row to isolate it
+    inserted = 0
+    for line_no, values in zip(line_nos, rows):
+        try:
+            with db.begin_nested():
+                db.execute(stmt, values)
+            inserted += 1
+        except IntegrityError as e:
+            result.add_error(line_no, f"Rejected by the database: {e.orig}")
+    return inserted
+
+
+def _import(db: Session, stream: IO[str], fmt: str, model,
+            validate: Callable[[dict, _Context], dict], dry_run: bool,
+            insert_last: Callable[[dict], bool] | None = None,
+            before_commit: Callable[[Session], None] | None = None) -> ImportResult:
+    """Validate and insert every row; rows matching ``insert_last`` are held back until the end.
+
+    Commits every ``_COMMIT_ROWS`` rows, calling ``before_commit`` first; the
+    caller commits the rest.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format {fmt!r}")
+    ctx = _Context.load(db)
+    result = ImportResult(dry_run=dry_run)
+    chunk: list[dict] = []
+    chunk_lines: list[int] = []
+    held_back: list[dict] = []
+    held_back_lines: list[int] = []
+    uncommitted = 0
+
+    def flush(rows: list[dict], line_nos: list[int]) -> None:
+        nonlocal uncommitted
+        if not rows:
+            return
+        if dry_run:
+            result.imported += len(rows)
+        else:
+            result.imported += _insert(db, model, rows, line_nos, result)
+            uncommitted += len(rows)
+            if uncommitted >= _COMMIT_ROWS:
+                if before_commit is not None:
+                    before_commit(db)
+                db.commit()
+                uncommitted = 0
+        rows.clear()
+        line_nos.clear()
+
+    for line_no, row in _records(stream, fmt):
+        result.rows += 1
+        if row is None:
+            result.add_error(line_no, "Not a JSON object")
+            continue
+        try:
+            values = validate(row, ctx)
+        except ValueError as e:
+            result.add_error(line_no, str(e))
+            continue
+        if insert_last is not None and insert_last(values):
+            held_back.append(values)
+            held_back_lines.append(line_no)
+            continue
+        chunk.append(values)
+        chunk_lines.append(line_no)
+        if len(chunk) >= _CHUNK_ROWS:
+            flush(chunk, chunk_lines)
+    flush(chunk, chunk_lines)
+    for start in range(0, len(held_back), _CHUNK_ROWS):
+        end = start + _CHUNK_ROWS
+        flush(held_back[start:end], held_back_lines[start:end])
+    return result
+
+
+def import_kegs(db: Session, stream: IO[str], fmt: str = "csv", dry_run: bool = False) -> ImportResult:
+    # Numbered kegs go in first, so one numbered automatically can't take
+    # an id that a later row of the file asks for
+    result = _import(db, stream, fmt, Keg, _keg_row, dry_run,
+                     insert_last=lambda keg: keg["id"] is None)
+    if not dry_run:
+        db.commit()
+    return result
+
+
+def import_events(db: Session, stream: IO[str], fmt: str = "csv", dry_run: bool = False) -> ImportResult:
+    """Import events, then rebuild the rollups in the transaction of the last chunk.
+
+    The rebuild holds the database write lock while it replays the whole
+    event log, several seconds for a few hundred thousand events, and every
+    other writer waits. Chunks committed before it mark the rollups stale,
+    so they're rebuilt on the next start if this never gets there.
+    """
+    result = _import(db, stream, fmt, KegEvent, _event_row, dry_run,
+                     before_commit=rollups.mark_stale)
+    if dry_run or not result.imported:
+        return result
+    # Imported history interleaves with what's already logged, so replay it all
+    rollups.rebuild(db)
+    db.commit()
+    # Old rows belong in the archive
+    if maintenance.EVENT_ARCHIVE_DAYS > 0:
+        maintenance.archive_events(db, maintenance.archive_cutoff())
+    return result
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    from . import migrations
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(prog="python -m app.importer",
+                                     description="Import kegs or keg events from CSV or NDJSON.")
+    parser.add_argument("kind", choices=("kegs", "events"))
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=FORMATS,
+                        help="defaults to the file extension (.ndjson/.jsonl, else csv)")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    fmt = args.format or ("ndjson" if args.path.suffix in (".ndjson", ".jsonl") else "csv")
+    importer = import_kegs if args.kind == "kegs" else import_events
+    migrations.run()
+    with SessionLocal() as db, args.path.open(newline="", encoding="utf-8") as stream:
+        result = importer(db, stream, fmt, dry_run=args.dry_run)
+
+    for error in result.errors:
+        print(f"[IMPORT] line {error['line']}: {error['error']}")
+    if result.error_count > len(result.errors):
+        print(f"[IMPORT] ... and {result.error_count - len(result.errors)} more errors")
+    verb = "Validated" if result.dry_run else "Imported"
+    print(f"[IMPORT] {verb} {result.imported} of {result.rows} {args.kind} rows")
+    return 1 if result.error_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""Opt-in request timing and SQL query metrics (``METRICS_ENABLED=1``).
+
+An ASGI middleware times every request by route template and collects the
+statements it runs through engine events, via a context variable that
+follows the request into threadpool workers and ``run_sync`` calls. The
+totals are served at ``/metrics`` in Prometheus text format.
+
+Per request it also flags likely N+1 queries (the same statement run
+``N_PLUS_ONE_THRESHOLD`` or more times) and logs requests slower than
+``SLOW_REQUEST_MS`` with their query breakdown. Statements run outside a
+request (sync jobs, maintenance) aren't counted.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+# Expanded IN lists vary in length; fold them so the statement groups together
+_IN_LIST = re.compile(r"\(\?(?:, \?)+\)")
+
+
+@dataclass
+class _QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class _RequestStats:
+    queries: int = 0
+    query_seconds: float = 0.0
+    statements: dict[str, _QueryStats] = field(default_factory=lambda: defaultdict(_QueryStats))
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.query_seconds += seconds
+        stats = self.statements[_IN_LIST.sub("(?)", statement)]
+        stats.count += 1
+        stats.seconds += seconds
+
+
+_current: ContextVar[_RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+# ── Aggregates ───────────────────────────────────────────────
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+_lock = threading.Lock()
+_requests: dict[tuple[str, str, str], int] = defaultdict(int)  # (method, route, status)
+_durations: dict[tuple[str, str], _Histogram] = {}
+_query_counts: dict[tuple[str, str], _Histogram] = {}
+_query_seconds: dict[tuple[str, str], float] = defaultdict(float)
+_n_plus_one: dict[tuple[str, str], int] = defaultdict(int)
+_slow: dict[tuple[str, str], int] = defaultdict(int)
+_reported_n_plus_one: set[tuple[str, str, str]] = set()
+
+
+def _record(method: str, route: str, status: int, seconds: float, stats: _RequestStats) -> None:
+    key = (method, route)
+    repeated = [(sql, s) for sql, s in stats.statements.items() if s.count >= N_PLUS_ONE_THRESHOLD]
+    slow = seconds * 1000 >= SLOW_REQUEST_MS
+    with _lock:
+        _requests[(method, route, str(status))] += 1
+        _durations.setdefault(key, _Histogram(_DURATION_BUCKETS)).observe(seconds)
+        _query_counts.setdefault(key, _Histogram(_QUERY_COUNT_BUCKETS)).observe(stats.queries)
+        _query_seconds[key] += stats.query_seconds
+        if repeated:
+            _n_plus_one[key] += 1
+        if slow:
+            _slow[key] += 1
+        # Log each repeated statement once per route, not on every request
+        new_repeats = [(sql, s) for sql, s in repeated if (method, route, sql) not in _reported_n_plus_one]
+        _reported_n_plus_one.update((method, route, sql) for sql, _ in new_repeats)
+
+    for sql, s in new_repeats:
+        print(f"[METRICS] Possible N+1 in {method} {route}: {s.count}× {_short(sql)}")
+    if slow:
+        print(f"[METRICS] Slow request {method} {route} {status} took {seconds * 1000:.0f}ms, "
+              f"{stats.queries} queries in {stats.query_seconds * 1000:.0f}ms")
+        top = sorted(stats.statements.items(), key=lambda item: item[1].seconds, reverse=True)[:5]
+        for sql, s in top:
+            print(f"[METRICS]   {s.count}× {s.seconds * 1000:.1f}ms {_short(sql)}")
+
+
+def _short(sql: str, limit: int = 160) -> str:
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= limit else sql[: limit - 1] + "…"
+
+
+# ── Collection ───────────────────────────────────────────────
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.add(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _route_label(scope: Scope) -> str:
+    # The router stores the matched route in the scope; use its template so
+    # /api/kegs/1 and /api/kegs/2 share a series. Anything else (static
+    # files, 404s) is lumped together to keep the label set small.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "other"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                streaming = content_type.startswith(b"text/event-stream")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # An event stream lasts as long as the client stays; its duration isn't latency
+            if not streaming:
+                _record(scope["method"], _route_label(scope), status,
+                        time.perf_counter() - started, stats)
+
+
+# ── Exposition ───────────────────────────────────────────────
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, histograms: dict[tuple[str, str], _Histogram]) -> list[str]:
+    lines = []
+    for (method, route), h in sorted(histograms.items()):
+        for bound, count in zip(h.buckets, h.counts):
+            lines.append(f"{name}_bucket{_labels(method=method, route=route, le=f'{bound:g}')} {count}")
+        lines.append(f"{name}_bucket{_labels(method=method, route=route, le='+Inf')} {h.total}")
+        lines.append(f"{name}_sum{_labels(method=method, route=route)} {h.sum:.6f}")
+        lines.append(f"{name}_count{_labels(method=method, route=route)} {h.total}")
+    return lines
+
+
+def _counter_lines(name: str, values: dict[tuple[str, str], float]) -> list[str]:
+    return [f"{name}{_labels(method=m, route=r)} {v:g}" for (m, r), v in sorted(values.items())]
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    with _lock:
+        lines = [
+            "# HELP keg_http_requests_total Requests handled, by route and status.",
+            "# TYPE keg_http_requests_total counter",
+        ]
+        lines += [f"keg_http_requests_total{_labels(method=m, route=r, status=s)} {n}"
+                  for (m, r, s), n in sorted(_requests.items())]
+        lines += [
+            "# HELP keg_http_request_duration_seconds Request latency, excluding event streams.",
+            "# TYPE keg_http_request_duration_seconds histogram",
+            *_histogram_lines("keg_http_request_duration_seconds", _durations),
+            "# HELP keg_db_queries_per_request SQL statements executed per request.",
+            "# TYPE keg_db_queries_per_request histogram",
+            *_histogram_lines("keg_db_queries_per_request", _query_counts),
+            "# HELP keg_db_query_seconds_total Time spent executing SQL, by route.",
+            "# TYPE keg_db_query_seconds_total counter",
+            *_counter_lines("keg_db_query_seconds_total", _query_seconds),
+            "# HELP keg_n_plus_one_requests_total Requests that repeated one statement "
+            f"{N_PLUS_ONE_THRESHOLD}+ times.",
+            "# TYPE keg_n_plus_one_requests_total counter",
+            *_counter_lines("keg_n_plus_one_requests_total", _n_plus_one),
+            f"# HELP keg_slow_requests_total Requests slower than {SLOW_REQUEST_MS:g}ms.",
+            "# TYPE keg_slow_requests_total counter",
+            *_counter_lines("keg_slow_requests_total", _slow),
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def install(app: FastAPI, engines: tuple[Engine, ...]) -> None:
+    """Add the middleware, engine listeners and ``/metrics`` route to ``app``."""
+    for engine in engines:
+        instrument_engine(engine)
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
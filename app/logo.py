@@ -0,0 +1,146 @@
+"""Custom brewery logo: resized once on upload, served from cached metadata.
+
+The upload is kept as ``custom_logo{ext}`` in the data directory. When Pillow
+is installed, PNG, JPEG and WebP uploads are also scaled down to each of
+``SIZES`` (longest side, in pixels) and saved next to it as
+``custom_logo-{size}{ext}``; GIFs keep their animation and SVGs scale
+themselves, so those are only ever served as uploaded.
+
+The files' paths, media types and ETags are read once and kept in memory
+until the brewery settings change, so serving a logo never lists the
+directory. URLs carry the upload's content hash (``?v=``), which lets
+browsers cache them for good.
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import versions
+
+try:
+    from PIL import Image
+except ImportError:  # optional; without it only the original is served
+    Image = None
+
+SIZES = (64, 128, 256)
+MEDIA_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".svg": "image/svg+xml",
+    ".webp": "image/webp",
+}
+
+_RESIZABLE = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP"}
+_FILE_NAME = re.compile(r"^custom_logo(?:-(\d+))?(\.\w+)$")
+
+
+@dataclass(frozen=True)
+class Variant:
+    size: int | None  # longest side; None for the original
+    path: Path
+    media_type: str
+    etag: str
+
+
+@dataclass(frozen=True)
+class Logo:
+    version: str  # content hash of the original upload
+    variants: tuple[Variant, ...]  # smallest first, original last
+
+    def pick(self, size: int | None) -> Variant:
+        """Smallest variant at least ``size`` pixels across, else the original."""
+        if size is not None:
+            for variant in self.variants:
+                if variant.size is None or variant.size >= size:
+                    return variant
+        return self.variants[-1]
+
+
+_UNLOADED = object()
+_logo: Logo | None | object = _UNLOADED
+
+
+def _digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+
+
+def _scan(data_dir: Path) -> Logo | None:
+    original = None
+    resized = []
+    for path in data_dir.glob("custom_logo*"):
+        match = _FILE_NAME.match(path.name)
+        ext = match and match.group(2).lower()
+        if ext not in MEDIA_TYPES:
+            continue
+        size = int(match.group(1)) if match.group(1) else None
+        try:
+            variant = Variant(size, path, MEDIA_TYPES[ext], f'"{_digest(path)}"')
+        except OSError:  # removed while scanning
+            continue
+        if size is None:
+            original = variant
+        else:
+            resized.append(variant)
+    if original is None:
+        return None
+    resized.sort(key=lambda v: v.size)
+    return Logo(original.etag.strip('"')[:10], (*resized, original))
+
+
+def current(data_dir: Path) -> Logo | None:
+    global _logo
+    logo = _logo
+    if logo is _UNLOADED:
+        logo = _logo = _scan(data_dir)
+    return logo
+
+
+def invalidate() -> None:
+    """Forget the cached files; the next ``current()`` reads the directory again."""
+    global _logo
+    _logo = _UNLOADED
+
+
+def remove(data_dir: Path, keep: Path | None = None) -> None:
+    for path in data_dir.glob("custom_logo*"):
+        if path != keep and _FILE_NAME.match(path.name):
+            path.unlink(missing_ok=True)
+    invalidate()
+
+
+def install(data_dir: Path, upload: Path, ext: str) -> None:
+    """Replace the logo with the ``upload`` temp file and build its resized variants.
+
+    Resizing is CPU-bound, so call this from a worker thread.
+    """
+    final_path = data_dir / f"custom_logo{ext}"
+    remove(data_dir, keep=final_path)
+    upload.replace(final_path)
+    _resize(final_path, data_dir, ext)
+    # Settings responses embed the logo's version in its URL
+    versions.bump("brewery_settings")
+
+
+def _resize(original: Path, data_dir: Path, ext: str) -> None:
+    fmt = _RESIZABLE.get(ext)
+    if Image is None or fmt is None:
+        return
+    try:
+        with Image.open(original) as image:
+            image.load()
+            for size in SIZES:
+                if max(image.size) <= size:
+                    break
+                variant = image.copy()
+                variant.thumbnail((size, size), Image.LANCZOS)
+                variant.save(data_dir / f"custom_logo-{size}{ext}", fmt, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # The original is still served; it's just not scaled down
+        print(f"[LOGO] Could not resize {original.name}: {e!r}")
+
+
+versions.on_bump("brewery_settings", invalidate)
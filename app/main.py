@@ -1,4 +1,9 @@
+import asyncio
+import contextlib
 import os
+import signal
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
@@ -8,55 +13,93 @@ from starlette.middleware import Middleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
-from sqlalchemy import text
 
-from .database import Base, SessionLocal, engine
-from .models import BrewerySettings, Keg, KegStatus, Location, Person
-from .routers import batches, kegs, people, settings, stats
-
-Base.metadata.create_all(bind=engine)
-
-# Safe migration: add keg_volume_litres column if it doesn't exist yet
-with engine.connect() as _conn:
-    try:
-        _conn.execute(text("ALTER TABLE brewery_settings ADD COLUMN keg_volume_litres REAL DEFAULT 19.0"))
-        _conn.commit()
-    except Exception:
-        pass  # Column already exists
-
-# Seed initial data
-with SessionLocal() as db:
-    if db.query(Keg).count() == 0:
-        for i in range(1, 17):
-            db.add(Keg(id=i, label=f"Keg #{i}", status=KegStatus.empty))
-        db.commit()
-    if db.query(Person).count() == 0:
-        for name in ["Michael", "Troy", "Brent"]:
-            db.add(Person(name=name))
-        db.commit()
-    if db.query(Location).count() == 0:
-        db.add(Location(name="Conditioning Fridge"))
-        db.commit()
-    if db.query(BrewerySettings).count() == 0:
-        db.add(BrewerySettings(id=1, name="Blue Dog Brewing"))
-        db.commit()
-
-app = FastAPI(title="Keg Tracker")
+from . import admin, assets, brewfather, cluster, instrumentation, maintenance, migrations, profiler, rollups
+from .database import async_engine, engine
+from .broadcast import broadcaster
+from .compression import CompressionMiddleware
+from .routers import admin as admin_router
+from .routers import assets as assets_router
+from .routers import batches, export, imports, kegs, people, settings, stats, stream
+from .sync_jobs import scheduler_enabled, sync_manager
+
+migrations.run()
+rollups.rebuild_if_needed()  # after an import that never finished
+
+
+def _end_streams_on_exit(loop: asyncio.AbstractEventLoop) -> None:
+    """Close SSE streams as soon as the server is told to stop.
+
+    Uvicorn waits for open connections before running lifespan shutdown, and
+    event streams never finish on their own, so hook its signal handlers.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            loop.call_soon_threadsafe(broadcaster.close)
+            previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    loop = asyncio.get_running_loop()
+    broadcaster.bind(loop)
+    _end_streams_on_exit(loop)
+    await brewfather.open_client()
+    last_change = await cluster.start()
+    tasks = []
+    if cluster.CHANGE_POLL_MS > 0:
+        tasks.append(asyncio.create_task(cluster.follow(last_change)))
+    if scheduler_enabled():
+        tasks.append(asyncio.create_task(sync_manager.run_schedule()))
+    if maintenance.MAINTENANCE_INTERVAL_HOURS > 0:
+        tasks.append(asyncio.create_task(maintenance.run_schedule()))
+    yield
+    for task in tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    broadcaster.close()
+    await brewfather.close_client()
+
+
+app = FastAPI(title="Keg Tracker", lifespan=lifespan)
 
 
 class NoCacheStaticMiddleware(BaseHTTPMiddleware):
-    """Prevent browsers from serving stale static files."""
+    """Prevent browsers from serving stale static files.
+
+    Fingerprinted ``/assets/`` URLs are exempt: their content never changes.
+    """
 
     async def dispatch(self, request: Request, call_next):
         response: Response = await call_next(request)
         path = request.url.path
+        if path.startswith(assets.ASSET_PREFIX):
+            return response
         if path.endswith((".js", ".css", ".html")) or path == "/":
             response.headers["Cache-Control"] = "no-cache, must-revalidate"
         return response
 
 
+# Compression sits inside NoCacheStaticMiddleware, which re-streams every
+# body and would otherwise hide the real response size from it
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(NoCacheStaticMiddleware)
 
+if instrumentation.METRICS_ENABLED:
+    instrumentation.install(app, engines=(engine, async_engine.sync_engine))
+
+if admin.ADMIN_TOKEN:
+    app.add_middleware(profiler.ProfileRequestMiddleware)
+
 _VERSION_FILE = Path(__file__).parent.parent / "VERSION"
 
 
@@ -80,6 +123,12 @@ app.include_router(stats.router)
 app.include_router(people.router)
 app.include_router(people.locations_router)
 app.include_router(settings.router)
+app.include_router(stream.router)
+app.include_router(export.router)
+app.include_router(imports.router)
+app.include_router(admin_router.router)
+app.include_router(assets_router.router)
 
+# Plain paths (/app.js, /logo.png) still work for anything that links to them
 static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
 app.mount("/", StaticFiles(directory=static_dir, html=True), name="static")
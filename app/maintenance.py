@@ -0,0 +1,151 @@
+"""Periodic database upkeep: event archival, ANALYZE and VACUUM.
+
+A pass also rebuilds the stats rollups if an import left them stale.
+
+Events older than ``EVENT_ARCHIVE_DAYS`` move from ``keg_events`` into
+``keg_events_archive`` so the live table and its indexes stay small. They
+are already folded into the stats rollups when logged, so all-time stats are
+unaffected, and windowed stats, the event feed and rollup rebuilds read
+the archive too.
+
+The app runs a pass every ``MAINTENANCE_INTERVAL_HOURS``; run one by hand
+with ``python -m app.maintenance``.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import cluster, rollups, versions
+from .models import ChangeLogEntry, KegEvent, KegEventArchive
+
+EVENT_ARCHIVE_DAYS = float(os.getenv("EVENT_ARCHIVE_DAYS", "365"))
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "24"))
+# VACUUM rewrites the whole file, so only bother once enough pages are free
+VACUUM_MIN_FREE_PERCENT = float(os.getenv("VACUUM_MIN_FREE_PERCENT", "20"))
+_ARCHIVE_CHUNK = 5000
+# Workers read the change log within a poll interval; the rest is history
+_CHANGE_LOG_KEEP = timedelta(hours=1)
+
+_EVENT_COLUMNS = ("id", "keg_id", "event_type", "person", "batch_id", "batch_name", "style", "timestamp")
+
+
+def archive_events(db: Session, before: datetime, chunk_size: int = _ARCHIVE_CHUNK) -> int:
+    """Move events logged before ``before`` into the archive. Commits per chunk."""
+    # The newest event always stays live: SQLite hands out max(id) + 1, so an
+    # empty keg_events would reuse ids that are already in the archive
+    newest = db.scalar(select(func.max(KegEvent.id)))
+    if newest is None:
+        return 0
+
+    moved = 0
+    while True:
+        ids = db.scalars(
+            select(KegEvent.id)
+            .where(KegEvent.timestamp < before, KegEvent.id < newest)
+            .order_by(KegEvent.id)
+            .limit(chunk_size)
+        ).all()
+        if not ids:
+            return moved
+        # An id range (not an IN list of thousands) picks out the chunk again
+        chunk = (KegEvent.id.between(ids[0], ids[-1]), KegEvent.timestamp < before)
+        columns = [getattr(KegEvent, c) for c in _EVENT_COLUMNS]
+        db.execute(
+            insert(KegEventArchive).from_select(list(_EVENT_COLUMNS), select(*columns).where(*chunk))
+        )
+        db.execute(delete(KegEvent).where(*chunk))
+        versions.touch(db, "stats")  # per-person recent events come from the live table
+        db.commit()  # short write transactions; requests interleave between chunks
+        moved += len(ids)
+
+
+def archive_cutoff(archive_days: float = EVENT_ARCHIVE_DAYS) -> datetime:
+    return datetime.utcnow() - timedelta(days=archive_days)
+
+
+def prune_change_log(engine: Engine, before: datetime) -> int:
+    table = ChangeLogEntry.__table__
+    with engine.begin() as conn:
+        # Row 0 names the database; it's kept forever
+        result = conn.execute(delete(table).where(table.c.id > 0, table.c.created_at < before))
+    return result.rowcount
+
+
+def analyze(engine: Engine) -> None:
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA optimize"))
+        conn.commit()
+
+
+def vacuum_if_fragmented(engine: Engine, min_free_percent: float = VACUUM_MIN_FREE_PERCENT) -> bool:
+    """VACUUM when at least ``min_free_percent`` of the file is free pages."""
+    with engine.connect() as conn:
+        pages = conn.scalar(text("PRAGMA page_count")) or 0
+        free = conn.scalar(text("PRAGMA freelist_count")) or 0
+    if not pages or free * 100 / pages < min_free_percent:
+        return False
+    # VACUUM can't run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+        if conn.scalar(text("PRAGMA journal_mode")) == "wal":
+            conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    return True
+
+
+def run_maintenance(archive_days: float = EVENT_ARCHIVE_DAYS, vacuum: bool = True) -> dict:
+    """One maintenance pass; returns what it did."""
+    from .database import SessionLocal, engine
+
+    result = {"archived": 0, "vacuumed": False, "rebuilt_rollups": rollups.rebuild_if_needed()}
+    if archive_days > 0:
+        with SessionLocal() as db:
+            result["archived"] = archive_events(db, archive_cutoff(archive_days))
+    prune_change_log(engine, datetime.utcnow() - _CHANGE_LOG_KEEP)
+    analyze(engine)
+    if vacuum:
+        result["vacuumed"] = vacuum_if_fragmented(engine)
+    print(f"[MAINT] Archived {result['archived']} events"
+          + (", vacuumed" if result["vacuumed"] else ""))
+    return result
+
+
+async def run_schedule(interval_hours: float = MAINTENANCE_INTERVAL_HOURS) -> None:
+    """Run maintenance every interval until cancelled, off the event loop."""
+    # Spread out the first pass so it doesn't compete with startup traffic
+    delay = random.uniform(60, 600)
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            # Every worker runs this loop; the lease makes one of them do the pass
+            if await cluster.claim("maintenance", interval_hours * 1800):
+                await asyncio.to_thread(run_maintenance)
+        except Exception as e:
+            print(f"[MAINT] Maintenance failed: {e!r}")
+        delay = interval_hours * 3600
+
+
+def main(argv: list[str] | None = None) -> int:
+    from . import migrations
+
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance",
+                                     description="Archive old keg events and compact the database.")
+    parser.add_argument("--archive-days", type=float, default=EVENT_ARCHIVE_DAYS,
+                        help="archive events older than this many days (0 skips archival)")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip VACUUM")
+    args = parser.parse_args(argv)
+
+    migrations.run()
+    run_maintenance(args.archive_days, vacuum=not args.no_vacuum)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
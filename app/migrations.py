@@ -0,0 +1,364 @@
+"""Versioned schema migrations and one-time seeding.
+
+Applied migrations are recorded in ``schema_migrations``. Startup reads that
+table and stops there when nothing is pending, so a restart or a new worker
+costs two small queries. Otherwise the runner opens its own connection and
+takes SQLite's write lock with ``BEGIN IMMEDIATE`` before re-checking, so
+workers starting together queue up behind the first one instead of racing
+on DDL; the others find nothing left to do. All pending migrations run in
+that one transaction.
+
+Released migrations are never edited or renumbered: a schema change gets a
+new entry at the end of ``MIGRATIONS``. Their DDL is spelled out rather than
+derived from ``app.models``, so a migration creates the same tables however
+the models change later. Run them ahead of a deploy with
+``python -m app.migrations``.
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from collections.abc import Callable
+
+from sqlalchemy import (
+    Column, DateTime, Engine, Integer, MetaData, String, Table, create_engine, event, func, inspect,
+    select, text,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from . import rollups
+from .database import engine
+from .models import BrewerySettings, ChangeLogEntry, Keg, KegStatus, Location, Person
+
+# How long a starting worker waits for another one's migrations to finish
+MIGRATION_LOCK_TIMEOUT = float(os.getenv("MIGRATION_LOCK_TIMEOUT", "300"))
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False, server_default=func.current_timestamp()),
+)
+
+
+def _execute_ddl(conn: Connection, ddl: str) -> None:
+    for statement in ddl.split(";"):
+        if statement.strip():
+            conn.exec_driver_sql(statement)
+
+
+# The schema this runner started from. Databases from before it have the
+# tables, but may lack indexes added to existing ones, hence IF NOT EXISTS
+_BASELINE_DDL = """
+CREATE TABLE IF NOT EXISTS batches (
+    id VARCHAR NOT NULL,
+    batch_no INTEGER,
+    name VARCHAR NOT NULL,
+    style VARCHAR NOT NULL,
+    abv FLOAT,
+    brew_date VARCHAR NOT NULL,
+    bottling_date VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    recipe_name VARCHAR NOT NULL,
+    batch_notes VARCHAR NOT NULL,
+    last_synced DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_batches_brew_date_id ON batches (brew_date, id);
+CREATE TABLE IF NOT EXISTS brewery_settings (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    has_custom_logo BOOLEAN NOT NULL,
+    keg_volume_litres FLOAT NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE IF NOT EXISTS keg_assignments (
+    id INTEGER NOT NULL,
+    keg_id INTEGER NOT NULL,
+    person VARCHAR(200) NOT NULL,
+    batch_id VARCHAR,
+    batch_name VARCHAR(200) NOT NULL,
+    style VARCHAR(200) NOT NULL,
+    assigned_at DATETIME NOT NULL,
+    returned_at DATETIME,
+    days FLOAT,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_keg_assignments_keg_returned ON keg_assignments (keg_id, returned_at);
+CREATE INDEX IF NOT EXISTS ix_keg_assignments_person_returned ON keg_assignments (person, returned_at);
+CREATE INDEX IF NOT EXISTS ix_keg_assignments_returned ON keg_assignments (returned_at);
+CREATE TABLE IF NOT EXISTS keg_events_archive (
+    id INTEGER NOT NULL,
+    keg_id INTEGER NOT NULL,
+    event_type VARCHAR(20) NOT NULL,
+    person VARCHAR(200) NOT NULL,
+    batch_id VARCHAR,
+    batch_name VARCHAR(200) NOT NULL,
+    style VARCHAR(200) NOT NULL,
+    timestamp DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_keg_events_archive_timestamp ON keg_events_archive (timestamp);
+CREATE TABLE IF NOT EXISTS locations (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+CREATE TABLE IF NOT EXISTS people (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+CREATE TABLE IF NOT EXISTS stats_event_types (
+    event_type VARCHAR(20) NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (event_type)
+);
+CREATE TABLE IF NOT EXISTS stats_months (
+    month VARCHAR(7) NOT NULL,
+    kegs INTEGER NOT NULL,
+    PRIMARY KEY (month)
+);
+CREATE TABLE IF NOT EXISTS stats_people (
+    person VARCHAR(200) NOT NULL,
+    kegs INTEGER NOT NULL,
+    total_days FLOAT NOT NULL,
+    first_assigned_at DATETIME,
+    last_returned_at DATETIME,
+    PRIMARY KEY (person)
+);
+CREATE TABLE IF NOT EXISTS stats_person_batches (
+    person VARCHAR(200) NOT NULL,
+    batch_name VARCHAR(200) NOT NULL,
+    kegs INTEGER NOT NULL,
+    PRIMARY KEY (person, batch_name)
+);
+CREATE TABLE IF NOT EXISTS stats_person_styles (
+    person VARCHAR(200) NOT NULL,
+    style VARCHAR(200) NOT NULL,
+    kegs INTEGER NOT NULL,
+    PRIMARY KEY (person, style)
+);
+CREATE TABLE IF NOT EXISTS stats_styles (
+    style VARCHAR(200) NOT NULL,
+    kegs INTEGER NOT NULL,
+    PRIMARY KEY (style)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    source VARCHAR NOT NULL,
+    cursor VARCHAR NOT NULL,
+    scope VARCHAR NOT NULL,
+    last_sync DATETIME,
+    last_full_sync DATETIME,
+    PRIMARY KEY (source)
+);
+CREATE TABLE IF NOT EXISTS kegs (
+    id INTEGER NOT NULL,
+    label VARCHAR NOT NULL,
+    status VARCHAR(6) NOT NULL,
+    location VARCHAR NOT NULL,
+    batch_id VARCHAR,
+    date_purchased VARCHAR NOT NULL,
+    notes VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(batch_id) REFERENCES batches (id)
+);
+CREATE INDEX IF NOT EXISTS ix_kegs_batch_id ON kegs (batch_id);
+CREATE TABLE IF NOT EXISTS keg_events (
+    id INTEGER NOT NULL,
+    keg_id INTEGER NOT NULL,
+    event_type VARCHAR(20) NOT NULL,
+    person VARCHAR(200) NOT NULL,
+    batch_id VARCHAR,
+    batch_name VARCHAR(200) NOT NULL,
+    style VARCHAR(200) NOT NULL,
+    timestamp DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(keg_id) REFERENCES kegs (id)
+);
+CREATE INDEX IF NOT EXISTS ix_keg_events_keg_id ON keg_events (keg_id);
+CREATE INDEX IF NOT EXISTS ix_keg_events_timestamp ON keg_events (timestamp);
+"""
+
+
+_STATS_STALE_DDL = """
+CREATE TABLE IF NOT EXISTS stats_stale (
+    id INTEGER NOT NULL,
+    since DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+"""
+
+
+def _create_schema(conn: Connection) -> None:
+    _execute_ddl(conn, _BASELINE_DDL)
+
+
+def _add_keg_volume(conn: Connection) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns("brewery_settings")}
+    if "keg_volume_litres" not in columns:
+        conn.execute(text("ALTER TABLE brewery_settings ADD COLUMN keg_volume_litres REAL DEFAULT 19.0"))
+
+
+def _seed_defaults(conn: Connection) -> None:
+    with Session(bind=conn, join_transaction_mode="rollback_only") as db:
+        if db.scalar(select(Keg.id).limit(1)) is None:
+            db.add_all(Keg(id=i, label=f"Keg #{i}", status=KegStatus.empty) for i in range(1, 17))
+        if db.scalar(select(Person.id).limit(1)) is None:
+            db.add_all(Person(name=name) for name in ["Michael", "Troy", "Brent"])
+        if db.scalar(select(Location.id).limit(1)) is None:
+            db.add(Location(name="Conditioning Fridge"))
+        if db.get(BrewerySettings, 1) is None:
+            db.add(BrewerySettings(id=1, name="Blue Dog Brewing"))
+        db.flush()
+
+
+def _backfill_rollups(conn: Connection) -> None:
+    # For databases with events from before the stats rollups existed.
+    # rebuild() clears the stale marker, whose table comes with migration 6
+    _execute_ddl(conn, _STATS_STALE_DDL)
+    with Session(bind=conn, join_transaction_mode="rollback_only") as db:
+        if rollups.needs_rebuild(db):
+            rollups.rebuild(db)
+            db.flush()
+
+
+_WORKER_COORDINATION_DDL = """
+CREATE TABLE IF NOT EXISTS change_log (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    origin VARCHAR(32) NOT NULL,
+    tables VARCHAR NOT NULL,
+    message VARCHAR,
+    created_at DATETIME NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name VARCHAR NOT NULL,
+    owner VARCHAR(32) NOT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (name)
+);
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    id VARCHAR NOT NULL,
+    "full" BOOLEAN NOT NULL,
+    "trigger" VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    progress VARCHAR NOT NULL,
+    result VARCHAR,
+    error VARCHAR,
+    owner VARCHAR(32) NOT NULL,
+    created_at DATETIME NOT NULL,
+    finished_at DATETIME,
+    heartbeat_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_sync_jobs_status ON sync_jobs (status);
+"""
+
+
+def _add_worker_coordination(conn: Connection) -> None:
+    _execute_ddl(conn, _WORKER_COORDINATION_DDL)
+    # Names this database in ETags, so tags from a replaced one never match
+    changes = ChangeLogEntry.__table__
+    if conn.scalar(select(changes.c.id).where(changes.c.id == 0)) is None:
+        conn.execute(changes.insert().values(id=0, origin=uuid.uuid4().hex, tables=""))
+
+
+def _add_rollups_stale(conn: Connection) -> None:
+    _execute_ddl(conn, _STATS_STALE_DDL)
+
+
+# (version, name, migration); versions only ever increase
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create_schema", _create_schema),
+    (2, "add_keg_volume_litres", _add_keg_volume),
+    (3, "seed_defaults", _seed_defaults),
+    (4, "backfill_rollups", _backfill_rollups),
+    (5, "add_worker_coordination", _add_worker_coordination),
+    (6, "add_rollups_stale", _add_rollups_stale),
+]
+
+
+def _applied(conn: Connection) -> set[int]:
+    if not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+def pending(bind: Engine = engine) -> list[tuple[int, str]]:
+    with bind.connect() as conn:
+        applied = _applied(conn)
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+def _locking_engine(bind: Engine) -> Engine:
+    """A throwaway engine whose transactions start with ``BEGIN IMMEDIATE`` on SQLite."""
+    if bind.dialect.name != "sqlite":
+        return create_engine(bind.url, poolclass=NullPool)
+    locking = create_engine(
+        bind.url,
+        poolclass=NullPool,
+        connect_args={"check_same_thread": False, "timeout": MIGRATION_LOCK_TIMEOUT},
+    )
+
+    @event.listens_for(locking, "connect")
+    def _manual_transactions(dbapi_conn, _record):
+        dbapi_conn.isolation_level = None  # pysqlite would defer BEGIN past DDL
+
+    @event.listens_for(locking, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return locking
+
+
+def run(bind: Engine = engine) -> list[str]:
+    """Apply pending migrations; returns the names of those this call applied."""
+    if not pending(bind):
+        return []
+    started = time.perf_counter()
+    locking = _locking_engine(bind)
+    try:
+        with locking.begin() as conn:
+            schema_migrations.create(bind=conn, checkfirst=True)
+            applied = _applied(conn)  # another worker may have got here first
+            names = []
+            for version, name, migrate in MIGRATIONS:
+                if version in applied:
+                    continue
+                migrate(conn)
+                conn.execute(schema_migrations.insert().values(version=version, name=name))
+                names.append(name)
+    finally:
+        locking.dispose()
+    if names:
+        print(f"[MIGRATE] Applied {', '.join(names)} in {time.perf_counter() - started:.2f}s")
+    return names
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.migrations",
+                                     description="Apply pending schema migrations.")
+    parser.add_argument("--status", action="store_true", help="list pending migrations, apply nothing")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        todo = pending()
+        for version, name in todo:
+            print(f"[MIGRATE] Pending {version}: {name}")
+        if not todo:
+            print("[MIGRATE] Up to date")
+        return 1 if todo else 0
+    if not run():
+        print("[MIGRATE] Up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -32,6 +32,10 @@ class Batch(Base):
 
     kegs: Mapped[list["Keg"]] = relationship(back_populates="batch")
 
+    __table_args__ = (
+        Index("ix_batches_brew_date_id", "brew_date", "id"),
+    )
+
 
 class Keg(Base):
     __tablename__ = "kegs"
@@ -74,6 +78,77 @@ class BrewerySettings(Base):
     keg_volume_litres: Mapped[float] = mapped_column(Float, default=19.0)
 
 
+class SyncState(Base):
+    """Per-source cursor for incremental syncs from external services."""
+
+    __tablename__ = "sync_state"
+
+    source: Mapped[str] = mapped_column(String, primary_key=True)
+    cursor: Mapped[str] = mapped_column(String, default="")  # high-water mark
+    scope: Mapped[str] = mapped_column(String, default="")  # what the cursor covers
+    last_sync: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_full_sync: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+# ── Coordination between worker processes ─────────────────────
+# Written with Core statements, not ORM objects, so they never count as data
+# changes themselves (see app.versions and app.cluster).
+
+
+class ChangeLogEntry(Base):
+    """A committed write or a pushed event, for other processes to catch up on.
+
+    Row 0 is a marker whose origin names this database (see app.versions).
+    """
+
+    __tablename__ = "change_log"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    origin: Mapped[str] = mapped_column(String(32), nullable=False)  # process that wrote it
+    tables: Mapped[str] = mapped_column(String, default="")  # comma-separated version names
+    message: Mapped[str | None] = mapped_column(String, nullable=True)  # encoded SSE message
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    # Never reuse the ids of pruned rows: they double as data versions
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+
+class Lease(Base):
+    """Named, expiring claim that lets one process run a periodic job."""
+
+    __tablename__ = "leases"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    owner: Mapped[str] = mapped_column(String(32), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class SyncJobRecord(Base):
+    """Brewfather sync job state, readable by every process (see app.sync_jobs)."""
+
+    __tablename__ = "sync_jobs"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    full: Mapped[bool] = mapped_column(Boolean, default=False)
+    trigger: Mapped[str] = mapped_column(String(20), default="manual")
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    progress: Mapped[str] = mapped_column(String, default="{}")  # JSON
+    result: Mapped[str | None] = mapped_column(String, nullable=True)  # JSON
+    error: Mapped[str | None] = mapped_column(String, nullable=True)
+    owner: Mapped[str] = mapped_column(String(32), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_sync_jobs_status", "status"),
+    )
+
+
+# Every event_type the app logs (see app.routers.kegs._log_event callers)
+EVENT_TYPES = ("filled", "assigned", "tapped", "returned", "deleted")
+
+
 class KegEvent(Base):
     __tablename__ = "keg_events"
 
@@ -92,3 +167,105 @@ class KegEvent(Base):
         Index("ix_keg_events_keg_id", "keg_id"),
         Index("ix_keg_events_timestamp", "timestamp"),
     )
+
+
+class KegEventArchive(Base):
+    """Events moved out of keg_events by app.maintenance; ids are preserved."""
+
+    __tablename__ = "keg_events_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    keg_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    event_type: Mapped[str] = mapped_column(String(20), nullable=False)
+    person: Mapped[str] = mapped_column(String(200), default="")
+    batch_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    batch_name: Mapped[str] = mapped_column(String(200), default="")
+    style: Mapped[str] = mapped_column(String(200), default="")
+    timestamp: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_keg_events_archive_timestamp", "timestamp"),
+    )
+
+
+# ── Stats rollups ──────────────────────────────────────────────
+# Maintained incrementally by app.rollups as events are logged, so the
+# stats endpoint never has to replay the full keg_events history.
+
+
+class KegAssignment(Base):
+    """One assigned→returned span; returned_at is NULL while still open."""
+
+    __tablename__ = "keg_assignments"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    keg_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    person: Mapped[str] = mapped_column(String(200), nullable=False)
+    batch_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    batch_name: Mapped[str] = mapped_column(String(200), default="")
+    style: Mapped[str] = mapped_column(String(200), default="")
+    assigned_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    returned_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    days: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_keg_assignments_keg_returned", "keg_id", "returned_at"),
+        Index("ix_keg_assignments_person_returned", "person", "returned_at"),
+        Index("ix_keg_assignments_returned", "returned_at"),
+    )
+
+
+class PersonStats(Base):
+    __tablename__ = "stats_people"
+
+    person: Mapped[str] = mapped_column(String(200), primary_key=True)
+    kegs: Mapped[int] = mapped_column(Integer, default=0)
+    total_days: Mapped[float] = mapped_column(Float, default=0.0)
+    first_assigned_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_returned_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class PersonStyleStats(Base):
+    __tablename__ = "stats_person_styles"
+
+    person: Mapped[str] = mapped_column(String(200), primary_key=True)
+    style: Mapped[str] = mapped_column(String(200), primary_key=True)
+    kegs: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class PersonBatchStats(Base):
+    __tablename__ = "stats_person_batches"
+
+    person: Mapped[str] = mapped_column(String(200), primary_key=True)
+    batch_name: Mapped[str] = mapped_column(String(200), primary_key=True)
+    kegs: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class StyleStats(Base):
+    __tablename__ = "stats_styles"
+
+    style: Mapped[str] = mapped_column(String(200), primary_key=True)
+    kegs: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class MonthStats(Base):
+    __tablename__ = "stats_months"
+
+    month: Mapped[str] = mapped_column(String(7), primary_key=True)  # YYYY-MM
+    kegs: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class EventTypeStats(Base):
+    __tablename__ = "stats_event_types"
+
+    event_type: Mapped[str] = mapped_column(String(20), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class RollupsStale(Base):
+    """Present while committed events may be missing from the rollups; a rebuild removes it."""
+
+    __tablename__ = "stats_stale"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)  # only ever row 1
+    since: Mapped[datetime] = mapped_column(DateTime, nullable=False)
@@ -0,0 +1,280 @@
+"""In-process sampling profiler for diagnosing a live server.
+
+A background thread snapshots every thread's stack with
+``sys._current_frames()`` at a fixed interval, so it needs no native tools,
+ptrace or restart. Two modes:
+
+- ``wall``: each sample is weighted by the time since the previous one.
+  Threads parked in a lock, queue or selector wait are skipped unless
+  ``include_idle`` is set, so idle threadpool workers don't drown the rest.
+- ``cpu``: each sample is weighted by the CPU time the thread used since the
+  previous one (Linux ``pthread_getcpuclockid``), which leaves out waiting on
+  the database or the network.
+
+Profiles render as collapsed stacks (``thread;frame;frame weight``, weights in
+microseconds, for flamegraph.pl or speedscope) or as a speedscope JSON file.
+Only one profile runs at a time.
+"""
+
+import linecache
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from types import CodeType, FrameType
+
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import admin
+
+MODES = ("wall", "cpu")
+FORMATS = ("collapsed", "speedscope")
+CPU_MODE_SUPPORTED = hasattr(time, "pthread_getcpuclockid")
+MAX_DEPTH = 128
+# Single requests are short, so sample them more finely than a timed profile
+REQUEST_INTERVAL = 0.001
+PROFILE_HEADER = "X-Profile"
+PROFILE_FORMAT_HEADER = "X-Profile-Format"
+
+_ROOT = Path(__file__).resolve().parent.parent
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+_IDLE_FUNCTIONS = {"wait", "get", "select", "poll", "_worker", "_wait_for_tstate_lock"}
+# Waits inside C code (e.g. aiosqlite's SimpleQueue.get()) leave the caller as
+# the leaf frame, so look at the line it's on
+_IDLE_LINE = re.compile(r"\.(?:get|wait|acquire)\((?:timeout=[^)]*)?\)|\.(?:select|poll)\(")
+_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+@dataclass
+class Profile:
+    mode: str
+    interval: float
+    started_at: datetime
+    duration: float
+    samples: dict[tuple[str, tuple[CodeType, ...]], float]  # (thread, stack) → seconds
+
+    def collapsed(self) -> str:
+        lines = []
+        for (thread, stack), seconds in sorted(self.samples.items(), key=lambda item: -item[1]):
+            frames = ";".join([thread, *(_label(code).replace(";", ":") for code in stack)])
+            lines.append(f"{frames} {max(round(seconds * 1_000_000), 1)}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> dict:
+        frame_index: dict[CodeType, int] = {}
+        frames: list[dict] = []
+        by_thread: dict[str, tuple[list, list]] = defaultdict(lambda: ([], []))
+        for (thread, stack), seconds in self.samples.items():
+            indexes = []
+            for code in stack:
+                if code not in frame_index:
+                    frame_index[code] = len(frames)
+                    frames.append({"name": code.co_name, "file": _short_path(code.co_filename),
+                                   "line": code.co_firstlineno})
+                indexes.append(frame_index[code])
+            samples, weights = by_thread[thread]
+            samples.append(indexes)
+            weights.append(seconds * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "keg-tracker",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"{thread} ({self.mode})",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+                for thread, (samples, weights) in sorted(by_thread.items())
+            ],
+        }
+
+
+def _short_path(filename: str) -> str:
+    path = Path(filename)
+    try:
+        return str(path.relative_to(_ROOT))
+    except ValueError:
+        pass
+    parts = path.parts
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            return "/".join(parts[parts.index(marker) + 1:])
+    return "/".join(parts[-2:])
+
+
+def _label(code: CodeType) -> str:
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame: FrameType | None) -> tuple[CodeType, ...]:
+    codes = []
+    while frame is not None and len(codes) < MAX_DEPTH:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()  # root first
+    return tuple(codes)
+
+
+def _is_idle(frame: FrameType) -> bool:
+    code = frame.f_code
+    if code.co_name in _IDLE_FUNCTIONS and code.co_filename.endswith(_IDLE_FILES):
+        return True
+    if frame.f_lineno is None:  # e.g. a generator frame that is just starting or finishing
+        return False
+    return bool(_IDLE_LINE.search(linecache.getline(code.co_filename, frame.f_lineno)))
+
+
+class Sampler:
+    def __init__(self, mode: str = "wall", interval: float = 0.01, include_idle: bool = False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}")
+        if mode == "cpu" and not CPU_MODE_SUPPORTED:
+            raise ValueError("CPU profiling isn't supported on this platform")
+        self.mode = mode
+        self.interval = interval
+        self.include_idle = include_idle
+        self._samples: dict[tuple[str, tuple[CodeType, ...]], float] = defaultdict(float)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started_at = datetime.utcnow()
+        self._started = 0.0
+
+    def start(self) -> None:
+        """Begin sampling; raises ProfilerBusy if another profile is running."""
+        if not _lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        self._started_at = datetime.utcnow()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            _lock.release()
+        return Profile(self.mode, self.interval, self._started_at,
+                       time.perf_counter() - self._started, dict(self._samples))
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        cpu_seen: dict[int, float] = {}
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                # The frames belong to running threads, so a sample that trips
+                # over one mid-change is dropped rather than ending the profile
+                try:
+                    self._sample(ident, frame, elapsed, names, cpu_seen)
+                except Exception:
+                    continue
+
+    def _sample(self, ident: int, frame: FrameType, elapsed: float,
+                names: dict[int, str], cpu_seen: dict[int, float]) -> None:
+        if self.mode == "cpu":
+            try:
+                cpu = time.clock_gettime(time.pthread_getcpuclockid(ident))
+            except OSError:  # thread exited between the two calls
+                return
+            weight = cpu - cpu_seen.get(ident, cpu)
+            cpu_seen[ident] = cpu
+            if weight <= 0:
+                return
+        elif not self.include_idle and _is_idle(frame):
+            return
+        else:
+            weight = elapsed
+        thread = names.get(ident, f"thread-{ident}")
+        self._samples[(thread, _stack(frame))] += weight
+
+
+def profile_response(profile: Profile, fmt: str, name: str) -> Response:
+    stamp = profile.started_at.strftime("%Y%m%d-%H%M%S")
+    if fmt == "speedscope":
+        filename = f"profile-{profile.mode}-{stamp}.speedscope.json"
+        response: Response = JSONResponse(profile.speedscope(name))
+    else:
+        filename = f"profile-{profile.mode}-{stamp}.txt"
+        response = PlainTextResponse(profile.collapsed())
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+class ProfileRequestMiddleware:
+    """Profile one request when an admin sends ``X-Profile: wall`` (or ``cpu``).
+
+    The response is replaced by the profile (``X-Profile-Format`` picks the
+    format, speedscope by default); the original status is in
+    ``X-Profiled-Status``. Other threads are sampled too, so profile a quiet
+    server for a clean picture.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        mode = headers.get(PROFILE_HEADER.lower())
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        fmt = headers.get(PROFILE_FORMAT_HEADER.lower(), "speedscope")
+        if not admin.token_ok(headers.get(admin.ADMIN_HEADER.lower())):
+            error: Response = JSONResponse({"detail": "Invalid admin token"}, status_code=403)
+        elif fmt not in FORMATS:
+            error = JSONResponse({"detail": f"{PROFILE_FORMAT_HEADER} must be one of {', '.join(FORMATS)}"},
+                                 status_code=400)
+        else:
+            try:
+                sampler = Sampler(mode, interval=REQUEST_INTERVAL)
+                sampler.start()
+            except ValueError as e:
+                error = JSONResponse({"detail": str(e)}, status_code=400)
+            except ProfilerBusy:
+                error = JSONResponse({"detail": "A profile is already running"}, status_code=409)
+            else:
+                await self._profiled(scope, receive, send, sampler, fmt)
+                return
+        await error(scope, receive, send)
+
+    async def _profiled(self, scope: Scope, receive: Receive, send: Send,
+                        sampler: Sampler, fmt: str) -> None:
+        status = 500
+
+        async def discard(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profile = sampler.stop()
+        response = profile_response(profile, fmt, f"{scope['method']} {scope['path']}")
+        response.headers["X-Profiled-Status"] = str(status)
+        await response(scope, receive, send)
@@ -0,0 +1,95 @@
+"""Process-local cache of slow-changing reference data.
+
+People, batch names and brewery settings are read on every keg update but
+change rarely. Each cached value remembers the data versions of the tables
+it was loaded from (see ``versions``) and is reloaded on the next read after
+any commit that wrote to them, so a rename or delete is visible to the very
+next request. Values reflect committed data only.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import versions
+from .models import Batch, BrewerySettings, Person
+
+DEFAULT_KEG_LITRES = 19.0
+
+
+class _Cached:
+    def __init__(self, tables: tuple[str, ...], load: Callable[[Session], object]):
+        self.tables = tables
+        self.load = load
+        self._entry: tuple[tuple[int, ...], object] | None = None
+
+    def get(self, db: Session):
+        # Read the version before loading: a commit that lands mid-load leaves
+        # the entry one version behind, so the next read reloads it
+        version = versions.current(*self.tables)
+        entry = self._entry
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        # No lock around the load: under AsyncSession.run_sync it awaits the
+        # database on the event loop thread, so a second request blocking on a
+        # lock here would stall the loop. Concurrent loads just both run.
+        value = self.load(db)
+        self._entry = (version, value)
+        return value
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    name: str
+    has_custom_logo: bool
+    keg_volume_litres: float | None
+
+
+def _load_people(db: Session) -> frozenset[str]:
+    return frozenset(db.scalars(select(Person.name)))
+
+
+def _load_batches(db: Session) -> dict[str, tuple[str, str]]:
+    rows = db.execute(select(Batch.id, Batch.recipe_name, Batch.name, Batch.style))
+    return {id_: (recipe_name or name, style) for id_, recipe_name, name, style in rows}
+
+
+def _load_settings(db: Session) -> SettingsSnapshot | None:
+    settings = db.get(BrewerySettings, 1)
+    if settings is None:
+        return None
+    return SettingsSnapshot(settings.name, settings.has_custom_logo, settings.keg_volume_litres)
+
+
+_people = _Cached(("people",), _load_people)
+_batches = _Cached(("batches",), _load_batches)
+_settings = _Cached(("brewery_settings",), _load_settings)
+
+
+def people(db: Session) -> frozenset[str]:
+    return _people.get(db)
+
+
+def batch_exists(db: Session, batch_id: str) -> bool:
+    return batch_id in _batches.get(db)
+
+
+def batch_info(db: Session, batch_id: str | None) -> tuple[str, str]:
+    """(display name, style) of a batch, or empty strings."""
+    if not batch_id:
+        return "", ""
+    return _batches.get(db).get(batch_id, ("", ""))
+
+
+def settings(db: Session) -> SettingsSnapshot | None:
+    """Committed brewery settings, or None before the row exists."""
+    return _settings.get(db)
+
+
+def keg_litres(db: Session) -> float:
+    snapshot = settings(db)
+    if snapshot and snapshot.keg_volume_litres:
+        return snapshot.keg_volume_litres
+    return DEFAULT_KEG_LITRES
@@ -0,0 +1,72 @@
+"""Bounded, single-flight cache for computed response payloads.
+
+Concurrent misses on the same key share one computation. The computation
+runs as its own task, so a client disconnecting doesn't cancel it for the
+others waiting on it. An invalidation that lands while a computation is
+running keeps its (possibly stale) result out of the cache.
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, object] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._generation = 0
+        self._lock = threading.Lock()  # invalidate() runs on commit, in any thread
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable]):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._fill(key, compute, self._generation))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: Hashable, compute: Callable[[], Awaitable], generation: int):
+        try:
+            value = await compute()
+        finally:
+            self._inflight.pop(key, None)
+        with self._lock:
+            if generation == self._generation and self.max_entries > 0:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,59 @@
+"""Fast JSON rendering for the large list endpoints.
+
+List endpoints select plain column tuples and return ``json_response(...)``
+directly, which skips FastAPI's ``jsonable_encoder`` pass over every row.
+Encoding uses orjson when it's installed and falls back to the stdlib.
+
+``?format=compact`` sends the field names once, as
+``{"fields": [...], "rows": [[...], ...]}``, instead of repeating them in
+every row.
+"""
+
+import enum
+import json
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+
+from fastapi import Query, Response
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+FORMAT_QUERY = Query(default="objects", pattern="^(objects|compact)$")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        # Naive datetimes come out exactly as isoformat() writes them
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_response(content, response: Response) -> FastJSONResponse:
+    """Render ``content`` as-is, keeping headers set on the injected ``response`` (ETag, cursors)."""
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    return FastJSONResponse(content, headers=headers)
+
+
+def rows_content(fields: Sequence[str], rows: Iterable[Sequence], fmt: str):
+    """Rows as a list of objects, or in the columnar compact form."""
+    if fmt == "compact":
+        return {"fields": list(fields), "rows": [list(row) for row in rows]}
+    return [dict(zip(fields, row)) for row in rows]
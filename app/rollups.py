@@ -0,0 +1,333 @@
+"""Incrementally maintained stats rollups.
+
+Every logged KegEvent is folded into the rollup tables in the same
+transaction (see ``apply_event``), so ``GET /api/stats`` reads a handful of
+small tables instead of replaying ``keg_events``. The rollups are the
+all-time record: events archived by ``app.maintenance`` stay counted, and a
+rebuild replays ``keg_events_archive`` followed by ``keg_events``.
+
+Bulk imports insert events without folding them in and rebuild at the end.
+Until then the rollups are marked stale (see ``mark_stale``), so an import
+that never finishes is caught up by the next start or maintenance pass.
+
+Run ``python -m app.rollups`` to rebuild the rollups from the event log and
+verify them, or ``python -m app.rollups --check`` to only verify.
+"""
+
+import argparse
+import sys
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import versions
+from .models import (
+    EventTypeStats,
+    KegAssignment,
+    KegEvent,
+    KegEventArchive,
+    MonthStats,
+    PersonBatchStats,
+    RollupsStale,
+    PersonStats,
+    PersonStyleStats,
+    StyleStats,
+)
+
+_ROLLUP_MODELS = (
+    KegAssignment,
+    PersonStats,
+    PersonStyleStats,
+    PersonBatchStats,
+    StyleStats,
+    MonthStats,
+    EventTypeStats,
+)
+
+
+def _days_between(start: datetime, end: datetime) -> float:
+    return round((end - start).total_seconds() / 86400, 1)
+
+
+def _bump(db: Session, model, key: dict, column: str = "kegs", amount: int = 1) -> None:
+    stmt = sqlite_insert(model).values(**key, **{column: amount})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={column: getattr(model, column) + stmt.excluded[column]},
+    )
+    db.execute(stmt)
+
+
+def _record_completion(db: Session, assignment: KegAssignment) -> None:
+    person = assignment.person
+    returned_at = assignment.returned_at
+
+    stmt = sqlite_insert(PersonStats).values(
+        person=person,
+        kegs=1,
+        total_days=assignment.days,
+        first_assigned_at=assignment.assigned_at,
+        last_returned_at=returned_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["person"],
+        set_={
+            "kegs": PersonStats.kegs + 1,
+            "total_days": PersonStats.total_days + stmt.excluded.total_days,
+            "last_returned_at": stmt.excluded.last_returned_at,
+        },
+    )
+    db.execute(stmt)
+
+    if assignment.style:
+        _bump(db, PersonStyleStats, {"person": person, "style": assignment.style})
+        _bump(db, StyleStats, {"style": assignment.style})
+    if assignment.batch_name:
+        _bump(db, PersonBatchStats, {"person": person, "batch_name": assignment.batch_name})
+    _bump(db, MonthStats, {"month": returned_at.strftime("%Y-%m")})
+
+
+def apply_event(db: Session, ev: KegEvent) -> None:
+    """Fold a single new event into the rollups. Caller commits."""
+    versions.touch(db, "stats")
+    _bump(db, EventTypeStats, {"event_type": ev.event_type}, column="count")
+
+    if ev.event_type == "assigned" and ev.person:
+        # A new assignment replaces whatever was open on this keg
+        db.execute(
+            delete(KegAssignment).where(
+                KegAssignment.keg_id == ev.keg_id,
+                KegAssignment.returned_at.is_(None),
+            )
+        )
+        db.add(KegAssignment(
+            keg_id=ev.keg_id,
+            person=ev.person,
+            batch_id=ev.batch_id,
+            batch_name=ev.batch_name,
+            style=ev.style,
+            assigned_at=ev.timestamp,
+        ))
+    elif ev.event_type == "returned":
+        assignment = db.scalar(
+            select(KegAssignment).where(
+                KegAssignment.keg_id == ev.keg_id,
+                KegAssignment.returned_at.is_(None),
+            )
+        )
+        # Orphaned returns (no matching assignment) are intentionally skipped
+        # to avoid inflating keg counts with phantom 0-day records
+        if assignment:
+            assignment.returned_at = ev.timestamp
+            assignment.days = _days_between(assignment.assigned_at, ev.timestamp)
+            _record_completion(db, assignment)
+
+
+# ── Full replay ──────────────────────────────────────────────
+
+
+def _replay(db: Session) -> dict:
+    """Replay archived and live events in timestamp order into in-memory rollup rows."""
+    open_by_keg: dict[int, dict] = {}
+    completed: list[dict] = []
+    people: dict[str, dict] = {}
+    person_styles: Counter = Counter()
+    person_batches: Counter = Counter()
+    styles: Counter = Counter()
+    months: Counter = Counter()
+    event_types: Counter = Counter()
+
+    def columns(model):
+        return select(
+            model.keg_id, model.event_type, model.person, model.batch_id,
+            model.batch_name, model.style, model.timestamp, model.id,
+        )
+
+    events = union_all(columns(KegEventArchive), columns(KegEvent)).subquery()
+    rows = db.execute(
+        select(*list(events.c)[:7])
+        .order_by(events.c.timestamp, events.c.id)
+        .execution_options(yield_per=5000)
+    )
+    for keg_id, event_type, person, batch_id, batch_name, style, ts in rows:
+        event_types[event_type] += 1
+        if event_type == "assigned" and person:
+            open_by_keg[keg_id] = {
+                "keg_id": keg_id,
+                "person": person,
+                "batch_id": batch_id,
+                "batch_name": batch_name or "",
+                "style": style or "",
+                "assigned_at": ts,
+                "returned_at": None,
+                "days": None,
+            }
+        elif event_type == "returned":
+            a = open_by_keg.pop(keg_id, None)
+            if not a:
+                continue
+            a["returned_at"] = ts
+            a["days"] = _days_between(a["assigned_at"], ts)
+            completed.append(a)
+
+            p = people.setdefault(a["person"], {
+                "person": a["person"],
+                "kegs": 0,
+                "total_days": 0.0,
+                "first_assigned_at": a["assigned_at"],
+                "last_returned_at": ts,
+            })
+            p["kegs"] += 1
+            p["total_days"] += a["days"]
+            p["last_returned_at"] = ts
+            if a["style"]:
+                person_styles[(a["person"], a["style"])] += 1
+                styles[a["style"]] += 1
+            if a["batch_name"]:
+                person_batches[(a["person"], a["batch_name"])] += 1
+            months[ts.strftime("%Y-%m")] += 1
+
+    return {
+        "assignments": completed + list(open_by_keg.values()),
+        "people": list(people.values()),
+        "person_styles": [
+            {"person": p, "style": s, "kegs": n} for (p, s), n in person_styles.items()
+        ],
+        "person_batches": [
+            {"person": p, "batch_name": b, "kegs": n} for (p, b), n in person_batches.items()
+        ],
+        "styles": [{"style": s, "kegs": n} for s, n in styles.items()],
+        "months": [{"month": m, "kegs": n} for m, n in months.items()],
+        "event_types": [{"event_type": t, "count": n} for t, n in event_types.items()],
+    }
+
+
+_STATE_TABLES = {
+    "assignments": KegAssignment,
+    "people": PersonStats,
+    "person_styles": PersonStyleStats,
+    "person_batches": PersonBatchStats,
+    "styles": StyleStats,
+    "months": MonthStats,
+    "event_types": EventTypeStats,
+}
+
+
+def rebuild(db: Session) -> None:
+    """Recompute every rollup table from the event log. Caller commits.
+
+    Writers wait until the caller commits: the tables are cleared before
+    the replay reads the log, which takes the write lock first. An event
+    committed mid-replay would otherwise be counted in rows this overwrites.
+    """
+    versions.touch(db, "stats")
+    for model in _ROLLUP_MODELS:
+        db.execute(delete(model))
+    db.execute(delete(RollupsStale))
+    state = _replay(db)
+    for key, model in _STATE_TABLES.items():
+        if state[key]:
+            db.execute(insert(model.__table__), state[key])
+
+
+def mark_stale(db: Session) -> None:
+    """Record that events are going in without the rollups. Caller commits."""
+    db.execute(
+        sqlite_insert(RollupsStale).values(id=1, since=datetime.utcnow()).on_conflict_do_nothing()
+    )
+
+
+def needs_rebuild(db: Session) -> bool:
+    """True when the rollups are marked stale, or events exist but the rollups were never populated."""
+    if db.get(RollupsStale, 1) is not None:
+        return True
+    has_rollups = db.scalar(select(func.count()).select_from(EventTypeStats)) > 0
+    if has_rollups:
+        return False
+    return (
+        db.scalar(select(KegEvent.id).limit(1)) is not None
+        or db.scalar(select(KegEventArchive.id).limit(1)) is not None
+    )
+
+
+def _table_rows(db: Session, model, columns: list[str]) -> set[tuple]:
+    cols = [getattr(model, c) for c in columns]
+    return {tuple(r) for r in db.execute(select(*cols))}
+
+
+def verify(db: Session) -> list[str]:
+    """Compare the stored rollups with a fresh replay; return mismatches."""
+    state = _replay(db)
+    problems: list[str] = []
+
+    def check(name: str, model, columns: list[str], expected: list[dict], round_cols=()):
+        def norm(row):
+            return tuple(
+                round(v, 6) if c in round_cols and v is not None else v
+                for c, v in zip(columns, row)
+            )
+        stored = {norm(r) for r in _table_rows(db, model, columns)}
+        wanted = {norm(tuple(e[c] for c in columns)) for e in expected}
+        if stored != wanted:
+            problems.append(
+                f"{name}: {len(wanted - stored)} missing, {len(stored - wanted)} unexpected"
+            )
+
+    check("event_types", EventTypeStats, ["event_type", "count"], state["event_types"])
+    check("people", PersonStats,
+          ["person", "kegs", "total_days", "first_assigned_at", "last_returned_at"],
+          state["people"], round_cols=("total_days",))
+    check("person_styles", PersonStyleStats, ["person", "style", "kegs"], state["person_styles"])
+    check("person_batches", PersonBatchStats, ["person", "batch_name", "kegs"], state["person_batches"])
+    check("styles", StyleStats, ["style", "kegs"], state["styles"])
+    check("months", MonthStats, ["month", "kegs"], state["months"])
+    check("assignments", KegAssignment,
+          ["keg_id", "person", "batch_name", "style", "assigned_at", "returned_at", "days"],
+          state["assignments"], round_cols=("days",))
+    return problems
+
+
+def rebuild_if_needed() -> bool:
+    """Rebuild and commit when ``needs_rebuild``; returns whether it did."""
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        if not needs_rebuild(db):
+            return False
+        rebuild(db)
+        db.commit()
+    print("[ROLLUPS] Rebuilt stale rollups from the event log")
+    return True
+
+
+def main(argv: list[str] | None = None) -> int:
+    from . import migrations
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(prog="python -m app.rollups",
+                                     description="Rebuild and verify stats rollups.")
+    parser.add_argument("--check", action="store_true",
+                        help="only verify the stored rollups, don't rebuild them")
+    args = parser.parse_args(argv)
+
+    migrations.run()
+    with SessionLocal() as db:
+        if not args.check:
+            rebuild(db)
+            db.commit()
+            print("[ROLLUPS] Rebuilt from the event log")
+        problems = verify(db)
+
+    if problems:
+        for p in problems:
+            print(f"[ROLLUPS] MISMATCH {p}")
+        return 1
+    print("[ROLLUPS] OK: rollups match the event log")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from .. import profiler
+from ..admin import require_admin
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(default=10, gt=0, le=60),
+    mode: str = Query(default="wall", pattern="^(wall|cpu)$"),
+    format: str = Query(default="speedscope", pattern="^(collapsed|speedscope)$"),
+    interval_ms: float = Query(default=10, ge=1, le=100),
+    include_idle: bool = False,
+):
+    """Sample every thread of this process for ``seconds`` and return the profile.
+
+    ``wall`` shows where time goes, including waits on the database or
+    Brewfather; ``cpu`` only counts time spent running Python.
+    """
+    try:
+        sampler = profiler.Sampler(mode, interval=interval_ms / 1000, include_idle=include_idle)
+        sampler.start()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except profiler.ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        result = sampler.stop()
+    return profiler.profile_response(result, format, f"{mode} profile, {seconds:g}s")
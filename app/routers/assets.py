@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from .. import assets
+
+router = APIRouter(tags=["assets"], include_in_schema=False)
+
+
+@router.api_route("/assets/{name}", methods=["GET", "HEAD"])
+def get_asset(name: str, request: Request):
+    asset = assets.store.get(f"{assets.ASSET_PREFIX}{name}")
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return assets.respond(asset, request, assets.IMMUTABLE)
+
+
+@router.api_route("/", methods=["GET", "HEAD"])
+@router.api_route("/index.html", methods=["GET", "HEAD"])
+def get_index(request: Request):
+    if assets.store.index is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return assets.respond(assets.store.index, request, assets.REVALIDATE)
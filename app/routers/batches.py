@@ -1,49 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
 
-from ..brewfather import fetch_batches, sync_batches_to_db
 from ..database import get_db
 from ..models import Batch
+from ..pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from ..responses import FORMAT_QUERY, json_response, rows_content
+from ..sync_jobs import SyncBusy, sync_manager
+from ..versions import conditional
 
 router = APIRouter(prefix="/api/batches", tags=["batches"])
 
 
-@router.get("")
+_BATCH_COLUMNS = (
+    Batch.id, Batch.batch_no, Batch.name, Batch.style, Batch.abv, Batch.brew_date, Batch.status,
+    Batch.recipe_name, Batch.bottling_date, Batch.batch_notes, Batch.last_synced,
+)
+_BATCH_FIELDS = tuple(c.key for c in _BATCH_COLUMNS)
+
+
+@router.get("", dependencies=[conditional("batches")])
 def list_batches(
+    response: Response,
     db: Session = Depends(get_db),
     limit: int = Query(default=200, ge=1, le=500),
-    offset: int = Query(default=0, ge=0),
+    cursor: str | None = Query(default=None),
+    format: str = FORMAT_QUERY,
 ):
-    batches = (
-        db.query(Batch)
-        .order_by(Batch.brew_date.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    return [
-        {
-            "id": b.id,
-            "batch_no": b.batch_no,
-            "name": b.name,
-            "style": b.style,
-            "abv": b.abv,
-            "brew_date": b.brew_date,
-            "status": b.status,
-            "recipe_name": b.recipe_name,
-            "bottling_date": b.bottling_date,
-            "batch_notes": b.batch_notes,
-            "last_synced": b.last_synced.isoformat() if b.last_synced else None,
-        }
-        for b in batches
-    ]
-
-
-@router.post("/sync")
-async def sync_from_brewfather(db: Session = Depends(get_db)):
+    """Newest brews first. Pass the X-Next-Cursor header back as ``cursor`` for the next page.
+
+    ``format=compact`` sends the field names once instead of in every row.
+    """
+    stmt = select(*_BATCH_COLUMNS)
+    if cursor:
+        brew_date, batch_id = decode_cursor(cursor, 2)
+        if not isinstance(brew_date, str) or not isinstance(batch_id, str):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(Batch.brew_date, Batch.id) < (brew_date, batch_id))
+    rows = db.execute(
+        stmt.order_by(Batch.brew_date.desc(), Batch.id.desc()).limit(limit)
+    ).all()
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.brew_date, last.id)
+    return json_response(rows_content(_BATCH_FIELDS, rows, format), response)
+
+
+@router.post("/sync", status_code=202)
+async def sync_from_brewfather(full: bool = Query(default=False)):
+    """Start a sync (or join the one in flight) and return its job for polling.
+
+    Incremental by default; ``full=true`` re-fetches every tracked batch, and
+    is refused with 409 while an incremental sync is still running.
+    """
     try:
-        raw = await fetch_batches()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Brewfather API error: {e}")
-    result = sync_batches_to_db(db, raw)
-    return {"synced": result["synced"], "failed": result["failed"]}
+        job = await sync_manager.trigger(full=full)
+    except SyncBusy:
+        raise HTTPException(status_code=409, detail="An incremental sync is running; retry the full sync when it finishes")
+    return job.to_dict()
+
+
+@router.get("/sync/{job_id}")
+async def get_sync_job(job_id: str):
+    job = await sync_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job.to_dict()
@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+from collections.abc import Iterator
+from datetime import datetime
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, union_all
+
+from ..database import SessionLocal
+from ..models import Batch, KegEvent, KegEventArchive
+from ..timestamps import naive_utc
+
+router = APIRouter(prefix="/api/export", tags=["export"])
+
+# Rows fetched per round trip and written per response chunk
+_CHUNK_ROWS = 1000
+
+_EVENT_FIELDS = ("id", "keg_id", "event_type", "person", "batch_id", "batch_name", "style", "timestamp")
+_BATCH_FIELDS = (
+    "id", "batch_no", "name", "recipe_name", "style", "abv", "status",
+    "brew_date", "bottling_date", "batch_notes", "last_synced",
+)
+_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+_FORMAT = Query(default="csv", pattern="^(csv|ndjson)$")
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _stream_rows(stmt, fields: tuple[str, ...], fmt: str) -> Iterator[bytes]:
+    """Encode query results chunk by chunk; memory stays flat whatever the row count."""
+    with SessionLocal() as db:
+        if db.get_bind().dialect.name == "sqlite":
+            # One read transaction, so rows moved to the archive mid-export
+            # are neither skipped nor repeated
+            db.connection().exec_driver_sql("BEGIN")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(fields)
+        pending = 0
+        for row in db.execute(stmt.execution_options(yield_per=_CHUNK_ROWS)):
+            values = [_plain(v) for v in row]
+            if writer:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(fields, values)), separators=(",", ":")))
+                buffer.write("\n")
+            pending += 1
+            if pending == _CHUNK_ROWS:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+
+def _export_response(rows: Iterator[bytes], name: str, fmt: str) -> StreamingResponse:
+    return StreamingResponse(
+        rows,
+        media_type=_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+def _event_select(model, start: datetime | None, end: datetime | None):
+    stmt = select(*(getattr(model, f) for f in _EVENT_FIELDS))
+    if start is not None:
+        stmt = stmt.where(model.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(model.timestamp < end)
+    return stmt
+
+
+@router.get("/events")
+def export_events(
+    format: str = _FORMAT,
+    start: datetime | None = Query(default=None, alias="from"),
+    end: datetime | None = Query(default=None, alias="to"),
+    include_archived: bool = Query(default=True),
+):
+    """Every keg event in ``[from, to)``, oldest first, as CSV or NDJSON.
+
+    Times without an offset are taken as UTC.
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    stmt = _event_select(KegEvent, start, end)
+    if include_archived:
+        # Imports can put old events in the live table, so the archive is
+        # merged in by (timestamp, id); SQLite merges the index scans as it goes
+        stmt = union_all(_event_select(KegEventArchive, start, end), stmt)
+    stmt = stmt.order_by(stmt.selected_columns.timestamp, stmt.selected_columns.id)
+    return _export_response(_stream_rows(stmt, _EVENT_FIELDS, format), "keg-events", format)
+
+
+@router.get("/batches")
+def export_batches(format: str = _FORMAT):
+    """Every synced batch, oldest brew first, as CSV or NDJSON."""
+    stmt = select(*(getattr(Batch, f) for f in _BATCH_FIELDS)).order_by(Batch.brew_date, Batch.id)
+    return _export_response(_stream_rows(stmt, _BATCH_FIELDS, format), "batches", format)
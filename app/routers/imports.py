@@ -0,0 +1,68 @@
+import csv
+import io
+import tempfile
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+
+from .. import importer
+from ..broadcast import broadcaster
+from ..database import SessionLocal
+
+router = APIRouter(prefix="/api/import", tags=["import"])
+
+_FORMAT = Query(default=None, pattern="^(csv|ndjson)$")
+
+# Uploads larger than this are spooled to disk instead of held in memory
+_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+async def _spool_body(request: Request) -> tempfile.SpooledTemporaryFile:
+    body = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+    async for chunk in request.stream():
+        body.write(chunk)
+    body.seek(0)
+    return body
+
+
+def _format(request: Request, fmt: str | None) -> str:
+    if fmt:
+        return fmt
+    return "ndjson" if "json" in request.headers.get("content-type", "") else "csv"
+
+
+async def _run(request: Request, kind: str, fmt: str | None, dry_run: bool, run) -> dict:
+    fmt = _format(request, fmt)
+    body = await _spool_body(request)
+
+    def work() -> importer.ImportResult:
+        with body, SessionLocal() as db:
+            stream = io.TextIOWrapper(body, encoding="utf-8-sig", newline="")
+            try:
+                return run(db, stream, fmt, dry_run=dry_run)
+            except UnicodeDecodeError:
+                raise HTTPException(status_code=400, detail="Body must be UTF-8 text")
+            except csv.Error as e:
+                raise HTTPException(status_code=400, detail=f"Malformed CSV: {e}")
+
+    result = await run_in_threadpool(work)
+    if result.imported and not dry_run:
+        # Too many rows to send one by one: clients reload what they show
+        broadcaster.publish("imported", {"kind": kind, "count": result.imported})
+    return result.to_dict()
+
+
+@router.post("/kegs")
+async def import_kegs(request: Request, format: str | None = _FORMAT, dry_run: bool = False):
+    """Create kegs from a CSV or NDJSON body; invalid rows are skipped and reported."""
+    return await _run(request, "kegs", format, dry_run, importer.import_kegs)
+
+
+@router.post("/events")
+async def import_events(request: Request, format: str | None = _FORMAT, dry_run: bool = False):
+    """Append keg event history from a CSV or NDJSON body, then rebuild the stats rollups.
+
+    Invalid rows are skipped and reported by line number. Other writes wait
+    for the rebuild, which replays every logged event.
+    """
+    return await _run(request, "events", format, dry_run, importer.import_events)
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 
-from ..database import get_db
-from ..models import Batch, Keg, KegEvent, KegStatus, Person
+from .. import reference, rollups
+from ..broadcast import broadcaster
+from ..database import get_async_db, get_db
+from ..models import Batch, Keg, KegEvent, KegStatus
+from ..responses import FORMAT_QUERY, json_response
+from ..versions import conditional
 
 router = APIRouter(prefix="/api/kegs", tags=["kegs"])
 
@@ -18,6 +26,18 @@ class KegUpdate(BaseModel):
     clear_batch: bool = False
 
 
+class KegBulkUpdate(KegUpdate):
+    id: int
+
+
+class KegBulkRequest(BaseModel):
+    updates: list[KegBulkUpdate] = []
+    resets: list[int] = []
+
+
+MAX_BULK_KEGS = 200
+
+
 def _keg_to_dict(keg: Keg) -> dict:
     return {
         "id": keg.id,
@@ -42,10 +62,65 @@ def _keg_to_dict(keg: Keg) -> dict:
     }
 
 
-@router.get("")
-def list_kegs(db: Session = Depends(get_db)):
-    kegs = db.query(Keg).options(joinedload(Keg.batch)).order_by(Keg.id).all()
-    return [_keg_to_dict(k) for k in kegs]
+def _event_to_dict(ev: KegEvent) -> dict:
+    return {
+        "id": ev.id,
+        "keg_id": ev.keg_id,
+        "event_type": ev.event_type,
+        "person": ev.person,
+        "batch_name": ev.batch_name,
+        "style": ev.style,
+        "timestamp": ev.timestamp.isoformat(),
+    }
+
+
+def _commit(db: Session) -> list[dict]:
+    """Commit, returning the events logged in this transaction for broadcasting."""
+    db.flush()  # assigns event ids
+    events = [_event_to_dict(ev) for ev in db.info.pop("logged_events", [])]
+    db.commit()
+    return events
+
+
+def _publish_keg(keg: dict, events: list[dict]) -> None:
+    broadcaster.publish("keg", {"keg": keg, "events": events})
+
+
+# Same fields as _keg_to_dict, selected as plain columns for the list
+_KEG_COLUMNS = (Keg.id, Keg.label, Keg.status, Keg.location, Keg.batch_id, Keg.date_purchased, Keg.notes)
+_BATCH_COLUMNS = (Batch.id, Batch.batch_no, Batch.name, Batch.style, Batch.abv,
+                  Batch.recipe_name, Batch.bottling_date, Batch.batch_notes)
+_KEG_FIELDS = tuple(c.key for c in _KEG_COLUMNS)
+_BATCH_FIELDS = tuple(c.key for c in _BATCH_COLUMNS)
+
+
+@router.get("", dependencies=[conditional("kegs", "batches")])
+async def list_kegs(response: Response, db: AsyncSession = Depends(get_async_db),
+                    format: str = FORMAT_QUERY):
+    """Every keg with its batch.
+
+    ``format=compact`` returns ``fields``, ``batch_fields`` and ``rows``, where
+    each row's last value is the batch as a list (or null).
+    """
+    rows = (await db.execute(
+        select(*_KEG_COLUMNS, *_BATCH_COLUMNS)
+        .outerjoin(Batch, Keg.batch_id == Batch.id)
+        .order_by(Keg.id)
+    )).all()
+    n = len(_KEG_COLUMNS)
+    if format == "compact":
+        content = {
+            "fields": [*_KEG_FIELDS, "batch"],
+            "batch_fields": list(_BATCH_FIELDS),
+            "rows": [[*row[:n], list(row[n:]) if row[n] is not None else None] for row in rows],
+        }
+    else:
+        content = [
+            {**dict(zip(_KEG_FIELDS, row[:n])),
+             "batch": dict(zip(_BATCH_FIELDS, row[n:])) if row[n] is not None else None}
+            for row in rows
+        ]
+    return json_response(content, response)
 
 
 @router.post("")
@@ -54,9 +129,11 @@ def create_keg(db: Session = Depends(get_db)):
     db.add(keg)
     db.flush()  # populates keg.id via autoincrement without committing
     keg.label = f"Keg #{keg.id}"
-    db.commit()
+    events = _commit(db)
     db.refresh(keg)
-    return _keg_to_dict(keg)
+    result = _keg_to_dict(keg)
+    _publish_keg(result, events)
+    return result
 
 
 @router.delete("/{keg_id}")
@@ -68,41 +145,48 @@ def delete_keg(keg_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Cannot delete a keg with a batch assigned. Reset it first.")
     _log_event(db, keg_id, "deleted")
     db.delete(keg)
-    db.commit()
+    events = _commit(db)
+    broadcaster.publish("keg_deleted", {"id": keg_id, "events": events})
     return {"ok": True}
 
 
-def _get_people(db: Session) -> set[str]:
-    return {p.name for p in db.query(Person).all()}
-
-
 def _log_event(db: Session, keg_id: int, event_type: str, person: str = "",
                batch_id: str | None = None, batch_name: str = "", style: str = ""):
-    db.add(KegEvent(
+    event = KegEvent(
         keg_id=keg_id,
         event_type=event_type,
         person=person,
         batch_id=batch_id,
         batch_name=batch_name,
         style=style,
-    ))
+        timestamp=datetime.utcnow(),
+    )
+    db.add(event)
+    db.info.setdefault("logged_events", []).append(event)
+    rollups.apply_event(db, event)
 
 
-def _get_batch_info(db: Session, batch_id: str | None) -> tuple[str, str]:
-    if not batch_id:
-        return "", ""
-    batch = db.get(Batch, batch_id)
-    if not batch:
-        return "", ""
-    return batch.recipe_name or batch.name, batch.style
+@router.put("/{keg_id}")
+async def update_keg(keg_id: int, data: KegUpdate, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_update_keg, keg_id, data)
 
 
-@router.put("/{keg_id}")
-def update_keg(keg_id: int, data: KegUpdate, db: Session = Depends(get_db)):
+def _update_keg(db: Session, keg_id: int, data: KegUpdate) -> dict:
     keg = db.get(Keg, keg_id)
     if not keg:
         raise HTTPException(status_code=404, detail="Keg not found")
 
+    _apply_update(db, keg, data, reference.people(db))
+
+    events = _commit(db)
+    db.refresh(keg)
+    result = _keg_to_dict(keg)
+    _publish_keg(result, events)
+    return result
+
+
+def _apply_update(db: Session, keg: Keg, data: KegUpdate, people: frozenset[str]) -> None:
+    """Apply an update to a loaded keg and log its events. Caller commits."""
     old_location = keg.location or ""
     old_batch_id = keg.batch_id
     old_status = keg.status
@@ -118,7 +202,7 @@ def update_keg(keg_id: int, data: KegUpdate, db: Session = Depends(get_db)):
     if data.clear_batch:
         keg.batch_id = None
     elif data.batch_id is not None:
-        if not db.get(Batch, data.batch_id):
+        if not reference.batch_exists(db, data.batch_id):
             raise HTTPException(status_code=404, detail="Batch not found")
         keg.batch_id = data.batch_id
     if data.date_purchased is not None:
@@ -130,27 +214,23 @@ def update_keg(keg_id: int, data: KegUpdate, db: Session = Depends(get_db)):
 
     # Log events for meaningful changes
     new_location = keg.location or ""
-    batch_name, style = _get_batch_info(db, keg.batch_id)
+    batch_name, style = reference.batch_info(db, keg.batch_id)
 
     # Batch assigned
     if keg.batch_id and keg.batch_id != old_batch_id:
-        _log_event(db, keg_id, "filled", batch_id=keg.batch_id,
+        _log_event(db, keg.id, "filled", batch_id=keg.batch_id,
                    batch_name=batch_name, style=style)
 
     # Assigned to a person
-    if new_location in _get_people(db) and new_location != old_location:
-        _log_event(db, keg_id, "assigned", person=new_location,
+    if new_location in people and new_location != old_location:
+        _log_event(db, keg.id, "assigned", person=new_location,
                    batch_id=keg.batch_id, batch_name=batch_name, style=style)
 
     # Tapped
     if keg.status == KegStatus.on_tap and old_status != KegStatus.on_tap:
-        _log_event(db, keg_id, "tapped", person=new_location,
+        _log_event(db, keg.id, "tapped", person=new_location,
                    batch_id=keg.batch_id, batch_name=batch_name, style=style)
 
-    db.commit()
-    db.refresh(keg)
-    return _keg_to_dict(keg)
-
 
 @router.post("/{keg_id}/reset")
 def reset_keg(keg_id: int, db: Session = Depends(get_db)):
@@ -158,11 +238,21 @@ def reset_keg(keg_id: int, db: Session = Depends(get_db)):
     if not keg:
         raise HTTPException(status_code=404, detail="Keg not found")
 
+    _apply_reset(db, keg, reference.people(db))
+
+    events = _commit(db)
+    db.refresh(keg)
+    result = _keg_to_dict(keg)
+    _publish_keg(result, events)
+    return result
+
+
+def _apply_reset(db: Session, keg: Keg, people: frozenset[str]) -> None:
     # Log the return event before clearing data
-    old_person = keg.location if keg.location in _get_people(db) else ""
+    old_person = keg.location if keg.location in people else ""
     if old_person or keg.batch_id:
-        batch_name, style = _get_batch_info(db, keg.batch_id)
-        _log_event(db, keg_id, "returned", person=old_person,
+        batch_name, style = reference.batch_info(db, keg.batch_id)
+        _log_event(db, keg.id, "returned", person=old_person,
                    batch_id=keg.batch_id, batch_name=batch_name, style=style)
 
     keg.status = KegStatus.empty
@@ -171,6 +261,50 @@ def reset_keg(keg_id: int, db: Session = Depends(get_db)):
     keg.date_purchased = ""
     keg.notes = ""
 
-    db.commit()
-    db.refresh(keg)
-    return _keg_to_dict(keg)
+
+@router.post("/bulk")
+async def bulk_update_kegs(data: KegBulkRequest, db: AsyncSession = Depends(get_async_db)):
+    """Apply many updates and resets in one transaction; all or nothing."""
+    return await db.run_sync(_bulk_update, data)
+
+
+def _bulk_update(db: Session, data: KegBulkRequest) -> list[dict]:
+    ids = [u.id for u in data.updates] + data.resets
+    if not ids:
+        raise HTTPException(status_code=400, detail="No updates or resets given")
+    if len(ids) > MAX_BULK_KEGS:
+        raise HTTPException(status_code=400, detail=f"Too many kegs (max {MAX_BULK_KEGS})")
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Each keg may appear only once")
+
+    # The kegs are loaded in one query and people and batch names come from
+    # the reference cache. Each logged event still updates the rollups on its
+    # own (see rollups.apply_event), a few statements per keg
+    kegs = {k.id: k for k in db.scalars(select(Keg).where(Keg.id.in_(ids)))}
+    for keg_id in ids:
+        if keg_id not in kegs:
+            raise HTTPException(status_code=404, detail=f"Keg {keg_id} not found")
+    people = reference.people(db)
+
+    # No autoflush: the events are inserted together when _commit flushes
+    with db.no_autoflush:
+        for update in data.updates:
+            try:
+                _apply_update(db, kegs[update.id], update, people)
+            except HTTPException as e:
+                raise HTTPException(status_code=e.status_code, detail=f"Keg {update.id}: {e.detail}")
+        for keg_id in data.resets:
+            _apply_reset(db, kegs[keg_id], people)
+
+    events = _commit(db)
+    refreshed = {
+        k.id: k
+        for k in db.scalars(select(Keg).options(joinedload(Keg.batch)).where(Keg.id.in_(ids)))
+    }
+    results = [_keg_to_dict(refreshed[keg_id]) for keg_id in ids]
+    events_by_keg: dict[int, list[dict]] = {}
+    for ev in events:
+        events_by_keg.setdefault(ev["keg_id"], []).append(ev)
+    for result in results:
+        _publish_keg(result, events_by_keg.get(result["id"], []))
+    return results
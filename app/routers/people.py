@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models import Location, Person
+from ..versions import conditional
 
 router = APIRouter(prefix="/api/people", tags=["people"])
 
@@ -16,7 +17,7 @@ class LocationCreate(BaseModel):
     name: str
 
 
-@router.get("")
+@router.get("", dependencies=[conditional("people")])
 def list_people(db: Session = Depends(get_db)):
     people = db.query(Person).order_by(Person.name).all()
     return [{"id": p.id, "name": p.name} for p in people]
@@ -54,7 +55,7 @@ def delete_person(person_id: int, db: Session = Depends(get_db)):
 locations_router = APIRouter(prefix="/api/locations", tags=["locations"])
 
 
-@locations_router.get("")
+@locations_router.get("", dependencies=[conditional("locations")])
 def list_locations(db: Session = Depends(get_db)):
     locations = db.query(Location).order_by(Location.name).all()
     return [{"id": loc.id, "name": loc.name} for loc in locations]
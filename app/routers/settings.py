@@ -1,12 +1,15 @@
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile
+from fastapi.responses import FileResponse, RedirectResponse, Response
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from .. import assets, logo, reference
 from ..database import DATABASE_URL, get_db
 from ..models import BrewerySettings
+from ..versions import conditional, touch
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
 
@@ -41,11 +44,17 @@ def _get_settings(db: Session) -> BrewerySettings:
     return settings
 
 
-def _settings_response(settings: BrewerySettings) -> dict:
-    logo_url = "/api/settings/logo" if settings.has_custom_logo else "/logo.png"
+def _logo_url(has_custom_logo: bool) -> str:
+    custom = logo.current(_get_data_dir()) if has_custom_logo else None
+    if custom is None:
+        return assets.store.url("logo.png")
+    return f"/api/settings/logo?v={custom.version}"
+
+
+def _settings_response(settings: BrewerySettings | reference.SettingsSnapshot) -> dict:
     return {
         "name": settings.name,
-        "logo_url": logo_url,
+        "logo_url": _logo_url(settings.has_custom_logo),
         "keg_volume_litres": settings.keg_volume_litres,
     }
 
@@ -70,9 +79,9 @@ class BreweryUpdate(BaseModel):
     keg_volume_litres: float | None = None
 
 
-@router.get("/brewery")
+@router.get("/brewery", dependencies=[conditional("brewery_settings")])
 def get_brewery(db: Session = Depends(get_db)):
-    settings = _get_settings(db)
+    settings = reference.settings(db) or _get_settings(db)
     return _settings_response(settings)
 
 
@@ -91,6 +100,8 @@ def update_brewery(data: BreweryUpdate, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail="Keg volume must be greater than zero")
         if data.keg_volume_litres > MAX_KEG_VOLUME:
             raise HTTPException(status_code=400, detail=f"Keg volume must be at most {MAX_KEG_VOLUME} litres")
+        if data.keg_volume_litres != settings.keg_volume_litres:
+            touch(db, "stats")  # litres poured are derived from it
         settings.keg_volume_litres = data.keg_volume_litres
     db.commit()
     return _settings_response(settings)
@@ -123,44 +134,45 @@ async def upload_logo(file: UploadFile, db: Session = Depends(get_db)):
         tmp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail="Failed to save logo settings")
 
-    # DB committed: remove old logo files and promote the temp file
-    final_path = data_dir / f"custom_logo{ext}"
-    for existing in data_dir.glob("custom_logo.*"):
-        if existing != final_path:
-            existing.unlink(missing_ok=True)
-    tmp_path.rename(final_path)
+    # DB committed: replace the old logo files with the temp file and its resized copies
+    await run_in_threadpool(logo.install, data_dir, tmp_path, ext)
 
-    return {"logo_url": "/api/settings/logo"}
+    return {"logo_url": _logo_url(True)}
 
 
 @router.delete("/logo")
 def delete_logo(db: Session = Depends(get_db)):
-    data_dir = _get_data_dir()
-    for existing in data_dir.glob("custom_logo.*"):
-        existing.unlink(missing_ok=True)
+    logo.remove(_get_data_dir())
 
     settings = _get_settings(db)
     settings.has_custom_logo = False
     db.commit()
 
-    return {"logo_url": "/logo.png"}
+    return {"logo_url": assets.store.url("logo.png")}
 
 
 @router.get("/logo")
-def get_logo():
+def get_logo(
+    request: Request,
+    size: int | None = Query(default=None, ge=1, le=4096),
+    v: str | None = None,
+):
+    """The custom logo, scaled down to the smallest variant at least ``size`` px across."""
     data_dir = _get_data_dir()
-    for logo_file in data_dir.glob("custom_logo.*"):
-        ext = logo_file.suffix.lower()
-        media_types = {
-            ".png": "image/png",
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".gif": "image/gif",
-            ".svg": "image/svg+xml",
-            ".webp": "image/webp",
-        }
-        return FileResponse(
-            str(logo_file),
-            media_type=media_types.get(ext, "image/png"),
-        )
-    raise HTTPException(status_code=404, detail="No custom logo found")
+    custom = logo.current(data_dir)
+    if custom is not None and not custom.pick(size).path.is_file():
+        # Files changed behind our back; look again
+        logo.invalidate()
+        custom = logo.current(data_dir)
+    if custom is None:
+        # Let <img> tags show the default logo rather than a broken image
+        return RedirectResponse(assets.store.url("logo.png"), status_code=307,
+                                headers={"Cache-Control": assets.REVALIDATE})
+
+    variant = custom.pick(size)
+    # A URL naming the current upload never changes meaning
+    cache_control = assets.IMMUTABLE if v == custom.version else assets.REVALIDATE
+    headers = {"ETag": variant.etag, "Cache-Control": cache_control}
+    if assets.not_modified(request, variant.etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(variant.path, media_type=variant.media_type, headers=headers)
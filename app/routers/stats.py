@@ -1,133 +1,274 @@
-from collections import defaultdict
+import os
+from collections import Counter, defaultdict
+from dataclasses import dataclass
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import case, func, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
 
-from ..database import get_db
-from ..models import BrewerySettings, KegEvent
+from .. import reference, versions
+from ..database import AsyncSessionLocal, get_async_db
+from ..models import (
+    EventTypeStats,
+    KegAssignment,
+    KegEvent,
+    KegEventArchive,
+    MonthStats,
+    PersonBatchStats,
+    PersonStats,
+    PersonStyleStats,
+    StyleStats,
+)
+from ..pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from ..responses import FORMAT_QUERY, json_response, rows_content
+from ..response_cache import ResponseCache
+from ..timestamps import naive_utc
+from ..versions import conditional
 
 router = APIRouter(prefix="/api/stats", tags=["stats"])
 
+# Computed payloads keyed on the normalised query; any commit that touches
+# "stats" (a logged event, a rollup rebuild, a keg volume change) clears it
+_cache = ResponseCache(int(os.getenv("STATS_CACHE_SIZE", "64")))
+versions.on_bump("stats", _cache.invalidate)
 
-def _get_keg_litres(db: Session) -> float:
-    settings = db.get(BrewerySettings, 1)
-    if settings and settings.keg_volume_litres:
-        return settings.keg_volume_litres
-    return 19.0
-
-
-@router.get("")
-def get_stats(db: Session = Depends(get_db)):
-    keg_litres = _get_keg_litres(db)
-    events = db.query(KegEvent).order_by(KegEvent.timestamp).all()
-
-    # Build assignment timeline: track assigned→returned pairs per person
-    # An "assigned" event starts a keg for a person
-    # A "returned" event ends it
-    active_kegs: dict[int, dict] = {}  # keg_id → assignment info
-    completed: list[dict] = []
-
-    for ev in events:
-        if ev.event_type == "assigned" and ev.person:
-            active_kegs[ev.keg_id] = {
-                "person": ev.person,
-                "batch_id": ev.batch_id,
-                "batch_name": ev.batch_name,
-                "style": ev.style,
-                "assigned_at": ev.timestamp,
-            }
-        elif ev.event_type == "returned":
-            assignment = active_kegs.pop(ev.keg_id, None)
-            if assignment:
-                days = (ev.timestamp - assignment["assigned_at"]).total_seconds() / 86400
-                completed.append({
-                    "person": assignment["person"],
-                    "batch_name": assignment["batch_name"],
-                    "style": assignment["style"],
-                    "days": round(days, 1),
-                    "assigned_at": assignment["assigned_at"].isoformat(),
-                    "returned_at": ev.timestamp.isoformat(),
-                })
-            # Orphaned returns (no matching assignment) are intentionally skipped
-            # to avoid inflating keg counts with phantom 0-day records
+
+@dataclass
+class StatsFilter:
+    """Restricts stats to completions returned in [start, end) and events in the same window."""
+
+    start: datetime | None = None
+    end: datetime | None = None
+    person: str | None = None
+    style: str | None = None
+
+    @property
+    def active(self) -> bool:
+        return any(v is not None for v in (self.start, self.end, self.person, self.style))
+
+    def assignments(self, stmt):
+        stmt = stmt.where(KegAssignment.returned_at.is_not(None))
+        if self.start is not None:
+            stmt = stmt.where(KegAssignment.returned_at >= self.start)
+        if self.end is not None:
+            stmt = stmt.where(KegAssignment.returned_at < self.end)
+        if self.person is not None:
+            stmt = stmt.where(KegAssignment.person == self.person)
+        if self.style is not None:
+            stmt = stmt.where(KegAssignment.style == self.style)
+        return stmt
+
+    def events(self, stmt, model=KegEvent):
+        # Range predicates on timestamp are served by the timestamp indexes
+        if self.start is not None:
+            stmt = stmt.where(model.timestamp >= self.start)
+        if self.end is not None:
+            stmt = stmt.where(model.timestamp < self.end)
+        if self.person is not None:
+            stmt = stmt.where(model.person == self.person)
+        if self.style is not None:
+            stmt = stmt.where(model.style == self.style)
+        return stmt
+
+
+def _top(rows, limit: int) -> list[dict]:
+    ranked = sorted(rows, key=lambda x: (-x[1], x[0]))[:limit]
+    return [{"name": name, "count": count} for name, count in ranked]
+
+
+def _group_pairs(rows) -> dict[str, list]:
+    grouped: dict[str, list] = defaultdict(list)
+    for person, name, count in rows:
+        grouped[person].append((name, count))
+    return grouped
+
+
+def _recent_history(db: Session, filters: StatsFilter, per_person: int) -> dict[str, list[dict]]:
+    history: dict[str, list[dict]] = defaultdict(list)
+    if per_person <= 0:
+        return history
+    ranked = filters.assignments(
+        select(
+            KegAssignment,
+            func.row_number()
+            .over(partition_by=KegAssignment.person, order_by=KegAssignment.returned_at.desc())
+            .label("rn"),
+        )
+    ).subquery()
+    recent = aliased(KegAssignment, ranked)
+    rows = db.scalars(
+        select(recent).where(ranked.c.rn <= per_person).order_by(recent.returned_at)
+    )
+    for a in rows:
+        history[a.person].append({
+            "person": a.person,
+            "batch_name": a.batch_name,
+            "style": a.style,
+            "days": a.days,
+            "assigned_at": a.assigned_at.isoformat(),
+            "returned_at": a.returned_at.isoformat(),
+        })
+    return history
+
+
+def _rollup_parts(db: Session) -> dict:
+    """All-time aggregates, read straight from the rollup tables."""
+    return {
+        "people": db.execute(
+            select(
+                PersonStats.person, PersonStats.kegs, PersonStats.total_days,
+                PersonStats.first_assigned_at, PersonStats.last_returned_at,
+            ).order_by(PersonStats.person)
+        ).all(),
+        "person_styles": _group_pairs(db.execute(
+            select(PersonStyleStats.person, PersonStyleStats.style, PersonStyleStats.kegs)
+        )),
+        "person_batches": _group_pairs(db.execute(
+            select(PersonBatchStats.person, PersonBatchStats.batch_name, PersonBatchStats.kegs)
+        )),
+        "styles": db.execute(select(StyleStats.style, StyleStats.kegs)).all(),
+        "monthly": db.execute(
+            select(MonthStats.month, MonthStats.kegs).order_by(MonthStats.month)
+        ).all(),
+        "event_counts": dict(db.execute(
+            select(EventTypeStats.event_type, EventTypeStats.count)
+        ).all()),
+    }
+
+
+def _window_parts(db: Session, filters: StatsFilter) -> dict:
+    """The same aggregates as _rollup_parts, grouped in SQL over a filtered window."""
+    # first_assigned_at is the assignment time of the person's earliest return
+    ordered = filters.assignments(
+        select(
+            KegAssignment.person,
+            KegAssignment.days,
+            KegAssignment.assigned_at,
+            KegAssignment.returned_at,
+            func.row_number()
+            .over(partition_by=KegAssignment.person,
+                  order_by=(KegAssignment.returned_at, KegAssignment.id))
+            .label("rn"),
+        )
+    ).subquery()
+    people = db.execute(
+        select(
+            ordered.c.person,
+            func.count(),
+            func.sum(ordered.c.days),
+            func.max(case((ordered.c.rn == 1, ordered.c.assigned_at))),
+            func.max(ordered.c.returned_at),
+        )
+        .group_by(ordered.c.person)
+        .order_by(ordered.c.person)
+    ).all()
+
+    def grouped(*cols, where):
+        return filters.assignments(
+            select(*cols, func.count()).where(where).group_by(*cols)
+        )
+
+    month = func.substr(KegAssignment.returned_at, 1, 7)  # YYYY-MM
+    return {
+        "people": people,
+        "person_styles": _group_pairs(db.execute(grouped(
+            KegAssignment.person, KegAssignment.style, where=KegAssignment.style != "",
+        ))),
+        "person_batches": _group_pairs(db.execute(grouped(
+            KegAssignment.person, KegAssignment.batch_name, where=KegAssignment.batch_name != "",
+        ))),
+        "styles": db.execute(grouped(KegAssignment.style, where=KegAssignment.style != "")).all(),
+        "monthly": db.execute(
+            filters.assignments(select(month, func.count()).group_by(month).order_by(month))
+        ).all(),
+        "event_counts": _window_event_counts(db, filters),
+    }
+
+
+def _window_event_counts(db: Session, filters: StatsFilter) -> dict[str, int]:
+    # Archived events still count towards any window that reaches back to them
+    counts: Counter = Counter()
+    for model in (KegEvent, KegEventArchive):
+        counts.update(dict(db.execute(
+            filters.events(select(model.event_type, func.count()).group_by(model.event_type), model)
+        ).all()))
+    return dict(counts)
+
+
+@router.get("", dependencies=[conditional("stats")])
+async def get_stats(
+    start: datetime | None = Query(default=None, alias="from"),
+    end: datetime | None = Query(default=None, alias="to"),
+    person: str | None = Query(default=None),
+    style: str | None = Query(default=None),
+    history: int = Query(default=10, ge=0, le=100),
+):
+    """Usage stats, all-time by default.
+
+    ``from``/``to`` restrict the window to completions returned (and events
+    logged) in ``[from, to)``; ``person`` and ``style`` narrow it further.
+    Times without an offset are taken as UTC.
+    ``history`` caps the per-person history list (0 omits it).
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    filters = StatsFilter(start=start, end=end, person=person, style=style)
+
+    async def compute():
+        # Own session: the computation may outlive the request that started it
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(_compute_stats, filters, history)
+
+    return await _cache.get_or_compute((start, end, person, style, history), compute)
+
+
+@router.get("/cache")
+def get_stats_cache():
+    """Hit/miss counters for the server-side stats cache."""
+    return _cache.stats()
+
+
+def _compute_stats(db: Session, filters: StatsFilter, history: int) -> dict:
+    keg_litres = reference.keg_litres(db)
+    parts = _window_parts(db, filters) if filters.active else _rollup_parts(db)
+    histories = _recent_history(db, filters, history)
 
     # Per-person stats
-    person_stats: dict[str, dict] = {}
-    for c in completed:
-        p = c["person"]
-        if not p:
-            continue
-        if p not in person_stats:
-            person_stats[p] = {
-                "kegs": 0,
-                "litres": 0,
-                "total_days": 0,
-                "styles": defaultdict(int),
-                "batches": defaultdict(int),
-                "history": [],
-            }
-        ps = person_stats[p]
-        ps["kegs"] += 1
-        ps["litres"] += keg_litres
-        ps["total_days"] += c["days"]
-        if c["style"]:
-            ps["styles"][c["style"]] += 1
-        if c["batch_name"]:
-            ps["batches"][c["batch_name"]] += 1
-        ps["history"].append(c)
-
-    # Format person stats for response
     people = []
-    for name, ps in sorted(person_stats.items()):
-        avg_days = round(ps["total_days"] / ps["kegs"], 1) if ps["kegs"] > 0 else 0
-        top_styles = sorted(ps["styles"].items(), key=lambda x: -x[1])[:3]
-        top_batches = sorted(ps["batches"].items(), key=lambda x: -x[1])[:3]
+    for name, kegs, total_days, first_assigned_at, last_returned_at in parts["people"]:
+        if not kegs:
+            continue
+        litres = kegs * keg_litres
+        avg_days = round(total_days / kegs, 1)
 
         # Consumption rate: litres per month
-        if ps["history"]:
-            first = datetime.fromisoformat(ps["history"][0]["assigned_at"])
-            last = datetime.fromisoformat(ps["history"][-1]["returned_at"])
-            span_days = max((last - first).total_seconds() / 86400, 1)
-            litres_per_month = round(ps["litres"] / (span_days / 30), 1)
-        else:
-            litres_per_month = 0
+        span_days = max((last_returned_at - first_assigned_at).total_seconds() / 86400, 1)
+        litres_per_month = round(litres / (span_days / 30), 1)
 
         people.append({
             "name": name,
-            "kegs_consumed": ps["kegs"],
-            "litres_consumed": ps["litres"],
+            "kegs_consumed": kegs,
+            "litres_consumed": litres,
             "avg_days_per_keg": avg_days,
             "litres_per_month": litres_per_month,
-            "top_styles": [{"name": s, "count": c} for s, c in top_styles],
-            "top_batches": [{"name": b, "count": c} for b, c in top_batches],
-            "history": ps["history"][-10:],  # last 10
+            "top_styles": _top(parts["person_styles"][name], 3),
+            "top_batches": _top(parts["person_batches"][name], 3),
+            "history": histories[name],
         })
 
     # Overall stats
     total_kegs = sum(p["kegs_consumed"] for p in people)
     total_litres = round(total_kegs * keg_litres, 1)
-
-    # All events counts
-    filled_count = sum(1 for e in events if e.event_type == "filled")
-    returned_count = sum(1 for e in events if e.event_type == "returned")
-
-    # Monthly breakdown
-    monthly: dict[str, int] = defaultdict(int)
-    for c in completed:
-        month_key = c["returned_at"][:7]  # YYYY-MM
-        monthly[month_key] += 1
-    monthly_sorted = [{"month": k, "kegs": v} for k, v in sorted(monthly.items())]
-
-    # Style popularity across all people
-    all_styles: dict[str, int] = defaultdict(int)
-    for c in completed:
-        if c["style"]:
-            all_styles[c["style"]] += 1
-    popular_styles = [{"name": s, "count": c} for s, c in
-                      sorted(all_styles.items(), key=lambda x: -x[1])[:5]]
+    event_counts = parts["event_counts"]
+    monthly = [{"month": month, "kegs": kegs} for month, kegs in parts["monthly"]]
 
     # Recent events for activity feed (last 20)
+    recent = db.scalars(
+        filters.events(select(KegEvent))
+        .order_by(KegEvent.timestamp.desc(), KegEvent.id.desc())
+        .limit(20)
+    )
     recent_events = [
         {
             "keg_id": e.keg_id,
@@ -137,7 +278,7 @@ def get_stats(db: Session = Depends(get_db)):
             "style": e.style,
             "timestamp": e.timestamp.isoformat(),
         }
-        for e in reversed(events[-20:])
+        for e in recent
     ]
 
     return {
@@ -145,38 +286,56 @@ def get_stats(db: Session = Depends(get_db)):
         "overall": {
             "total_kegs_consumed": total_kegs,
             "total_litres": total_litres,
-            "total_filled": filled_count,
-            "total_returned": returned_count,
-            "monthly": monthly_sorted,
-            "popular_styles": popular_styles,
+            "total_filled": event_counts.get("filled", 0),
+            "total_returned": event_counts.get("returned", 0),
+            "monthly": monthly,
+            "popular_styles": _top(parts["styles"], 5),
         },
-        "event_count": len(events),
+        "event_count": sum(event_counts.values()),
         "recent_events": recent_events,
     }
 
 
+_EVENT_FIELDS = ("id", "keg_id", "event_type", "person", "batch_name", "style", "timestamp")
+
+
 @router.get("/events")
-def get_events(
-    db: Session = Depends(get_db),
+async def get_events(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     limit: int = Query(default=50, ge=1, le=200),
-    offset: int = Query(default=0, ge=0),
+    cursor: str | None = Query(default=None),
+    format: str = FORMAT_QUERY,
 ):
-    events = (
-        db.query(KegEvent)
-        .order_by(KegEvent.timestamp.desc())
-        .offset(offset)
+    """Newest-first event feed. Pass the X-Next-Cursor header back as ``cursor`` for the next page.
+
+    Archived events are included, in order.
+    ``format=compact`` sends the field names once instead of in every row.
+    """
+    after = None
+    if cursor:
+        ts, event_id = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(ts), int(event_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def page(model):
+        stmt = select(*(getattr(model, f) for f in _EVENT_FIELDS))
+        if after is not None:
+            stmt = stmt.where(tuple_(model.timestamp, model.id) < after)
+        return stmt
+
+    # Imports can put old events in the live table next to archived ones, so
+    # the two are merged rather than read one after the other. SQLite merges
+    # the two timestamp index scans (which implicitly end in the rowid, = id)
+    # without sorting.
+    events = union_all(page(KegEvent), page(KegEventArchive))
+    rows = (await db.execute(
+        events.order_by(events.selected_columns.timestamp.desc(), events.selected_columns.id.desc())
         .limit(limit)
-        .all()
-    )
-    return [
-        {
-            "id": e.id,
-            "keg_id": e.keg_id,
-            "event_type": e.event_type,
-            "person": e.person,
-            "batch_name": e.batch_name,
-            "style": e.style,
-            "timestamp": e.timestamp.isoformat(),
-        }
-        for e in events
-    ]
+    )).all()
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.timestamp.isoformat(), last.id)
+    return json_response(rows_content(_EVENT_FIELDS, rows, format), response)
@@ -0,0 +1,33 @@
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from ..broadcast import broadcaster
+
+router = APIRouter(prefix="/api/stream", tags=["stream"])
+
+KEEPALIVE_SECONDS = 20.0
+
+
+@router.get("")
+async def stream():
+    """Server-sent events: ``keg`` (updated keg plus new events), ``keg_deleted`` and ``imported``."""
+
+    async def messages():
+        with broadcaster.subscribe() as queue:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    message = ": keepalive\n\n"  # keeps proxies from closing idle streams
+                if message is None:
+                    return
+                yield message
+
+    return StreamingResponse(
+        messages(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
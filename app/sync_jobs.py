@@ -0,0 +1,215 @@
+"""Background Brewfather syncs: single-flight jobs plus an interval scheduler.
+
+Every sync, manual or scheduled, runs as a job on the event loop of the
+process that started it. Jobs are recorded in ``sync_jobs``: while one is in
+flight in any worker, further triggers join it instead of starting another,
+so concurrent clicks cost one set of Brewfather requests. A full sync never
+joins a delta one; it is refused until that finishes. Clients poll the
+job by id, which every worker can answer, rather than holding a request open
+for the whole sync.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import delete, exists, insert, literal, select, update
+
+from . import cluster, versions
+from .brewfather import _get_auth, sync_from_brewfather
+from .database import AsyncSessionLocal, async_engine
+from .models import SyncJobRecord
+
+SYNC_INTERVAL_MINUTES = float(os.getenv("BREWFATHER_SYNC_INTERVAL_MINUTES", "30"))
+SYNC_JITTER_SECONDS = float(os.getenv("BREWFATHER_SYNC_JITTER_SECONDS", "60"))
+_MAX_FINISHED_JOBS = 50
+_ACTIVE = ("pending", "running")
+# A running job's process writes its progress this often...
+_HEARTBEAT_SECONDS = 1.0
+# ...and one that hasn't for this long is taken to have died with its worker
+_STALE_SECONDS = 60.0
+
+_jobs = SyncJobRecord.__table__
+
+
+@dataclass
+class SyncJob:
+    id: str
+    full: bool
+    trigger: str  # "manual" or "scheduled"
+    status: str = "pending"  # pending → running → succeeded | failed
+    progress: dict = field(default_factory=dict)
+    result: dict | None = None
+    error: str | None = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: datetime | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "full": self.full,
+            "trigger": self.trigger,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class SyncBusy(Exception):
+    """A full sync was asked for while a delta sync is in flight."""
+
+
+def _from_row(row) -> SyncJob:
+    job = SyncJob(id=row.id, full=row.full, trigger=row.trigger, status=row.status,
+                  progress=json.loads(row.progress or "{}"),
+                  result=json.loads(row.result) if row.result else None,
+                  error=row.error, created_at=row.created_at, finished_at=row.finished_at)
+    if not job.done and row.heartbeat_at < datetime.utcnow() - timedelta(seconds=_STALE_SECONDS):
+        job.status = "failed"
+        job.error = "Sync stopped: its worker exited"
+    return job
+
+
+class SyncManager:
+    def __init__(self):
+        self._running: dict[str, SyncJob] = {}  # jobs started by this process
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    async def get(self, job_id: str) -> SyncJob | None:
+        job = self._running.get(job_id)
+        if job is not None:
+            return job
+        async with async_engine.connect() as conn:
+            row = (await conn.execute(select(_jobs).where(_jobs.c.id == job_id))).first()
+        return _from_row(row) if row else None
+
+    async def trigger(self, full: bool = False, trigger: str = "manual") -> SyncJob:
+        """Start a sync, or return the one already in flight in any worker.
+
+        Raises ``SyncBusy`` when ``full`` is asked for and the job in flight is
+        only a delta sync, which wouldn't cover it.
+        """
+        job = SyncJob(id=uuid.uuid4().hex, full=full, trigger=trigger)
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=_STALE_SECONDS)
+        active = select(_jobs.c.id).where(_jobs.c.status.in_(_ACTIVE), _jobs.c.heartbeat_at >= stale)
+        values = {"id": job.id, "full": full, "trigger": trigger, "status": job.status,
+                  "progress": "{}", "owner": versions.ORIGIN, "created_at": job.created_at,
+                  "heartbeat_at": now}
+        # One statement, so two workers can't both find nothing in flight
+        claim = insert(_jobs).from_select(
+            list(values),
+            select(*(literal(v, _jobs.c[k].type) for k, v in values.items())).where(~exists(active)),
+        )
+        async with async_engine.begin() as conn:
+            claimed = (await conn.execute(claim)).rowcount > 0
+            if claimed:
+                recent = select(_jobs.c.id).order_by(_jobs.c.created_at.desc()).limit(_MAX_FINISHED_JOBS)
+                await conn.execute(delete(_jobs).where(_jobs.c.id.not_in(recent)))
+            else:
+                row = (await conn.execute(
+                    select(_jobs).where(_jobs.c.status.in_(_ACTIVE), _jobs.c.heartbeat_at >= stale)
+                    .order_by(_jobs.c.created_at.desc()).limit(1)
+                )).first()
+        if not claimed:
+            if row is None:  # it finished in between; start a fresh one
+                return await self.trigger(full, trigger)
+            if full and not row.full:
+                raise SyncBusy()
+            return self._running.get(row.id) or _from_row(row)
+        self._running[job.id] = job
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+        return job
+
+    async def wait(self, job: SyncJob) -> None:
+        task = self._tasks.get(job.id)
+        if task:
+            await asyncio.shield(task)
+
+    async def _save(self, job: SyncJob) -> None:
+        async with async_engine.begin() as conn:
+            await conn.execute(update(_jobs).where(_jobs.c.id == job.id).values(
+                status=job.status,
+                progress=json.dumps(job.progress),
+                result=json.dumps(job.result) if job.result is not None else None,
+                error=job.error,
+                finished_at=job.finished_at,
+                heartbeat_at=datetime.utcnow(),
+            ))
+
+    async def _heartbeat(self, job: SyncJob) -> None:
+        while True:
+            await asyncio.sleep(_HEARTBEAT_SECONDS)
+            try:
+                await self._save(job)
+            except Exception as e:
+                print(f"[SYNC] Could not save progress of job {job.id}: {e!r}")
+
+    async def _run(self, job: SyncJob) -> None:
+        job.status = "running"
+
+        def progress(**counts):
+            job.progress = counts
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            async with AsyncSessionLocal() as db:
+                job.result = await sync_from_brewfather(db, full=job.full, progress=progress)
+            job.status = "succeeded"
+            job.progress = {"stage": "done", "batches": job.result["synced"]}
+        except (httpx.HTTPError, ValueError) as e:
+            job.error = f"Brewfather API error: {e}"
+            job.status = "failed"
+        except Exception as e:
+            print(f"[SYNC] Job {job.id} crashed: {e!r}")
+            job.error = f"Sync failed: {e}"
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.utcnow()
+            heartbeat.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await heartbeat
+            try:
+                await self._save(job)
+            except Exception as e:
+                print(f"[SYNC] Could not save job {job.id}: {e!r}")
+            self._running.pop(job.id, None)
+            self._tasks.pop(job.id, None)
+
+    async def run_schedule(self, interval_minutes: float = SYNC_INTERVAL_MINUTES,
+                           jitter_seconds: float = SYNC_JITTER_SECONDS) -> None:
+        """Trigger a sync every interval (± jitter) until cancelled."""
+        delay = random.uniform(0, jitter_seconds)
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                # Every worker runs this loop; the lease makes one of them sync per interval
+                if await cluster.claim("brewfather_schedule", interval_minutes * 30):
+                    job = await self.trigger(trigger="scheduled")
+                    await self.wait(job)
+                    if job.error:
+                        print(f"[SYNC] Scheduled sync failed: {job.error}")
+            except Exception as e:  # e.g. the database is locked; try again next interval
+                print(f"[SYNC] Scheduled sync failed: {e!r}")
+            delay = max(interval_minutes * 60 + random.uniform(-jitter_seconds, jitter_seconds), 1)
+
+
+sync_manager = SyncManager()
+
+
+def scheduler_enabled() -> bool:
+    user_id, api_key = _get_auth()
+    return SYNC_INTERVAL_MINUTES > 0 and bool(user_id and api_key)
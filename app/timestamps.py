@@ -0,0 +1,10 @@
+"""Timestamps are stored as naive UTC, like ``datetime.utcnow()``."""
+
+from datetime import datetime, timezone
+
+
+def naive_utc(value: datetime | None) -> datetime | None:
+    """Convert an offset-aware datetime to naive UTC; naive ones are taken as UTC already."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,238 @@
+"""Per-table data versions and the ETags derived from them.
+
+Committed writes are recorded in ``change_log``, and the id of the row that
+records a change to a table becomes that table's version.
+Names needn't be real tables: ``touch(db, "stats")`` marks a derived view as
+changed without tying it to the tables it happens to read.
+Other processes pick the rows up by following the log (see ``cluster``), so
+every worker converges on the same versions and ETags.
+
+In the server, ``cluster.follow()`` writes this process's changes to the log
+once per poll rather than once per commit, which keeps write transactions as
+short as they'd be without it. Until then a changed table's version carries a
+local suffix, so its ETags still change the moment the commit lands. Other
+processes, such as CLI tools, add the row in the committing transaction.
+A server process that dies between polls takes its unlogged changes with
+it, so each one logs a change to every table (``ALL``) as it starts: the
+worker that replaces it drops everything cached from before, in every process.
+
+Read endpoints build a strong ETag from the versions of the tables they read
+and answer a matching ``If-None-Match`` with 304 before querying anything.
+"""
+
+import hashlib
+import threading
+import uuid
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from .models import ChangeLogEntry
+
+# This process, as recorded in change_log.origin
+ORIGIN = uuid.uuid4().hex[:12]
+# Logged as the tables of a change that may have touched any of them
+ALL = "*"
+# Until load() adopts the database's own, tags from another process never match
+_epoch = uuid.uuid4().hex[:8]
+# Version of every table not changed since load()
+_baseline = 0
+_versions: dict[str, int] = {}
+# Tables changed here but not yet in the log → local sequence number
+_pending: dict[str, int] = {}
+_sequence = 0
+# Set while cluster.follow() writes this process's changes to the log
+_deferred = False
+_lock = threading.Lock()
+_listeners: dict[str, list[Callable[[], None]]] = defaultdict(list)
+_changes = ChangeLogEntry.__table__
+
+
+def _version(table: str) -> int | str:
+    version = _versions.get(table, _baseline)
+    pending = _pending.get(table)
+    return version if pending is None else f"{version}.{ORIGIN}.{pending}"
+
+
+def current(*tables: str) -> tuple[int | str, ...]:
+    return tuple(_version(t) for t in tables)
+
+
+def load(conn: Connection) -> int:
+    """Adopt the database's epoch and latest change id, which is returned.
+
+    Which tables changed before now is unknown, so they all take that id.
+    """
+    global _epoch, _baseline, _versions
+    marker = conn.scalar(select(_changes.c.origin).where(_changes.c.id == 0))
+    last = conn.scalar(select(func.max(_changes.c.id))) or 0
+    with _lock:
+        if marker:
+            _epoch = marker[:8]
+        _baseline = max(_baseline, last)
+        _versions = {t: v for t, v in _versions.items() if v > _baseline}
+    return last
+
+
+def record(conn: Connection, tables: Iterable[str], message: str | None = None) -> int:
+    """Append a change to the log on ``conn``; returns its id."""
+    result = conn.execute(insert(_changes).values(origin=ORIGIN, tables=",".join(sorted(tables)),
+                                                  message=message))
+    return result.inserted_primary_key[0]
+
+
+def defer_logging(deferred: bool) -> None:
+    """Leave writing this process's changes to the log to ``unlogged()``/``logged()``."""
+    global _deferred
+    _deferred = deferred
+
+
+def unlogged() -> tuple[set[str], int]:
+    """Tables changed here but not yet in the log, and the sequence number covering them."""
+    with _lock:
+        return set(_pending), _sequence
+
+
+def logged(change_id: int, tables: Iterable[str], sequence: int) -> None:
+    """Tables from ``unlogged()`` reached the log as ``change_id``."""
+    with _lock:
+        for t in tables:
+            if change_id > _versions.get(t, _baseline):
+                _versions[t] = change_id
+            if _pending.get(t, 0) <= sequence:  # else changed again since
+                _pending.pop(t, None)
+
+
+def apply(change_id: int | None, tables: Iterable[str]) -> None:
+    """Move ``tables`` up to version ``change_id`` and notify their listeners.
+
+    ``None`` is a change made here that isn't in the log yet.
+    """
+    global _baseline, _sequence, _versions
+    tables = list(tables)
+    with _lock:
+        if change_id is None:
+            _sequence += 1
+            for t in tables:
+                _pending[t] = _sequence
+        elif ALL in tables:
+            _baseline = max(_baseline, change_id)
+            _versions = {t: v for t, v in _versions.items() if v > _baseline}
+        else:
+            for t in tables:
+                if change_id > _versions.get(t, _baseline):
+                    _versions[t] = change_id
+    for t in list(_listeners) if ALL in tables else tables:
+        for fn in _listeners.get(t, ()):
+            fn()
+
+
+def bump(*tables: str) -> None:
+    """Record a change made outside any session, such as to files."""
+    from .database import engine
+
+    if _deferred:
+        apply(None, tables)
+        return
+    with engine.begin() as conn:
+        change_id = record(conn, tables)
+    apply(change_id, tables)
+
+
+def on_bump(table: str, fn: Callable[[], None]) -> None:
+    """Call ``fn`` whenever ``table`` changes, here (in the committing thread) or elsewhere."""
+    _listeners[table].append(fn)
+
+
+def touch(db: Session, *tables: str) -> None:
+    """Mark tables as written by this session; they're bumped when it commits."""
+    db.info.setdefault("touched_tables", set()).update(tables)
+
+
+def etag(tables: tuple[str, ...], variant: str = "") -> str:
+    parts = "-".join(str(v) for v in current(*tables))
+    if variant:
+        parts += "-" + hashlib.blake2s(variant.encode(), digest_size=6).hexdigest()
+    return f'"{_epoch}-{parts}"'
+
+
+def _matches(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {c.strip().removeprefix("W/") for c in header.split(",")}
+    return tag in candidates or "*" in candidates
+
+
+def conditional(*tables: str):
+    """Route dependency: 304 when the client's ETag is current, else set ETag.
+
+    Query parameters are folded into the tag, so each distinct request URL
+    gets its own validator.
+    """
+
+    def check(request: Request, response: Response) -> None:
+        tag = etag(tables, request.url.query)
+        if _matches(request, tag):
+            raise HTTPException(status_code=304, headers={"ETag": tag})
+        response.headers["ETag"] = tag
+
+    return Depends(check)
+
+
+# ── Session hooks ────────────────────────────────────────────
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session: Session, _flush_context) -> None:
+    tables = {
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, "__table__")
+    }
+    if tables:
+        touch(session, *tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed(state: ORMExecuteState):
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return None
+    table = getattr(state.statement, "table", None)
+    if table is None:
+        return None
+    result = state.invoke_statement()
+    # Statements that matched nothing (e.g. a no-op upsert) don't invalidate
+    if getattr(result, "rowcount", -1) != 0:
+        touch(state.session, table.name)
+    return result
+
+
+@event.listens_for(Session, "before_commit")
+def _record_changes(session: Session) -> None:
+    if _deferred:
+        return
+    session.flush()  # pending objects add their tables
+    tables = session.info.get("touched_tables")
+    if tables:
+        # Same transaction as the writes, so log order is commit order
+        session.info["change_id"] = record(session.connection(), tables)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed(session: Session) -> None:
+    tables = session.info.pop("touched_tables", None)
+    change_id = session.info.pop("change_id", None)
+    if tables:
+        apply(change_id, tables)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session: Session, previous_transaction) -> None:
+    if previous_transaction.parent is None:  # outermost transaction only
+        session.info.pop("touched_tables", None)
+        session.info.pop("change_id", None)
@@ -0,0 +1,133 @@
+"""A local stand-in for the Brewfather v2 batches API.
+
+Replays recorded batches with injected latency and 429 rate limiting, so the
+sync path can be exercised without touching the real API or its quota.
+
+Record real batches once (uses BREWFATHER_USER_ID / BREWFATHER_API_KEY):
+
+    python bench/fake_brewfather.py record batches.json
+
+Serve them (or --synthetic N made-up batches) and point the app at it:
+
+    python bench/fake_brewfather.py serve --data batches.json --latency-ms 150 --throttle-every 5
+    BREWFATHER_BASE_URL=http://127.0.0.1:8787/v2 uvicorn app.main:app
+
+``create_app`` builds the same server for in-process use, e.g. behind
+``httpx.ASGITransport`` passed to ``app.brewfather.open_client``.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+STATUSES = ["Planning", "Brewing", "Fermenting", "Conditioning", "Completed", "Archived"]
+STYLES = ["American IPA", "Dry Stout", "German Pilsner", "Saison", "Robust Porter", "Hazy IPA"]
+
+
+def synthetic_batches(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    batches = []
+    for i in range(1, count + 1):
+        brewed = 1_600_000_000_000 + i * 86_400_000 * 3
+        batches.append({
+            "_id": f"fake{i:06d}",
+            "name": f"Batch {i}",
+            "batchNo": i,
+            "status": rng.choice(STATUSES),
+            "brewDate": brewed,
+            "bottlingDate": brewed + 14 * 86_400_000,
+            "measuredAbv": round(rng.uniform(3.5, 9.5), 1),
+            "note": "",
+            "recipe": {"name": f"Recipe {i % 40}", "style": {"name": rng.choice(STYLES)}},
+            "_timestamp_ms": brewed + rng.randint(0, 30) * 86_400_000,
+        })
+    return batches
+
+
+def create_app(batches: list[dict], latency_ms: float = 0, latency_jitter_ms: float = 0,
+               throttle_every: int = 0, retry_after: float = 1) -> FastAPI:
+    app = FastAPI(title="Fake Brewfather")
+    app.state.requests = 0
+    app.state.throttled = 0
+
+    @app.get("/v2/batches")
+    async def list_batches(
+        status: str | None = None,
+        limit: int = Query(default=10, le=50),
+        offset: int = 0,
+        order_by: str = "_id",
+        order_by_direction: str = "asc",
+    ):
+        app.state.requests += 1
+        delay = latency_ms + random.uniform(0, latency_jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if throttle_every and app.state.requests % throttle_every == 0:
+            app.state.throttled += 1
+            return JSONResponse(
+                {"message": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": str(retry_after)},
+            )
+
+        items = [b for b in batches if status is None or b.get("status") == status]
+        items.sort(key=lambda b: (b.get(order_by) is None, b.get(order_by)),
+                   reverse=order_by_direction == "desc")
+        return items[offset:offset + limit]
+
+    return app
+
+
+def _record(path: Path) -> None:
+    from app.brewfather import close_client, fetch_batches
+
+    async def run():
+        try:
+            return await fetch_batches(STATUSES)
+        finally:
+            await close_client()
+
+    batches = asyncio.run(run())
+    path.write_text(json.dumps(batches, indent=1))
+    print(f"Recorded {len(batches)} batches to {path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="save real Brewfather batches to a JSON file")
+    record.add_argument("path", type=Path)
+
+    serve = sub.add_parser("serve", help="serve recorded or synthetic batches")
+    serve.add_argument("--data", type=Path, help="JSON file written by 'record'")
+    serve.add_argument("--synthetic", type=int, default=500, help="batches to generate without --data")
+    serve.add_argument("--latency-ms", type=float, default=0)
+    serve.add_argument("--latency-jitter-ms", type=float, default=0)
+    serve.add_argument("--throttle-every", type=int, default=0, help="answer every Nth request with 429")
+    serve.add_argument("--retry-after", type=float, default=1)
+    serve.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        _record(args.path)
+        return
+
+    import uvicorn
+
+    batches = json.loads(args.data.read_text()) if args.data else synthetic_batches(args.synthetic)
+    app = create_app(batches, args.latency_ms, args.latency_jitter_ms,
+                     args.throttle_every, args.retry_after)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
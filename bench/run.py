@@ -0,0 +1,255 @@
+"""Latency and throughput of the hot API paths, driven in-process.
+
+Seeds a scratch database (see ``bench/seed.py``), starts the app with its
+lifespan and a stubbed Brewfather (``bench/fake_brewfather.py``), then
+fires requests from concurrent clients over ASGI, scenario by scenario:
+
+    kegs_list       GET /api/kegs
+    stats           GET /api/stats (warm response cache)
+    stats_uncached  GET /api/stats with a distinct window each time
+    events_feed     GET /api/stats/events, following the cursor
+    keg_update      PUT /api/kegs/{id}
+    sync            POST /api/batches/sync?full=true, polled until done
+
+Prints p50/p95/p99 latency and requests per second, and writes them with the
+run's settings to a JSON file; ``--compare`` prints the change against an
+earlier one. The engine profile comes from ``DATABASE_PROFILE`` (default
+"production").
+
+    python bench/run.py --events 200000 --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# The app reads its configuration when first imported (seed.py imports it too)
+_WORKDIR = Path(tempfile.mkdtemp(prefix="keg-bench-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{_WORKDIR / 'bench.db'}"
+os.environ.setdefault("DATABASE_PROFILE", "production")
+os.environ.update({
+    "MAINTENANCE_INTERVAL_HOURS": "0",
+    "BREWFATHER_SYNC_INTERVAL_MINUTES": "0",
+    "BREWFATHER_USER_ID": "bench",
+    "BREWFATHER_API_KEY": "bench",
+})
+
+import httpx  # noqa: E402
+import sqlalchemy  # noqa: E402
+
+import fake_brewfather  # noqa: E402
+import seed  # noqa: E402
+from app.database import DATABASE_PROFILE, DATABASE_URL  # noqa: E402
+
+# Sync every batch the stub serves, not just the default "Conditioning" ones
+os.environ["BREWFATHER_SYNC_STATUSES"] = ",".join(fake_brewfather.STATUSES)
+
+SCENARIOS = ("kegs_list", "stats", "stats_uncached", "events_feed", "keg_update", "sync")
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _summary(latencies: list[float], errors: int, elapsed: float) -> dict:
+    ms = sorted(v * 1000 for v in latencies)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "p50_ms": round(_percentile(ms, 50), 3),
+        "p95_ms": round(_percentile(ms, 95), 3),
+        "p99_ms": round(_percentile(ms, 99), 3),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+        "throughput_rps": round(len(ms) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+async def _drive(client: httpx.AsyncClient, request, total: int, concurrency: int) -> dict:
+    """Run ``request(client, n)`` ``total`` times across ``concurrency`` workers."""
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker(state: dict):
+        nonlocal errors
+        for n in counter:
+            started = time.perf_counter()
+            resp = await request(client, n, state)
+            latencies.append(time.perf_counter() - started)
+            if resp.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker({}) for _ in range(concurrency)))
+    return _summary(latencies, errors, time.perf_counter() - started)
+
+
+def _requests(scale: seed.Scale):
+    window_end = datetime.utcnow()
+
+    async def kegs_list(client, n, state):
+        return await client.get("/api/kegs")
+
+    async def stats(client, n, state):
+        return await client.get("/api/stats")
+
+    async def stats_uncached(client, n, state):
+        # A window the response cache hasn't seen, so every request computes
+        end = window_end - timedelta(minutes=n)
+        return await client.get("/api/stats", params={"from": (end - timedelta(days=365)).isoformat(),
+                                                       "to": end.isoformat()})
+
+    async def events_feed(client, n, state):
+        params = {"limit": 50}
+        if state.get("cursor") and state.get("pages", 0) < 20:
+            params["cursor"] = state["cursor"]
+            state["pages"] += 1
+        else:
+            state["pages"] = 0
+        resp = await client.get("/api/stats/events", params=params)
+        state["cursor"] = resp.headers.get("X-Next-Cursor")
+        return resp
+
+    async def keg_update(client, n, state):
+        keg_id = n % scale.kegs + 1
+        location = seed.LOCATIONS[n // scale.kegs % len(seed.LOCATIONS)]
+        return await client.put(f"/api/kegs/{keg_id}", json={"location": location})
+
+    return {"kegs_list": kegs_list, "stats": stats, "stats_uncached": stats_uncached,
+            "events_feed": events_feed, "keg_update": keg_update}
+
+
+async def _sync(client: httpx.AsyncClient, runs: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    synced = 0
+    started = time.perf_counter()
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        job = (await client.post("/api/batches/sync", params={"full": "true"})).json()
+        while job["status"] not in ("succeeded", "failed"):
+            await asyncio.sleep(0.005)
+            job = (await client.get(f"/api/batches/sync/{job['id']}")).json()
+        latencies.append(time.perf_counter() - t0)
+        if job["status"] == "failed":
+            errors += 1
+        else:
+            synced = job["result"]["synced"]
+    result = _summary(latencies, errors, time.perf_counter() - started)
+    result["batches_synced"] = synced
+    return result
+
+
+async def _run(args: argparse.Namespace, scale: seed.Scale) -> dict:
+    from app import brewfather
+    from app.main import app
+
+    fake = fake_brewfather.create_app(
+        fake_brewfather.synthetic_batches(args.fake_batches, scale.seed),
+        latency_ms=args.brewfather_latency_ms,
+    )
+    results = {}
+    async with app.router.lifespan_context(app):
+        await brewfather.open_client(transport=httpx.ASGITransport(app=fake))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            requests = _requests(scale)
+            for name in args.scenarios:
+                if name == "sync":
+                    results[name] = await _sync(client, args.syncs)
+                else:
+                    await _drive(client, requests[name], args.warmup, args.concurrency)
+                    results[name] = await _drive(client, requests[name], args.requests, args.concurrency)
+                print(_format_row(name, results[name]))
+    return results
+
+
+def _format_row(name: str, r: dict) -> str:
+    return (f"{name:<16}{r['requests']:>7}{r['errors']:>7}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+            f"{r['p99_ms']:>10.2f}{r['throughput_rps']:>10.1f}")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(results: dict, baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text())["scenarios"]
+    print(f"\nvs {baseline_path} ({'p50':>8} {'p95':>8} {'rps':>8})")
+    for name, r in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "throughput_rps"):
+            deltas.append(f"{(r[key] - old[key]) / old[key] * 100:+7.1f}%" if old[key] else "     n/a")
+        print(f"{name:<16}" + " ".join(deltas))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seed.add_scale_arguments(parser)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests before each scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--syncs", type=int, default=5, help="full syncs to time")
+    parser.add_argument("--fake-batches", type=int, default=500, help="batches the stub Brewfather serves")
+    parser.add_argument("--brewfather-latency-ms", type=float, default=0)
+    parser.add_argument("--output", type=Path, default=Path("bench-results.json"))
+    parser.add_argument("--compare", type=Path, help="earlier results file to diff against")
+    args = parser.parse_args()
+    scale = seed.scale_from_args(args)
+
+    try:
+        t0 = time.perf_counter()
+        counts = seed.seed_database(DATABASE_URL, scale, DATABASE_PROFILE)
+        print(f"Seeded {counts} in {time.perf_counter() - t0:.1f}s")
+        print(f"\n{'scenario':<16}{'reqs':>7}{'errors':>7}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'p99 ms':>10}{'req/s':>10}")
+        results = asyncio.run(_run(args, scale))
+    finally:
+        shutil.rmtree(_WORKDIR, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(),
+            "profile": DATABASE_PROFILE,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "scale": counts,
+        },
+        "scenarios": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"\nWrote {args.output}")
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
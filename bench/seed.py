@@ -0,0 +1,143 @@
+"""Seed a SQLite database with synthetic kegs, people, batches and events.
+
+Events follow realistic keg cycles (filled → assigned → tapped → returned)
+spread over the past few years, and the stats rollups are rebuilt at the
+end, so the result looks like a long-running install.
+
+    python bench/seed.py /tmp/bench.db --kegs 64 --people 25 --batches 400 --events 200000
+"""
+
+import argparse
+import random
+import sys
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import rollups  # noqa: E402
+from app.database import Base, create_db_engine  # noqa: E402
+from app.models import Batch, BrewerySettings, Keg, KegEvent, KegStatus, Location, Person  # noqa: E402
+
+STYLES = ["American IPA", "Dry Stout", "German Pilsner", "Saison", "Robust Porter",
+          "Hazy IPA", "Belgian Dubbel", "Kölsch", "Brown Ale", "Berliner Weisse"]
+LOCATIONS = ["Conditioning Fridge", "Keezer", "Garage", "Cellar"]
+
+
+@dataclass
+class Scale:
+    kegs: int = 32
+    people: int = 12
+    batches: int = 200
+    events: int = 50_000
+    years: float = 3.0
+    seed: int = 0
+
+
+def _batches(rng: random.Random, scale: Scale, start: datetime) -> list[dict]:
+    span = timedelta(days=365 * scale.years)
+    rows = []
+    for i in range(1, scale.batches + 1):
+        brewed = start + span * (i / scale.batches)
+        rows.append({
+            "id": f"bench{i:06d}",
+            "batch_no": i,
+            "name": f"Batch {i}",
+            "recipe_name": f"Recipe {i % 60}",
+            "style": rng.choice(STYLES),
+            "abv": round(rng.uniform(3.5, 9.5), 1),
+            "brew_date": brewed.date().isoformat(),
+            "status": "Completed",
+            "bottling_date": (brewed + timedelta(days=14)).date().isoformat(),
+            "batch_notes": "",
+        })
+    return rows
+
+
+def _events(rng: random.Random, scale: Scale, people: list[str], batches: list[dict],
+            start: datetime) -> list[dict]:
+    """Whole keg cycles, interleaved across kegs, in timestamp order."""
+    span_seconds = 365 * 86400 * scale.years
+    step = span_seconds / max(scale.events, 1)
+    rows: list[dict] = []
+    ts = start
+    while len(rows) < scale.events:
+        keg_id = rng.randint(1, scale.kegs)
+        batch = rng.choice(batches) if batches else None
+        person = rng.choice(people)
+        common = {
+            "keg_id": keg_id,
+            "batch_id": batch["id"] if batch else None,
+            "batch_name": batch["recipe_name"] if batch else "",
+            "style": batch["style"] if batch else "",
+        }
+        cycle = [("filled", ""), ("assigned", person), ("tapped", person), ("returned", person)]
+        for event_type, who in cycle[: scale.events - len(rows)]:
+            ts += timedelta(seconds=rng.uniform(0.5, 1.5) * step)
+            rows.append({**common, "event_type": event_type, "person": who, "timestamp": ts})
+    return rows
+
+
+def seed_database(url: str, scale: Scale, profile: str = "production") -> dict:
+    """Create the schema at ``url`` and fill it; returns row counts."""
+    rng = random.Random(scale.seed)
+    engine = create_db_engine(url, profile)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    start = datetime.utcnow() - timedelta(days=365 * scale.years)
+
+    people = [f"Person {i}" for i in range(1, scale.people + 1)]
+    batches = _batches(rng, scale, start)
+    events = _events(rng, scale, people, batches, start)
+    kegs = [
+        {"id": i, "label": f"Keg #{i}", "status": KegStatus.empty, "location": "",
+         "batch_id": None, "date_purchased": "", "notes": ""}
+        for i in range(1, scale.kegs + 1)
+    ]
+    # Leave about half the kegs full somewhere, as they would be mid-season
+    for keg in rng.sample(kegs, len(kegs) // 2):
+        keg.update(status=KegStatus.full, batch_id=rng.choice(batches)["id"] if batches else None,
+                   location=rng.choice(people + LOCATIONS))
+
+    with Session() as db:
+        db.execute(insert(Person.__table__), [{"name": p} for p in people])
+        db.execute(insert(Location.__table__), [{"name": loc} for loc in LOCATIONS])
+        db.execute(insert(BrewerySettings.__table__), [{"id": 1, "name": "Bench Brewing"}])
+        if batches:
+            db.execute(insert(Batch.__table__), batches)
+        db.execute(insert(Keg.__table__), kegs)
+        for i in range(0, len(events), 50_000):
+            db.execute(insert(KegEvent.__table__), events[i:i + 50_000])
+        rollups.rebuild(db)
+        db.commit()
+    engine.dispose()
+    return {"kegs": len(kegs), "people": len(people), "batches": len(batches), "events": len(events)}
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = Scale()
+    for name, value in asdict(defaults).items():
+        parser.add_argument(f"--{name}", type=type(value), default=value)
+
+
+def scale_from_args(args: argparse.Namespace) -> Scale:
+    return Scale(**{name: getattr(args, name) for name in asdict(Scale())})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", type=Path, help="SQLite file to create (must not exist)")
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    if args.path.exists():
+        parser.error(f"{args.path} already exists")
+    counts = seed_database(f"sqlite:///{args.path}", scale_from_args(args))
+    print(f"Seeded {args.path}: " + ", ".join(f"{n} {k}" for k, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
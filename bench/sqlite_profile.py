@@ -0,0 +1,128 @@
+"""Mixed read/write throughput of the "default" vs "production" SQLite profiles.
+
+Seeds a scratch database, then runs keg-update writers (one event insert,
+rollup update and keg update per transaction) alongside stats readers for a
+fixed time on each engine profile, and prints operations per second.
+
+    python bench/sqlite_profile.py --seconds 10 --writers 4 --readers 16
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import rollups  # noqa: E402
+from app.database import Base, create_db_engine  # noqa: E402
+from app.models import Keg, KegEvent, KegStatus, PersonStats  # noqa: E402
+
+PEOPLE = ["Michael", "Troy", "Brent", "Sam", "Alex"]
+STYLES = ["IPA", "Stout", "Pilsner", "Saison", "Porter"]
+
+
+def seed(Session, kegs: int, events: int) -> None:
+    with Session() as db:
+        for i in range(1, kegs + 1):
+            db.add(Keg(id=i, label=f"Keg #{i}", status=KegStatus.empty))
+        ts = datetime(2020, 1, 1)
+        rows = []
+        for _ in range(events):
+            ts += timedelta(minutes=random.randint(1, 600))
+            rows.append({
+                "keg_id": random.randint(1, kegs),
+                "event_type": random.choice(["filled", "assigned", "tapped", "returned"]),
+                "person": random.choice(PEOPLE),
+                "batch_name": "Batch",
+                "style": random.choice(STYLES),
+                "timestamp": ts,
+            })
+        db.execute(KegEvent.__table__.insert(), rows)
+        rollups.rebuild(db)
+        db.commit()
+
+
+def run(profile: str, path: Path, args) -> dict:
+    engine = create_db_engine(f"sqlite:///{path}", profile)
+    Session = sessionmaker(bind=engine)
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + args.seconds
+
+    def writer():
+        while time.perf_counter() < stop:
+            try:
+                with Session() as db:
+                    keg = db.get(Keg, random.randint(1, args.kegs))
+                    keg.location = random.choice(PEOPLE)
+                    ev = KegEvent(keg_id=keg.id, event_type=random.choice(["assigned", "returned"]),
+                                  person=keg.location, style=random.choice(STYLES),
+                                  timestamp=datetime.utcnow())
+                    db.add(ev)
+                    rollups.apply_event(db, ev)
+                    db.commit()
+                key = "writes"
+            except Exception:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+
+    def reader():
+        while time.perf_counter() < stop:
+            try:
+                with Session() as db:
+                    db.execute(select(PersonStats)).all()
+                    db.execute(
+                        select(KegEvent).order_by(KegEvent.timestamp.desc()).limit(50)
+                    ).all()
+                    db.scalar(select(func.count()).select_from(Keg))
+                key = "reads"
+            except Exception:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    return {k: v / args.seconds for k, v in counts.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--kegs", type=int, default=50)
+    parser.add_argument("--events", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = Path(tmp) / "template.db"
+        engine = create_db_engine(f"sqlite:///{template}", "default")
+        Base.metadata.create_all(bind=engine)
+        seed(sessionmaker(bind=engine), args.kegs, args.events)
+        engine.dispose()
+
+        print(f"{'profile':<12}{'reads/s':>12}{'writes/s':>12}{'errors/s':>12}")
+        for profile in ("default", "production"):
+            path = Path(tmp) / f"{profile}.db"
+            path.write_bytes(template.read_bytes())
+            r = run(profile, path, args)
+            print(f"{profile:<12}{r['reads']:>12.1f}{r['writes']:>12.1f}{r['errors']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,14 +28,19 @@ const saveKegVolumeBtn = document.getElementById("save-keg-volume-btn");
 const breweryLogoPreview = document.getElementById("brewery-logo-preview");
 const breweryLogoUpload = document.getElementById("brewery-logo-upload");
 const removeBreweryLogoBtn = document.getElementById("remove-brewery-logo-btn");
+const bulkBar = document.getElementById("bulk-bar");
+const bulkCount = document.getElementById("bulk-count");
+const bulkBatchSelect = document.getElementById("bulk-batch");
+const bulkLocationSelect = document.getElementById("bulk-location");
 
 let kegs = [];
 let batches = [];
 let people = [];
 let locations = [];
 let currentView = "board";
-let brewerySettings = { name: "Blue Dog Brewing", logo_url: "/logo.png" };
+let brewerySettings = { name: "Blue Dog Brewing", logo_url: brandLogo.getAttribute("src") };
 let statsCache = { data: null, timestamp: 0 };
+const selectedKegs = new Set();
 
 function getLocations() {
   return ["At Brewery", ...locations.map((l) => l.name), ...people.map((p) => p.name)];
@@ -43,15 +48,24 @@ function getLocations() {
 
 // ── API helpers ──────────────────────────────────────────────
 
+// Last ETag and body per GET path; the server answers 304 while they're current
+const validators = new Map();
+
 async function api(method, path, body) {
-  const opts = { method, headers: { "Content-Type": "application/json" } };
+  const opts = { method, headers: { "Content-Type": "application/json" }, cache: "no-store" };
   if (body) opts.body = JSON.stringify(body);
+  const cached = method === "GET" ? validators.get(path) : null;
+  if (cached) opts.headers["If-None-Match"] = cached.etag;
   const res = await fetch(path, opts);
+  if (res.status === 304 && cached) return JSON.parse(cached.text);
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err.detail || `${res.status} ${res.statusText}`);
   }
-  return res.json();
+  const text = await res.text();
+  const etag = res.headers.get("ETag");
+  if (method === "GET" && etag) validators.set(path, { etag, text });
+  return JSON.parse(text);
 }
 
 async function loadKegs() {
@@ -59,6 +73,56 @@ async function loadKegs() {
   render();
 }
 
+// Patch the local keg list instead of re-fetching it
+function upsertKeg(keg) {
+  upsertKegs([keg]);
+}
+
+function upsertKegs(updated) {
+  for (const keg of updated) {
+    const i = kegs.findIndex((k) => k.id === keg.id);
+    if (i >= 0) {
+      kegs[i] = keg;
+    } else {
+      kegs.push(keg);
+    }
+  }
+  kegs.sort((a, b) => a.id - b.id);
+  render();
+}
+
+function removeKeg(id) {
+  kegs = kegs.filter((k) => k.id !== id);
+  render();
+}
+
+// ── Live updates ─────────────────────────────────────────────
+
+function connectStream() {
+  const source = new EventSource("/api/stream");
+  let connectedBefore = false;
+  source.addEventListener("open", () => {
+    // Changes made while we were disconnected were missed: resync once
+    if (connectedBefore) loadKegs().catch(console.error);
+    connectedBefore = true;
+  });
+  source.addEventListener("keg", (e) => {
+    const msg = JSON.parse(e.data);
+    if (msg.events.length) invalidateStatsCache();
+    upsertKeg(msg.keg);
+  });
+  source.addEventListener("keg_deleted", (e) => {
+    const msg = JSON.parse(e.data);
+    invalidateStatsCache();
+    removeKeg(msg.id);
+  });
+  source.addEventListener("imported", (e) => {
+    const msg = JSON.parse(e.data);
+    invalidateStatsCache();
+    if (msg.kind === "kegs") loadKegs().catch(console.error);
+  });
+}
+
 async function loadBatches() {
   batches = await api("GET", "/api/batches");
 }
@@ -86,9 +150,15 @@ async function fetchVersion() {
   }
 }
 
+// Custom logos are resized on the server; ask for twice the displayed size
+function logoSrc(size) {
+  const url = brewerySettings.logo_url;
+  return url.startsWith("/api/settings/logo") ? `${url}&size=${size * 2}` : url;
+}
+
 function applyBrewerySettings() {
   brandName.textContent = brewerySettings.name;
-  brandLogo.src = brewerySettings.logo_url;
+  brandLogo.src = logoSrc(48);
   brandLogo.alt = brewerySettings.name;
   document.title = `${brewerySettings.name} - Keg Tracker`;
 }
@@ -101,6 +171,7 @@ function render() {
   } else if (currentView === "stats") {
     renderStats();
   }
+  updateBulkBar();
 }
 
 // ── View Toggle ──────────────────────────────────────────────
@@ -178,13 +249,17 @@ function renderGrid() {
   grid.innerHTML = "";
   for (const keg of kegs) {
     const card = document.createElement("div");
-    card.className = "keg-card";
+    const selected = selectedKegs.has(keg.id);
+    card.className = selected ? "keg-card selected" : "keg-card";
 
     card.innerHTML = `
       <div class="keg-card-body" data-keg-id="${keg.id}">
         ${buildCardContent(keg)}
       </div>
       <div class="keg-card-footer">
+        <label class="keg-select" title="Select for bulk actions">
+          <input type="checkbox" class="keg-select-box" data-keg-id="${keg.id}" ${selected ? "checked" : ""}>
+        </label>
         <button class="keg-reset-btn" data-keg-id="${keg.id}">Reset Keg</button>
       </div>
     `;
@@ -194,6 +269,15 @@ function renderGrid() {
 }
 
 grid.addEventListener("click", async (e) => {
+  const selectBox = e.target.closest(".keg-select-box");
+  if (selectBox) {
+    const kegId = Number(selectBox.dataset.kegId);
+    if (selectBox.checked) selectedKegs.add(kegId);
+    else selectedKegs.delete(kegId);
+    selectBox.closest(".keg-card").classList.toggle("selected", selectBox.checked);
+    updateBulkBar();
+    return;
+  }
   const resetBtn = e.target.closest(".keg-reset-btn");
   if (resetBtn) {
     const kegId = resetBtn.dataset.kegId;
@@ -201,8 +285,7 @@ grid.addEventListener("click", async (e) => {
     if (!keg) return;
     if (!confirm(`Reset ${keg.label} to empty? This will clear the batch, location, and notes.`)) return;
     invalidateStatsCache();
-    await api("POST", `/api/kegs/${keg.id}/reset`);
-    await loadKegs();
+    upsertKeg(await api("POST", `/api/kegs/${keg.id}/reset`));
     return;
   }
   const cardBody = e.target.closest("[data-keg-id]");
@@ -212,6 +295,70 @@ grid.addEventListener("click", async (e) => {
   }
 });
 
+// ── Bulk Actions ─────────────────────────────────────────────
+
+function updateBulkBar() {
+  for (const id of selectedKegs) {
+    if (!kegs.some((k) => k.id === id)) selectedKegs.delete(id);
+  }
+  if (currentView !== "grid" || selectedKegs.size === 0) {
+    bulkBar.classList.add("hidden");
+    return;
+  }
+  bulkCount.textContent = `${selectedKegs.size} selected`;
+  if (bulkBar.classList.contains("hidden")) {
+    bulkBatchSelect.innerHTML = `<option value="">-- Batch --</option>`;
+    for (const b of batches) {
+      const opt = document.createElement("option");
+      opt.value = b.id;
+      const prefix = b.batch_no ? `#${b.batch_no} ` : "";
+      opt.textContent = `${prefix}${b.recipe_name || b.name}`;
+      bulkBatchSelect.appendChild(opt);
+    }
+    bulkLocationSelect.innerHTML = "";
+    for (const loc of getLocations()) {
+      const opt = document.createElement("option");
+      opt.value = loc === "At Brewery" ? "" : loc;
+      opt.textContent = loc;
+      bulkLocationSelect.appendChild(opt);
+    }
+    bulkBar.classList.remove("hidden");
+  }
+}
+
+// One request for the whole selection, applied in a single transaction
+async function applyBulk(body) {
+  try {
+    const updated = await api("POST", "/api/kegs/bulk", body);
+    invalidateStatsCache();
+    selectedKegs.clear();
+    upsertKegs(updated);
+  } catch (err) {
+    alert(err.message);
+  }
+}
+
+document.getElementById("bulk-fill-btn").addEventListener("click", () => {
+  const batchId = bulkBatchSelect.value;
+  if (!batchId) return;
+  applyBulk({ updates: [...selectedKegs].map((id) => ({ id, batch_id: batchId, status: "full" })) });
+});
+
+document.getElementById("bulk-move-btn").addEventListener("click", () => {
+  const location = bulkLocationSelect.value;
+  applyBulk({ updates: [...selectedKegs].map((id) => ({ id, location })) });
+});
+
+document.getElementById("bulk-reset-btn").addEventListener("click", () => {
+  if (!confirm(`Reset ${selectedKegs.size} kegs to empty? This will clear their batch, location, and notes.`)) return;
+  applyBulk({ resets: [...selectedKegs] });
+});
+
+document.getElementById("bulk-clear-btn").addEventListener("click", () => {
+  selectedKegs.clear();
+  render();
+});
+
 // ── Board View ───────────────────────────────────────────────
 
 function getKegColumn(keg) {
@@ -259,8 +406,7 @@ function renderBoard() {
       const newLocation = loc === "At Brewery" ? "" : loc;
 
       invalidateStatsCache();
-      await api("PUT", `/api/kegs/${kegId}`, { location: newLocation });
-      await loadKegs();
+      upsertKeg(await api("PUT", `/api/kegs/${kegId}`, { location: newLocation }));
     });
 
     for (const keg of columnKegs) {
@@ -306,8 +452,7 @@ board.addEventListener("click", async (e) => {
     if (!keg) return;
     if (!confirm(`Reset ${keg.label} to empty? This will clear the batch, location, and notes.`)) return;
     invalidateStatsCache();
-    await api("POST", `/api/kegs/${keg.id}/reset`);
-    await loadKegs();
+    upsertKeg(await api("POST", `/api/kegs/${keg.id}/reset`));
     return;
   }
   const cardBody = e.target.closest(".board-card-body");
@@ -389,7 +534,7 @@ function openModal(keg) {
       try {
         await api("DELETE", `/api/kegs/${keg.id}`);
         closeModal();
-        await loadKegs();
+        removeKeg(keg.id);
       } catch (err) {
         alert(err.message);
       }
@@ -432,13 +577,24 @@ form.addEventListener("submit", async (e) => {
   }
 
   invalidateStatsCache();
-  await api("PUT", `/api/kegs/${id}`, payload);
+  const updated = await api("PUT", `/api/kegs/${id}`, payload);
   closeModal();
-  await loadKegs();
+  upsertKeg(updated);
 });
 
 // ── Sync ─────────────────────────────────────────────────────
 
+// Starts a sync (or joins the one already running) and polls it to completion
+async function runSyncJob() {
+  let job = await api("POST", "/api/batches/sync");
+  while (job.status === "pending" || job.status === "running") {
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    job = await api("GET", `/api/batches/sync/${job.id}`);
+  }
+  if (job.status !== "succeeded") throw new Error(job.error || "Sync failed");
+  return job.result;
+}
+
 syncBtn.addEventListener("click", async () => {
   if (syncBtn.classList.contains("syncing")) return;
   syncBtn.classList.add("syncing");
@@ -450,7 +606,7 @@ syncBtn.addEventListener("click", async () => {
     <span class="btn-label">Syncing&hellip;</span>
   `;
   try {
-    const result = await api("POST", "/api/batches/sync");
+    const result = await runSyncJob();
     syncBtn.innerHTML = `<span class="btn-label">Synced ${result.synced} batches</span>`;
     await loadBatches();
     await loadKegs();
@@ -474,8 +630,7 @@ syncBtn.addEventListener("click", async () => {
 
 addKegBtn.addEventListener("click", async () => {
   try {
-    await api("POST", "/api/kegs");
-    await loadKegs();
+    upsertKeg(await api("POST", "/api/kegs"));
   } catch (err) {
     alert("Failed to add keg: " + err.message);
     console.error(err);
@@ -702,7 +857,7 @@ function formatMonth(ym) {
 function openSettings() {
   breweryNameInput.value = brewerySettings.name;
   kegVolumeInput.value = brewerySettings.keg_volume_litres || 19;
-  breweryLogoPreview.src = brewerySettings.logo_url;
+  breweryLogoPreview.src = logoSrc(64);
   renderLocationsList();
   renderPeopleList();
   settingsOverlay.classList.remove("hidden");
@@ -858,7 +1013,7 @@ breweryLogoUpload.addEventListener("change", async () => {
       throw new Error(err.detail || "Upload failed");
     }
     await fetchBrewerySettings();
-    breweryLogoPreview.src = brewerySettings.logo_url + "?t=" + Date.now();
+    breweryLogoPreview.src = logoSrc(64);
   } catch (err) {
     alert(err.message);
   }
@@ -869,7 +1024,7 @@ removeBreweryLogoBtn.addEventListener("click", async () => {
   try {
     await api("DELETE", "/api/settings/logo");
     await fetchBrewerySettings();
-    breweryLogoPreview.src = brewerySettings.logo_url;
+    breweryLogoPreview.src = logoSrc(64);
   } catch (err) {
     alert(err.message);
   }
@@ -881,6 +1036,7 @@ removeBreweryLogoBtn.addEventListener("click", async () => {
   try {
     await Promise.all([loadBatches(), fetchPeople(), fetchLocations(), fetchBrewerySettings(), fetchVersion()]);
     await loadKegs();
+    connectStream();
   } catch (err) {
     console.error("Init failed:", err);
     const banner = document.createElement("div");
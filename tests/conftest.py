@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+import pytest
+
+# The app reads its configuration at import time, so point it at a scratch
+# database before any test module imports it
+_data_dir = tempfile.mkdtemp(prefix="keg-tracker-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_data_dir}/kegs.db"
+os.environ["BREWFATHER_USER_ID"] = ""
+os.environ["BREWFATHER_API_KEY"] = ""
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db():
+    from app import migrations
+    from app.database import SessionLocal
+
+    migrations.run()
+    with SessionLocal() as session:
+        yield session
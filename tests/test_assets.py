@@ -0,0 +1,70 @@
+"""Content-Encoding negotiation and fingerprinted static assets."""
+
+import re
+
+import pytest
+
+from app import assets, compression
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip, deflate", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("gzip;q=0", "identity"),
+    ("*", "gzip"),
+    ("", "identity"),
+])
+def test_preferred_encoding(accept, expected):
+    assert compression.preferred_encoding(accept, ("gzip",)) == expected
+
+
+def test_brotli_wins_a_tie_when_available():
+    assert compression.preferred_encoding("gzip, br", ("br", "gzip")) == "br"
+
+
+def _script_url(client) -> str:
+    html = client.get("/", headers={"Accept-Encoding": "identity"}).text
+    return re.search(r'src="(/assets/app\.[0-9a-f]+\.js)"', html).group(1)
+
+
+@pytest.mark.parametrize("accept", ["gzip", "identity"])
+def test_index_negotiates_encoding_and_varies_once(client, accept):
+    resp = client.get("/", headers={"Accept-Encoding": accept})
+    assert resp.status_code == 200
+    assert resp.headers.get("content-encoding") == (None if accept == "identity" else accept)
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert resp.headers["cache-control"].startswith(assets.REVALIDATE)
+    assert "<html" in resp.text.lower()
+
+
+def test_index_revalidates_with_its_etag(client):
+    etag = client.get("/").headers["etag"]
+    resp = client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == etag
+
+
+def test_fingerprinted_assets_are_immutable(client):
+    url = _script_url(client)
+    assert url == assets.store.url("app.js")
+    resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == assets.IMMUTABLE
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert "javascript" in resp.headers["content-type"]
+
+    assert client.get(url, headers={"If-None-Match": resp.headers["etag"]}).status_code == 304
+    assert client.get("/assets/app.0000000000.js").status_code == 404
+
+
+def test_dynamic_responses_are_compressed_above_the_minimum(client):
+    big = client.get("/api/kegs", headers={"Accept-Encoding": "gzip"})
+    assert len(big.content) >= compression.COMPRESSION_MIN_BYTES
+    assert big.headers["content-encoding"] == "gzip"
+    assert big.headers["vary"] == "Accept-Encoding"
+    assert big.json()
+
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.json() == {"status": "ok"}
@@ -0,0 +1,119 @@
+"""Brewfather requests back off on 429/5xx, and syncs keep a delta cursor."""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import delete
+
+from app import brewfather
+from app.database import AsyncSessionLocal
+from app.models import Batch, SyncState
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(brewfather, "_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(brewfather, "_not_before", 0.0)
+
+
+def _run(handler, coro_fn):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await coro_fn(client)
+    return asyncio.run(main())
+
+
+def test_get_retries_5xx_and_429_then_succeeds():
+    statuses = [503, 429, 200]
+    seen = []
+
+    def handler(request):
+        seen.append(time.monotonic())
+        status = statuses[len(seen) - 1]
+        return httpx.Response(status, headers={"Retry-After": "0.2"} if status == 429 else {}, json=[])
+
+    resp = _run(handler, lambda client: brewfather._get(client, ("u", "k"), {}))
+    assert resp.status_code == 200
+    assert len(seen) == 3
+    assert seen[2] - seen[1] >= 0.2  # Retry-After beats the 10 ms backoff
+    assert brewfather._not_before >= seen[1] + 0.2
+
+
+def test_retry_after_holds_back_concurrent_requests():
+    seen = {}
+
+    def handler(request):
+        who = request.url.params["who"]
+        seen.setdefault(who, []).append(time.monotonic())
+        if who == "a" and len(seen[who]) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0.3"})
+        return httpx.Response(200, json=[])
+
+    async def both(client):
+        async def later():
+            await asyncio.sleep(0.05)  # starts while "a" is throttled
+            return await brewfather._get(client, ("u", "k"), {"who": "b"})
+        return await asyncio.gather(brewfather._get(client, ("u", "k"), {"who": "a"}), later())
+
+    assert [r.status_code for r in _run(handler, both)] == [200, 200]
+    throttled_at = seen["a"][0]
+    assert seen["b"][0] >= throttled_at + 0.3
+    assert seen["a"][1] >= throttled_at + 0.3
+
+
+def test_get_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(brewfather, "MAX_RETRIES", 2)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    assert _run(handler, lambda client: brewfather._get(client, ("u", "k"), {})).status_code == 500
+    assert len(calls) == 3
+
+
+def _batch(n: int, modified: int) -> dict:
+    return {"_id": f"bf-{n}", "name": f"Batch {n}", "status": "Conditioning", "_timestamp_ms": modified}
+
+
+def test_sync_stores_a_cursor_and_then_fetches_only_changes(client, db, monkeypatch):
+    remote = [_batch(1, 1_000), _batch(2, 2_000), _batch(3, 3_000)]
+    queries = []
+
+    def handler(request):
+        params = dict(request.url.params)
+        queries.append(params)
+        if int(params["offset"]) > 0:
+            return httpx.Response(200, json=[])
+        return httpx.Response(200, json=sorted(remote, key=lambda b: -b["_timestamp_ms"]))
+
+    async def sync():
+        async with AsyncSessionLocal() as session:
+            return await brewfather.sync_from_brewfather(session)
+
+    monkeypatch.setattr(brewfather, "SYNC_STATUSES", ["Conditioning"])
+    monkeypatch.setattr(brewfather, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    try:
+        first = client.portal.call(sync)
+        assert first["mode"] == "full" and first["synced"] == 3
+        assert queries[0]["status"] == "Conditioning"
+        db.expire_all()
+        assert db.get(SyncState, brewfather.SYNC_SOURCE).cursor == "3000"
+
+        remote[0] = {**_batch(1, 4_000), "name": "Renamed"}
+        queries.clear()
+        second = client.portal.call(sync)
+        assert second["mode"] == "delta"
+        assert second["synced"] == 1 and second["changed"] == 1
+        assert queries == [{**queries[0], "order_by": "_timestamp_ms", "order_by_direction": "desc"}]
+        assert "status" not in queries[0]
+        db.expire_all()
+        assert db.get(SyncState, brewfather.SYNC_SOURCE).cursor == "4000"
+        assert db.get(Batch, "bf-1").name == "Renamed"
+    finally:
+        db.execute(delete(Batch).where(Batch.id.like("bf-%")))
+        db.execute(delete(SyncState).where(SyncState.source == brewfather.SYNC_SOURCE))
+        db.commit()
@@ -0,0 +1,58 @@
+"""Bulk keg updates apply all or nothing and validate the whole request first."""
+
+from sqlalchemy import func, select
+
+from app import rollups
+from app.models import KegEvent
+from app.routers.kegs import MAX_BULK_KEGS
+
+
+def _event_count(db) -> int:
+    return db.scalar(select(func.count()).select_from(KegEvent))
+
+
+def _keg(client, keg_id: int) -> dict:
+    return next(k for k in client.get("/api/kegs").json() if k["id"] == keg_id)
+
+
+def test_failed_keg_rolls_back_the_whole_request(client, db):
+    before, events = _keg(client, 14), _event_count(db)
+    resp = client.post("/api/kegs/bulk", json={
+        "updates": [
+            {"id": 14, "location": "Michael", "notes": "bulk"},
+            {"id": 15, "batch_id": "no-such-batch"},
+        ],
+    })
+    assert resp.status_code == 404
+    assert resp.json()["detail"] == "Keg 15: Batch not found"
+    assert _keg(client, 14) == before
+    assert _event_count(db) == events
+    assert rollups.verify(db) == []
+
+
+def test_bulk_update_applies_every_keg(client, db):
+    resp = client.post("/api/kegs/bulk", json={
+        "updates": [{"id": 14, "notes": "bulk"}, {"id": 15, "location": "Troy"}],
+        "resets": [16],
+    })
+    assert resp.status_code == 200
+    assert [(k["id"], k["notes"], k["location"]) for k in resp.json()] == [
+        (14, "bulk", _keg(client, 14)["location"]), (15, "", "Troy"), (16, "", ""),
+    ]
+    assert rollups.verify(db) == []
+    client.post("/api/kegs/bulk", json={"resets": [14, 15]})
+
+
+def test_request_is_validated_before_anything_is_applied(client, db):
+    events = _event_count(db)
+    cases = [
+        ({}, 400, "No updates or resets given"),
+        ({"updates": [{"id": 14, "notes": "x"}], "resets": [14]}, 400, "Each keg may appear only once"),
+        ({"resets": list(range(1, MAX_BULK_KEGS + 2))}, 400, f"Too many kegs (max {MAX_BULK_KEGS})"),
+        ({"updates": [{"id": 14, "notes": "x"}], "resets": [99_999]}, 404, "Keg 99999 not found"),
+    ]
+    for body, status, detail in cases:
+        resp = client.post("/api/kegs/bulk", json=body)
+        assert (resp.status_code, resp.json()["detail"]) == (status, detail)
+    assert _keg(client, 14)["notes"] != "x"
+    assert _event_count(db) == events
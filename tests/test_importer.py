@@ -0,0 +1,75 @@
+import io
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app import importer, rollups
+from app.models import Keg, KegEvent, RollupsStale
+
+
+def test_auto_numbered_kegs_never_take_a_requested_id(db):
+    top = db.scalar(select(func.max(Keg.id)))
+    rows = f"id,label\n,First auto\n{top + 1},Asked for\n,Second auto\n{top},Taken\n"
+    try:
+        result = importer.import_kegs(db, io.StringIO(rows), "csv")
+        assert result.imported == 3
+        assert result.errors == [{"line": 5, "error": f"Keg {top} already exists"}]
+        labels = dict(db.execute(select(Keg.id, Keg.label).where(Keg.id > top)).all())
+        assert labels == {top + 1: "Asked for", top + 2: "First auto", top + 3: "Second auto"}
+    finally:
+        db.execute(delete(Keg).where(Keg.id > top))
+        db.commit()
+
+
+def test_rows_the_database_rejects_are_reported_not_raised(db, monkeypatch):
+    top = db.scalar(select(func.max(Keg.id)))
+    # As if another request created the keg between validation and insert
+    load = importer._Context.load
+
+    def stale_context(cls, db):
+        ctx = load(db)
+        ctx.kegs.discard(top)
+        return ctx
+
+    monkeypatch.setattr(importer._Context, "load", classmethod(stale_context))
+    try:
+        result = importer.import_kegs(db, io.StringIO(f"id,label\n{top + 1},New\n{top},Clash\n"), "csv")
+        assert result.imported == 1
+        assert [e["line"] for e in result.errors] == [3]
+        assert db.get(Keg, top + 1).label == "New"
+    finally:
+        db.execute(delete(Keg).where(Keg.id > top))
+        db.commit()
+
+
+def test_import_that_dies_before_its_rebuild_leaves_rollups_marked_stale(db, monkeypatch):
+    top = db.scalar(select(func.max(KegEvent.id))) or 0
+    rows = "keg_id,event_type,person,timestamp\n" + "".join(
+        f"5,{event},Brent,2003-03-0{day}T00:00:00\n" for day, event in ((1, "assigned"), (2, "returned"))
+    )
+    monkeypatch.setattr(importer, "_CHUNK_ROWS", 1)
+    monkeypatch.setattr(importer, "_COMMIT_ROWS", 1)  # commits each event on its own
+
+    def crash(db):
+        raise RuntimeError("worker died")
+
+    monkeypatch.setattr(rollups, "rebuild", crash)
+    try:
+        with pytest.raises(RuntimeError):
+            importer.import_events(db, io.StringIO(rows), "csv")
+        db.rollback()
+        assert db.scalar(select(func.count()).where(KegEvent.id > top)) == 2
+        assert rollups.needs_rebuild(db)
+        assert rollups.verify(db) != []
+
+        monkeypatch.undo()
+        db.rollback()
+        assert rollups.rebuild_if_needed()
+        assert db.get(RollupsStale, 1) is None
+        assert rollups.verify(db) == []
+    finally:
+        monkeypatch.undo()
+        db.rollback()
+        db.execute(delete(KegEvent).where(KegEvent.id > top))
+        rollups.rebuild(db)
+        db.commit()
@@ -0,0 +1,72 @@
+"""The custom logo is cached by version and falls back to the default one."""
+
+from pathlib import Path
+
+from app import assets
+
+_PNG = (Path(__file__).parent.parent / "static" / "logo.png").read_bytes()
+
+
+def _upload(client, body: bytes) -> str:
+    resp = client.post("/api/settings/logo", files={"file": ("logo.png", body, "image/png")})
+    assert resp.status_code == 200, resp.text
+    return resp.json()["logo_url"]
+
+
+def _brewery_logo_url(client) -> str:
+    return client.get("/api/settings/brewery").json()["logo_url"]
+
+
+def test_without_a_custom_logo_the_default_is_served(client):
+    client.delete("/api/settings/logo")
+    resp = client.get("/api/settings/logo", follow_redirects=False)
+    assert resp.status_code == 307
+    assert resp.headers["location"] == assets.store.url("logo.png")
+    assert resp.headers["cache-control"] == assets.REVALIDATE
+    assert _brewery_logo_url(client) == assets.store.url("logo.png")
+
+
+def test_versioned_logo_url_is_immutable_and_revalidates(client):
+    try:
+        url = _upload(client, _PNG)
+        assert url.startswith("/api/settings/logo?v=")
+        assert _brewery_logo_url(client) == url
+
+        resp = client.get(url)
+        assert resp.status_code == 200
+        assert resp.content == _PNG
+        assert resp.headers["cache-control"] == assets.IMMUTABLE
+
+        unversioned = client.get("/api/settings/logo")
+        assert unversioned.headers["cache-control"] == assets.REVALIDATE
+        assert unversioned.headers["etag"] == resp.headers["etag"]
+
+        cached = client.get(url, headers={"If-None-Match": resp.headers["etag"]})
+        assert cached.status_code == 304
+        assert cached.content == b""
+    finally:
+        client.delete("/api/settings/logo")
+
+
+def test_upload_and_delete_replace_the_cached_logo(client):
+    try:
+        first = _upload(client, _PNG)
+        etag = client.get(first).headers["etag"]
+
+        replacement = _PNG + b"\0"  # a different upload, same format
+        second = _upload(client, replacement)
+        assert second != first
+        assert _brewery_logo_url(client) == second
+        resp = client.get(second)
+        assert resp.content == replacement
+        assert resp.headers["etag"] != etag
+        # The old URL now names a stale version, so it must be revalidated
+        stale = client.get(first, headers={"If-None-Match": etag})
+        assert stale.status_code == 200
+        assert stale.headers["cache-control"] == assets.REVALIDATE
+
+        assert client.delete("/api/settings/logo").json()["logo_url"] == assets.store.url("logo.png")
+        assert _brewery_logo_url(client) == assets.store.url("logo.png")
+        assert client.get(second, follow_redirects=False).status_code == 307
+    finally:
+        client.delete("/api/settings/logo")
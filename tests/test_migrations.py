@@ -0,0 +1,44 @@
+"""Migrations build the schema the models describe, from scratch or from before the runner."""
+
+from sqlalchemy import create_engine, inspect
+
+from app import migrations
+from app.database import Base
+
+
+def _schema(bind) -> dict:
+    inspector = inspect(bind)
+    return {
+        table: (
+            {c["name"] for c in inspector.get_columns(table)},
+            {i["name"] for i in inspector.get_indexes(table)},
+        )
+        for table in inspector.get_table_names()
+        if table != migrations.schema_migrations.name
+    }
+
+
+def test_fresh_database_matches_the_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    try:
+        assert [name for _, name, _ in migrations.MIGRATIONS] == migrations.run(engine)
+        assert migrations.run(engine) == []
+        expected = {
+            table.name: ({c.name for c in table.columns}, {i.name for i in table.indexes})
+            for table in Base.metadata.sorted_tables
+        }
+        assert _schema(engine) == expected
+    finally:
+        engine.dispose()
+
+
+def test_database_from_before_the_runner_gets_missing_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    try:
+        with engine.begin() as conn:
+            migrations._execute_ddl(conn, migrations._BASELINE_DDL.replace(
+                "CREATE INDEX IF NOT EXISTS ix_keg_events_timestamp ON keg_events (timestamp);", ""))
+        migrations.run(engine)
+        assert "ix_keg_events_timestamp" in _schema(engine)["keg_events"][1]
+    finally:
+        engine.dispose()
@@ -0,0 +1,40 @@
+"""The sampler survives odd frames and profiles streamed responses."""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert
+
+from app import admin, profiler
+from app.models import KegEvent
+
+
+def test_frame_without_a_line_number_is_not_idle():
+    frame = SimpleNamespace(f_code=test_frame_without_a_line_number_is_not_idle.__code__, f_lineno=None)
+    assert profiler._is_idle(frame) is False
+
+
+def test_profiling_a_streamed_export_collects_samples(db, monkeypatch):
+    from app.main import app
+
+    start = datetime(2004, 4, 4)
+    db.execute(insert(KegEvent), [
+        {"id": 800_000 + n, "keg_id": 1, "event_type": "filled", "timestamp": start + timedelta(minutes=n)}
+        for n in range(20_000)
+    ])
+    db.commit()
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    try:
+        # No lifespan: the session-wide client already ran it for this app
+        client = TestClient(profiler.ProfileRequestMiddleware(app))
+        resp = client.get("/api/export/events", params={"format": "ndjson"}, headers={
+            admin.ADMIN_HEADER: "secret", profiler.PROFILE_HEADER: "wall",
+            profiler.PROFILE_FORMAT_HEADER: "collapsed",
+        })
+        assert resp.status_code == 200
+        assert resp.headers["X-Profiled-Status"] == "200"
+        assert "_stream_rows (app/routers/export.py" in resp.text
+    finally:
+        db.execute(delete(KegEvent).where(KegEvent.id >= 800_000, KegEvent.id < 900_000))
+        db.commit()
@@ -0,0 +1,92 @@
+"""Renames and deletes must be visible to the very next request, cache or not."""
+
+from sqlalchemy import select
+
+from app.models import Batch, BrewerySettings, KegEvent, Person
+
+
+def _events(db, keg_id: int, event_type: str) -> list[KegEvent]:
+    db.expire_all()
+    return list(db.scalars(
+        select(KegEvent).where(KegEvent.keg_id == keg_id, KegEvent.event_type == event_type)
+        .order_by(KegEvent.id)
+    ))
+
+
+def _move(client, keg_id: int, location: str) -> None:
+    resp = client.put(f"/api/kegs/{keg_id}", json={"location": location})
+    assert resp.status_code == 200, resp.text
+
+
+def test_person_rename_and_delete_reach_next_keg_update(client, db):
+    person_id = client.post("/api/people", json={"name": "Alice"}).json()["id"]
+    _move(client, 1, "Alice")  # warms the cache with Alice in it
+    assert [e.person for e in _events(db, 1, "assigned")] == ["Alice"]
+
+    db.get(Person, person_id).name = "Alicia"
+    db.commit()
+    _move(client, 2, "Alice")
+    assert _events(db, 2, "assigned") == []
+    _move(client, 3, "Alicia")
+    assert [e.person for e in _events(db, 3, "assigned")] == ["Alicia"]
+
+    assert client.delete(f"/api/people/{person_id}").status_code == 200
+    _move(client, 4, "Alicia")
+    assert _events(db, 4, "assigned") == []
+
+
+def test_batch_rename_and_delete_reach_next_keg_update(client, db):
+    db.add(Batch(id="b-ref", name="Pale", recipe_name="Pale Ale", style="APA"))
+    db.commit()
+    assert client.put("/api/kegs/5", json={"batch_id": "b-ref"}).status_code == 200
+    assert [e.batch_name for e in _events(db, 5, "filled")] == ["Pale Ale"]
+
+    db.get(Batch, "b-ref").recipe_name = "Hazy Pale"
+    db.commit()
+    assert client.put("/api/kegs/6", json={"batch_id": "b-ref"}).status_code == 200
+    assert [e.batch_name for e in _events(db, 6, "filled")] == ["Hazy Pale"]
+
+    db.execute(Batch.__table__.update().where(Batch.id == "b-ref").values(recipe_name="Renamed"))
+    db.commit()
+    assert client.put("/api/kegs/7", json={"batch_id": "b-ref"}).status_code == 200
+    assert [e.batch_name for e in _events(db, 7, "filled")] == ["Renamed"]
+
+    db.delete(db.get(Batch, "b-ref"))
+    db.commit()
+    assert client.put("/api/kegs/8", json={"batch_id": "b-ref"}).status_code == 404
+
+
+def test_settings_rename_and_delete_reach_next_read(client, db):
+    assert client.put("/api/settings/brewery", json={"name": "Red Cat"}).status_code == 200
+    assert client.get("/api/settings/brewery").json()["name"] == "Red Cat"
+
+    db.get(BrewerySettings, 1).name = "Green Owl"
+    db.commit()
+    assert client.get("/api/settings/brewery").json()["name"] == "Green Owl"
+
+    db.delete(db.get(BrewerySettings, 1))
+    db.commit()
+    assert client.get("/api/settings/brewery").json()["name"] == "Blue Dog Brewing"
+
+
+def test_concurrent_reloads_do_not_block_the_event_loop(client, db):
+    import asyncio
+
+    import httpx
+
+    from app.main import app
+
+    async def update_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*(
+                ac.put(f"/api/kegs/{keg_id}", json={"notes": "reload"}) for keg_id in range(9, 17)
+            ))
+
+    db.add(Person(name="Bob"))  # every cached people set is now stale
+    db.commit()
+    # Eight updates reload it at once on the app's event loop. A lock held
+    # across the load would block that loop for good: this times out, and
+    # the session teardown hangs after it
+    responses = client.portal.start_task_soon(update_all).result(timeout=30)
+    assert [r.status_code for r in responses] == [200] * 8
@@ -0,0 +1,110 @@
+"""Syncs are single-flight across workers, and a dead worker's job doesn't block the next."""
+
+import asyncio
+import contextlib
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete
+
+from app import sync_jobs, versions
+from app.models import SyncJobRecord
+
+
+@pytest.fixture
+def blocked_sync(monkeypatch):
+    """Stand in for Brewfather with a sync that runs until the returned event is set."""
+    release = threading.Event()
+    calls = []
+
+    async def fake_sync(db, full=False, progress=None):
+        calls.append(full)
+        await asyncio.to_thread(release.wait, 10)
+        return {"synced": 0, "changed": 0, "failed": [], "mode": "full" if full else "delta"}
+
+    monkeypatch.setattr(sync_jobs, "sync_from_brewfather", fake_sync)
+    yield release, calls
+    release.set()
+
+
+def _finish(client, job_id: str) -> dict:
+    for _ in range(100):
+        job = client.get(f"/api/batches/sync/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"sync job {job_id} never finished")
+
+
+def test_second_trigger_joins_the_running_job(client, blocked_sync):
+    release, calls = blocked_sync
+    first = client.post("/api/batches/sync").json()
+    second = client.post("/api/batches/sync").json()
+    assert second["id"] == first["id"]
+
+    release.set()
+    assert _finish(client, first["id"])["status"] == "succeeded"
+    assert calls == [False]
+
+
+def test_full_sync_is_refused_while_a_delta_runs(client, blocked_sync):
+    release, calls = blocked_sync
+    delta = client.post("/api/batches/sync").json()
+    resp = client.post("/api/batches/sync", params={"full": "true"})
+    assert resp.status_code == 409
+
+    release.set()
+    _finish(client, delta["id"])
+    full = client.post("/api/batches/sync", params={"full": "true"}).json()
+    assert full["full"] and full["id"] != delta["id"]
+    _finish(client, full["id"])
+    assert calls == [False, True]
+
+
+def test_job_of_a_dead_worker_is_taken_over(client, db, blocked_sync):
+    release, calls = blocked_sync
+    long_ago = datetime.utcnow() - timedelta(seconds=sync_jobs._STALE_SECONDS + 1)
+    db.add(SyncJobRecord(id="dead-worker-job", status="running", owner="gone",
+                         created_at=long_ago, heartbeat_at=long_ago))
+    db.commit()
+    try:
+        job = client.post("/api/batches/sync").json()
+        assert job["id"] != "dead-worker-job"
+        dead = client.get("/api/batches/sync/dead-worker-job").json()
+        assert dead["status"] == "failed" and "worker exited" in dead["error"]
+
+        release.set()
+        assert _finish(client, job["id"])["status"] == "succeeded"
+        assert calls == [False]
+    finally:
+        db.execute(delete(SyncJobRecord).where(SyncJobRecord.owner != versions.ORIGIN))
+        db.commit()
+
+
+def test_schedule_survives_a_failing_claim(client, blocked_sync, monkeypatch):
+    release, calls = blocked_sync
+    release.set()
+    claims = []
+
+    async def flaky_claim(name, seconds):
+        claims.append(name)
+        if len(claims) == 1:
+            raise RuntimeError("database is locked")
+        return len(claims) == 2
+
+    monkeypatch.setattr(sync_jobs.cluster, "claim", flaky_claim)
+
+    async def run_three_intervals():
+        # An interval of 0 leaves the 1 s floor between passes
+        task = asyncio.create_task(sync_jobs.sync_manager.run_schedule(interval_minutes=0, jitter_seconds=0))
+        while len(claims) < 3 and not task.done():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    client.portal.call(run_three_intervals)
+    assert claims == ["brewfather_schedule"] * 3
+    assert calls == [False]
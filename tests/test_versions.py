@@ -0,0 +1,28 @@
+from sqlalchemy import select
+
+from app import versions
+from app.database import engine
+from app.models import ChangeLogEntry
+
+
+def test_etags_carry_the_database_epoch_from_the_first_request(client, db):
+    marker = db.scalar(select(ChangeLogEntry.origin).where(ChangeLogEntry.id == 0))
+    assert client.get("/api/kegs").headers["ETag"].startswith(f'"{marker[:8]}-')
+
+
+def test_a_change_to_every_table_moves_all_versions_and_notifies(client, monkeypatch):
+    calls = []
+    monkeypatch.setitem(versions._listeners, "test_table", [lambda: calls.append(1)])
+    before = versions.current("kegs", "stats", "test_table")
+    tag = client.get("/api/kegs").headers["ETag"]
+
+    # As logged by a worker starting up in place of one that died
+    with engine.begin() as conn:
+        change_id = versions.record(conn, [versions.ALL])
+    versions.apply(change_id, [versions.ALL])
+
+    after = versions.current("kegs", "stats", "test_table")
+    assert all(a != b for a, b in zip(after, before))
+    assert after[2] == change_id
+    assert calls == [1]
+    assert client.get("/api/kegs", headers={"If-None-Match": tag}).status_code == 200